@@ -0,0 +1,136 @@
+"""
+Benchmark for the access log middleware.
+
+Compares the pure ASGI AccessLogMiddleware with the previous
+BaseHTTPMiddleware-based implementation on small Range requests, the typical
+request of a Zarr or N5 viewer fetching chunks. Requests are sent directly to
+the ASGI application, without a server or network, so that the measured
+difference is the per-request overhead of the middleware.
+
+The previous implementation also looked up the user session in the database
+on every request. That lookup is not included here, so the real gain is larger.
+
+Usage:
+    python benchmarks/bench_access_log.py [--requests 20000] [--chunk-size 4096]
+"""
+import argparse
+import asyncio
+import os
+import shutil
+import tempfile
+import time
+
+# Settings are loaded lazily and this is the only value without a default
+os.environ.setdefault("FGC_EXTERNAL_PROXY_URL", "http://localhost:7878/files")
+
+from fastapi import FastAPI, Request
+from fastapi.responses import StreamingResponse
+from loguru import logger
+from starlette.middleware.base import BaseHTTPMiddleware
+
+from fileglancer.log import AccessLogMiddleware
+from fileglancer.settings import Settings
+
+
+class LegacyAccessLogMiddleware(BaseHTTPMiddleware):
+    """The BaseHTTPMiddleware access log that AccessLogMiddleware replaced, without the session lookup"""
+
+    def __init__(self, app, settings):
+        super().__init__(app)
+        self.settings = settings
+
+    async def dispatch(self, request, call_next):
+        start_time = time.time()
+        response = await call_next(request)
+        duration_ms = (time.time() - start_time) * 1000
+        client_host = request.client.host if request.client else "unknown"
+        client_port = request.client.port if request.client else 0
+        http_version = request.scope.get("http_version", "1.1")
+        log_message = f'{client_host}:{client_port} [-] "{request.method} {request.url.path}'
+        if request.url.query:
+            log_message += f"?{request.url.query}"
+        log_message += f' HTTP/{http_version}" {response.status_code} - {duration_ms:.2f}ms'
+        logger.info(log_message)
+        return response
+
+
+def create_app(middleware, path, chunk_size):
+    """Create an app serving byte ranges of a file, wrapped in the given middleware"""
+    app = FastAPI()
+
+    @app.get("/chunk")
+    async def get_chunk(request: Request):
+        start = int(request.headers["range"].removeprefix("bytes=").split("-")[0])
+
+        async def read_range():
+            with open(path, "rb") as f:
+                f.seek(start)
+                yield f.read(chunk_size)
+
+        headers = {"Content-Range": f"bytes {start}-{start + chunk_size - 1}/*"}
+        return StreamingResponse(read_range(), status_code=206, headers=headers)
+
+    app.add_middleware(middleware, settings=Settings())
+    return app
+
+
+async def send_requests(app, requests, chunk_size):
+    """Send Range requests directly to the ASGI app, returning the number of requests per second"""
+
+    async def send(message):
+        pass
+
+    start = time.perf_counter()
+    for i in range(requests):
+        request_sent = False
+
+        async def receive():
+            # Send the request, then wait as a client waiting for the response would
+            nonlocal request_sent
+            if not request_sent:
+                request_sent = True
+                return {"type": "http.request", "body": b"", "more_body": False}
+            await asyncio.Event().wait()
+
+        offset = (i % 64) * chunk_size
+        scope = {
+            "type": "http", "asgi": {"version": "3.0"}, "http_version": "1.1",
+            "method": "GET", "scheme": "http", "path": "/chunk", "raw_path": b"/chunk",
+            "query_string": b"", "root_path": "", "client": ("127.0.0.1", 50000),
+            "server": ("127.0.0.1", 7878),
+            "headers": [(b"range", f"bytes={offset}-{offset + chunk_size - 1}".encode())],
+        }
+        await app(scope, receive, send)
+    return requests / (time.perf_counter() - start)
+
+
+def main():
+    parser = argparse.ArgumentParser(description=__doc__, formatter_class=argparse.RawDescriptionHelpFormatter)
+    parser.add_argument("--requests", type=int, default=20_000, help="Number of requests to send")
+    parser.add_argument("--chunk-size", type=int, default=4096, help="Size of each byte range")
+    args = parser.parse_args()
+
+    # Keep the cost of formatting log records, but not of writing them out
+    logger.remove()
+    logger.add(lambda message: None, level="INFO")
+
+    workdir = tempfile.mkdtemp(prefix="fg_bench_access_log_")
+    try:
+        path = os.path.join(workdir, "data.bin")
+        with open(path, "wb") as f:
+            f.write(os.urandom(64 * args.chunk_size))
+
+        results = {}
+        for name, middleware in [("legacy", LegacyAccessLogMiddleware), ("asgi", AccessLogMiddleware)]:
+            app = create_app(middleware, path, args.chunk_size)
+            # Warm up
+            asyncio.run(send_requests(app, 100, args.chunk_size))
+            results[name] = asyncio.run(send_requests(app, args.requests, args.chunk_size))
+            print(f"{name:>8}: {results[name]:.0f} requests/s")
+        print(f"speedup: {results['asgi'] / results['legacy']:.2f}x throughput")
+    finally:
+        shutil.rmtree(workdir)
+
+
+if __name__ == "__main__":
+    main()
@@ -0,0 +1,173 @@
+"""
+Benchmark for Filestore directory listings.
+
+Compares the scandir-based Filestore.yield_file_infos() with the previous
+listdir-based implementation on a directory with many entries, reporting the
+wall time and the number of filesystem calls made from Python for each.
+
+Usage:
+    python benchmarks/bench_listing.py [--entries 100000] [--symlinks 1000] [--dir /path/on/nfs]
+
+Use --dir to run the benchmark on a network filesystem, where every call is
+a round trip to the server and the difference is most visible.
+"""
+import argparse
+import os
+import shutil
+import stat
+import tempfile
+import time
+from collections import Counter
+from contextlib import contextmanager
+
+# Settings are loaded lazily and this is the only value without a default
+os.environ.setdefault("FGC_EXTERNAL_PROXY_URL", "http://localhost:7878/files")
+
+from fileglancer.filestore import Filestore, FileInfo
+from fileglancer.model import FileSharePath
+
+
+class _CountingDirEntry:
+    """Wraps an os.DirEntry to count the calls that may reach the filesystem"""
+
+    def __init__(self, entry, counts):
+        self._entry = entry
+        self._counts = counts
+        self.name = entry.name
+        self.path = entry.path
+
+    def is_dir(self, *, follow_symlinks=True):
+        self._counts['DirEntry.is_dir'] += 1
+        return self._entry.is_dir(follow_symlinks=follow_symlinks)
+
+    def is_symlink(self):
+        self._counts['DirEntry.is_symlink'] += 1
+        return self._entry.is_symlink()
+
+    def stat(self, *, follow_symlinks=True):
+        self._counts['DirEntry.stat'] += 1
+        return self._entry.stat(follow_symlinks=follow_symlinks)
+
+
+class _CountingScandir:
+
+    def __init__(self, scandir, counts):
+        self._scandir = scandir
+        self._counts = counts
+
+    def __call__(self, path):
+        self._counts['scandir'] += 1
+        it = self._scandir(path)
+        counts = self._counts
+
+        class _Iterator:
+            def __enter__(self):
+                return self
+
+            def __exit__(self, *args):
+                it.close()
+
+            def __iter__(self):
+                return (_CountingDirEntry(e, counts) for e in it)
+
+        return _Iterator()
+
+
+@contextmanager
+def count_fs_calls():
+    """Count calls to the os functions used by directory listings, including those made by os.path"""
+    counts = Counter()
+    originals = {name: getattr(os, name) for name in ('stat', 'lstat', 'listdir', 'readlink')}
+
+    def wrap(name, fn):
+        def wrapper(*args, **kwargs):
+            counts[name] += 1
+            return fn(*args, **kwargs)
+        return wrapper
+
+    original_scandir = os.scandir
+    try:
+        for name, fn in originals.items():
+            setattr(os, name, wrap(name, fn))
+        os.scandir = _CountingScandir(original_scandir, counts)
+        yield counts
+    finally:
+        for name, fn in originals.items():
+            setattr(os, name, fn)
+        os.scandir = original_scandir
+
+
+def legacy_yield_file_infos(filestore, path=None):
+    """The listdir-based listing that yield_file_infos replaced, kept here for comparison"""
+    full_path = filestore._check_path_in_root(path)
+    root_real = os.path.realpath(filestore.root_path)
+    entries = os.listdir(full_path)
+    entries.sort(key=lambda e: (not os.path.isdir(os.path.join(full_path, e)), e))
+    for entry in entries:
+        entry_path = os.path.abspath(os.path.join(full_path, entry))
+        parent_real = os.path.realpath(os.path.dirname(entry_path))
+        assert parent_real == root_real or parent_real.startswith(root_real + os.sep)
+        full_real = os.path.realpath(entry_path)
+        rel_path = os.path.relpath(full_real, root_real)
+        lstat_result = os.lstat(entry_path)
+        if stat.S_ISLNK(lstat_result.st_mode):
+            try:
+                stat_result = os.stat(entry_path)
+            except OSError:
+                stat_result = lstat_result
+        else:
+            stat_result = os.stat(entry_path)
+        yield FileInfo.from_stat(rel_path, entry_path, lstat_result, stat_result,
+                                 root_path=filestore.root_path)
+
+
+def populate(directory, entries, symlinks):
+    """Create a directory with the given number of files, subdirectories and symlinks"""
+    for i in range(entries):
+        if i % 10 == 0:
+            os.mkdir(os.path.join(directory, f"dir_{i:07d}"))
+        else:
+            with open(os.path.join(directory, f"file_{i:07d}.dat"), "wb") as f:
+                f.write(b"x" * (i % 1024))
+    for i in range(symlinks):
+        os.symlink(f"file_{i * 10 + 1:07d}.dat", os.path.join(directory, f"link_{i:07d}"))
+
+
+def run(name, fn):
+    with count_fs_calls() as counts:
+        start = time.perf_counter()
+        n = sum(1 for _ in fn())
+        elapsed = time.perf_counter() - start
+    total = sum(counts.values())
+    calls = ", ".join(f"{k}={v}" for k, v in sorted(counts.items()))
+    print(f"{name:>8}: {n} entries in {elapsed:.3f}s, {total} fs calls ({total / max(n, 1):.2f}/entry): {calls}")
+    return elapsed, total
+
+
+def main():
+    parser = argparse.ArgumentParser(description=__doc__, formatter_class=argparse.RawDescriptionHelpFormatter)
+    parser.add_argument("--entries", type=int, default=100_000, help="Number of files and directories to create")
+    parser.add_argument("--symlinks", type=int, default=1000, help="Number of symlinks to create")
+    parser.add_argument("--dir", default=None, help="Parent directory for the test data (default: system temp dir)")
+    args = parser.parse_args()
+
+    workdir = tempfile.mkdtemp(prefix="fg_bench_listing_", dir=args.dir)
+    try:
+        print(f"Creating {args.entries} entries and {args.symlinks} symlinks in {workdir}")
+        populate(workdir, args.entries, args.symlinks)
+        filestore = Filestore(FileSharePath(zone="bench", name="bench", mount_path=workdir))
+
+        # Warm the OS caches and the uid/gid name caches before timing
+        for _ in filestore.yield_file_infos(None):
+            pass
+
+        legacy_time, legacy_calls = run("listdir", lambda: legacy_yield_file_infos(filestore))
+        scandir_time, scandir_calls = run("scandir", lambda: filestore.yield_file_infos(None))
+        print(f"speedup: {legacy_time / scandir_time:.2f}x wall time, "
+              f"{legacy_calls / max(scandir_calls, 1):.2f}x fewer fs calls")
+    finally:
+        shutil.rmtree(workdir)
+
+
+if __name__ == "__main__":
+    main()
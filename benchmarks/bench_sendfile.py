@@ -0,0 +1,131 @@
+"""
+Benchmark for sending file content.
+
+Measures the CPU time used by the server process per GiB sent to a socket for
+the ways /api/content can send a file:
+
+    read-8k     read() in 8 KiB chunks and send each chunk (the previous implementation)
+    async       Filestore.stream_file_async() with read-ahead, then send each chunk
+                (the fallback used when zero-copy sending is not available)
+    sendfile    os.sendfile() from the open file descriptor, as done by servers
+                supporting the ASGI zero-copy send extension
+
+The receiving end of the socket is drained by a separate process, so that only
+the sender's CPU time is counted.
+
+Usage:
+    python benchmarks/bench_sendfile.py [--size-mib 1024] [--read-size 1048576] [--dir /path/on/gpfs]
+"""
+import argparse
+import asyncio
+import os
+import resource
+import shutil
+import socket
+import subprocess
+import sys
+import tempfile
+import time
+from concurrent.futures import ThreadPoolExecutor
+
+# Settings are loaded lazily and this is the only value without a default
+os.environ.setdefault("FGC_EXTERNAL_PROXY_URL", "http://localhost:7878/files")
+
+from fileglancer.filestore import Filestore
+from fileglancer.model import FileSharePath
+
+DRAIN = "import sys\nwhile sys.stdin.buffer.read1(1 << 20): pass\n"
+
+
+def send_read(f, sock, size):
+    while True:
+        chunk = f.read(8192)
+        if not chunk:
+            break
+        sock.sendall(chunk)
+
+
+def send_async(f, sock, size, filestore, read_size):
+    async def send_all():
+        loop = asyncio.get_running_loop()
+        with ThreadPoolExecutor(max_workers=4) as executor:
+            async for chunk in filestore.stream_file_async(f, executor, buffer_size=read_size):
+                await loop.sock_sendall(sock, chunk)
+
+    sock.setblocking(False)
+    try:
+        asyncio.run(send_all())
+    finally:
+        sock.setblocking(True)
+
+
+def send_sendfile(f, sock, size):
+    offset = 0
+    while offset < size:
+        sent = os.sendfile(sock.fileno(), f.fileno(), offset, size - offset)
+        if sent == 0:
+            break
+        offset += sent
+
+
+def run(name, path, size, send):
+    sender, receiver = socket.socketpair()
+    drain = subprocess.Popen([sys.executable, "-c", DRAIN], stdin=receiver)
+    receiver.close()
+    try:
+        f = open(path, "rb")
+        start_usage = resource.getrusage(resource.RUSAGE_SELF)
+        start = time.perf_counter()
+        send(f, sender, size)
+        elapsed = time.perf_counter() - start
+        end_usage = resource.getrusage(resource.RUSAGE_SELF)
+        f.close()
+    finally:
+        sender.close()
+        drain.wait()
+
+    cpu = (end_usage.ru_utime - start_usage.ru_utime) + (end_usage.ru_stime - start_usage.ru_stime)
+    gib = size / (1 << 30)
+    print(f"{name:>9}: {cpu / gib:.3f} CPU s/GiB "
+          f"(user {(end_usage.ru_utime - start_usage.ru_utime) / gib:.3f}, "
+          f"sys {(end_usage.ru_stime - start_usage.ru_stime) / gib:.3f}), "
+          f"{gib / elapsed:.2f} GiB/s")
+    return cpu / gib
+
+
+def main():
+    parser = argparse.ArgumentParser(description=__doc__, formatter_class=argparse.RawDescriptionHelpFormatter)
+    parser.add_argument("--size-mib", type=int, default=1024, help="Size of the file to send")
+    parser.add_argument("--read-size", type=int, default=1024 * 1024, help="Read size of the async streaming path")
+    parser.add_argument("--dir", default=None, help="Parent directory for the test file (default: system temp dir)")
+    args = parser.parse_args()
+
+    workdir = tempfile.mkdtemp(prefix="fg_bench_sendfile_", dir=args.dir)
+    try:
+        path = os.path.join(workdir, "data.bin")
+        size = args.size_mib << 20
+        block = os.urandom(1 << 20)
+        with open(path, "wb") as f:
+            for _ in range(args.size_mib):
+                f.write(block)
+        filestore = Filestore(FileSharePath(zone="bench", name="bench", mount_path=workdir))
+
+        # Warm the page cache, so that all methods read from memory
+        with open(path, "rb") as f:
+            while f.read(1 << 24):
+                pass
+
+        results = {
+            "read-8k": run("read-8k", path, size, send_read),
+            "async": run("async", path, size,
+                         lambda f, sock, size: send_async(f, sock, size, filestore, args.read_size)),
+            "sendfile": run("sendfile", path, size, send_sendfile),
+        }
+        print(f"sendfile uses {results['read-8k'] / results['sendfile']:.1f}x less CPU than read-8k, "
+              f"{results['async'] / results['sendfile']:.1f}x less than async")
+    finally:
+        shutil.rmtree(workdir)
+
+
+if __name__ == "__main__":
+    main()
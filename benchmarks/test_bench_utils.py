@@ -0,0 +1,47 @@
+"""
+Micro-benchmarks for the helpers in fileglancer.utils that run on every request.
+
+These use pytest-benchmark, which is installed with the test dependencies. Run with:
+
+    pixi run test-benchmarks
+
+Save a baseline with --benchmark-save=baseline and compare against it with
+--benchmark-compare=0001 --benchmark-compare-fail=mean:25% to catch regressions.
+"""
+import os
+
+import pytest
+
+from fileglancer.utils import (guess_content_type, is_likely_binary, parse_range_header,
+                               parse_range_header_ranges, slugify_path)
+
+SAMPLE_SIZE = 4096
+
+
+@pytest.mark.parametrize("kind", ["text", "binary"])
+def test_is_likely_binary(benchmark, kind):
+    if kind == "text":
+        data = (b"timestamp,channel,value\n" + b"2024-01-01T00:00:00,3,0.125\n" * 200)[:SAMPLE_SIZE]
+    else:
+        data = os.urandom(SAMPLE_SIZE)
+    assert benchmark(is_likely_binary, data) is (kind == "binary")
+
+
+@pytest.mark.parametrize("header", ["bytes=1048576-1114111", "bytes=-4096", "bytes=0-"])
+def test_parse_range_header(benchmark, header):
+    assert benchmark(parse_range_header, header, 1 << 30) is not None
+
+
+def test_parse_range_header_ranges(benchmark):
+    header = "bytes=" + ", ".join(f"{i * 8192}-{i * 8192 + 4095}" for i in range(32))
+    assert len(benchmark(parse_range_header_ranges, header, 1 << 30, 32)) == 32
+
+
+@pytest.mark.parametrize("filename", ["image.tif", "attributes.json", "config.yaml", "c0.0.0"])
+def test_guess_content_type(benchmark, filename):
+    assert benchmark(guess_content_type, filename)
+
+
+def test_slugify_path(benchmark):
+    assert benchmark(slugify_path, "/nrs/lab/project/2024-01-01 session #3/raw.zarr") == \
+        "nrs_lab_project_2024_01_01_session_3_raw_zarr"
@@ -0,0 +1,36 @@
+"""add cache_invalidations table
+
+Revision ID: c41d7a9e2b53
+Revises: 2d1f0e6b8c91
+Create Date: 2026-10-18 00:00:00.000000
+
+"""
+from alembic import op
+import sqlalchemy as sa
+
+
+# revision identifiers, used by Alembic.
+revision = 'c41d7a9e2b53'
+down_revision = '2d1f0e6b8c91'
+branch_labels = None
+depends_on = None
+
+
+def upgrade() -> None:
+    op.create_table(
+        'cache_invalidations',
+        sa.Column('id', sa.Integer(), primary_key=True, autoincrement=True),
+        sa.Column('cache_name', sa.String(), nullable=False),
+        sa.Column('cache_key', sa.String(), nullable=False),
+        sa.Column('created_at', sa.DateTime(), nullable=False)
+    )
+    op.create_index(
+        'ix_cache_invalidations_created_at',
+        'cache_invalidations',
+        ['created_at']
+    )
+
+
+def downgrade() -> None:
+    op.drop_index('ix_cache_invalidations_created_at', table_name='cache_invalidations')
+    op.drop_table('cache_invalidations')
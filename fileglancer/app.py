@@ -1,13 +1,15 @@
 import os
+import stat
 import sys
-import pwd
-import grp
 import json
 import secrets
+import asyncio
+from concurrent.futures import ThreadPoolExecutor
 from datetime import datetime, timedelta, timezone, UTC
 from functools import cache
+from itertools import islice
 from pathlib import Path as PathLib
-from typing import List, Optional, Dict, Tuple, Generator
+from typing import Any, Awaitable, Callable, List, Optional, Dict, Tuple, Generator, Literal
 
 try:
     import tomllib
@@ -28,16 +30,25 @@ from urllib.parse import quote, unquote
 
 from fileglancer import database as db
 from fileglancer import auth
+from fileglancer import identity
 from fileglancer.model import *
 from fileglancer.settings import get_settings
 from fileglancer.issues import create_jira_ticket, get_jira_ticket_details, delete_jira_ticket
-from fileglancer.utils import format_timestamp, guess_content_type, parse_range_header
-from fileglancer.user_context import UserContext, EffectiveUserContext, CurrentUserContext, UserContextConfigurationError
-from fileglancer.filestore import Filestore, RootCheckError
+from fileglancer.utils import (format_http_date, guess_content_type, if_range_matches, is_not_modified,
+                               make_etag, parse_range_header_ranges)
+from fileglancer.user_context import UserContext, EffectiveUserContext, CurrentUserContext, ThreadUserContext, UserContextExecutor, UserContextConfigurationError, thread_credentials_supported
+from fileglancer.filestore import Filestore, FileInfo, RootCheckError, encode_listing_cursor_key, decode_listing_cursor, get_read_size_policy
+from fileglancer.binary_cache import get_binary_cache_stats
+from fileglancer.content_cache import get_content_cache, get_content_cache_stats
+from fileglancer.listing_cache import get_listing_cache_stats
+from fileglancer.proxy_routes import (ProxyRoute, get_missing_object_cache, get_proxy_route_cache,
+                                      get_proxy_route_cache_stats)
+from fileglancer.read_ahead import get_read_ahead, get_read_ahead_stats
 from fileglancer.log import AccessLogMiddleware
+from fileglancer.responses import FileHandleResponse, MultipartByteRangesResponse
 from fileglancer import sshkeys
 
-from x2s3.utils import get_read_access_acl, get_nosuchbucket_response, get_error_response
+from x2s3.utils import get_read_access_acl, get_nosuchbucket_response, get_nosuchkey_response, get_error_response
 from x2s3.client_file import FileProxyClient
 from x2s3.client import ObjectHandle
 
@@ -69,6 +80,9 @@ def _read_version() -> str:
 
 APP_VERSION = _read_version()
 
+# Number of directory entries serialized per chunk of a streamed listing
+LISTING_STREAM_BATCH_SIZE = 500
+
 
 def get_current_user(request: Request):
     """
@@ -190,36 +204,115 @@ def create_app(settings):
     # Define ui_dir for serving static files and SPA
     ui_dir = PathLib(__file__).parent / "ui"
 
+    # In-memory file share paths, so that requests do not have to query them
+    fsp_registry = db.get_file_share_path_registry(settings.db_url)
+
+    # Worker threads with per-thread credentials, so that users do not wait for each other
+    user_executor = None
+    if settings.use_access_flags and settings.user_context_threads > 0:
+        if thread_credentials_supported():
+            user_executor = UserContextExecutor(settings.user_context_threads)
+        else:
+            logger.warning("Per-thread user credentials are not supported on this platform, ignoring user_context_threads")
+
     def _get_user_context(username: str) -> UserContext:
         if settings.use_access_flags:
+            if user_executor is not None:
+                # Process-wide credential changes would also change those of the workers
+                return ThreadUserContext(username)
             return EffectiveUserContext(username)
         else:
             return CurrentUserContext()
 
+    # Threads reading file content for /api/content, so that reads do not block the event loop
+    content_executor = ThreadPoolExecutor(max_workers=settings.content_io_threads, thread_name_prefix="content-io")
+
+    async def _run_as_user(username: str, fn: Callable[[], Any]) -> Any:
+        """Run fn with the file access permissions of the user, on a worker thread if available"""
+        if user_executor is not None:
+            return await user_executor.run(username, fn)
+        with _get_user_context(username):
+            return fn()
+
 
-    def _get_file_proxy_client(sharing_key: str, sharing_name: str) -> Tuple[FileProxyClient, UserContext] | Tuple[Response, None]:
+    def _publish_cache_invalidations(invalidations: List[Tuple[str, str]]):
+        """Publish the cache invalidations of a change to the files to the other server processes"""
+        if not invalidations:
+            return
         with db.get_db_session(settings.db_url) as session:
+            db.publish_cache_invalidations(session, invalidations)
+            session.commit()
 
-            proxied_path = db.get_proxied_path_by_sharing_key(session, sharing_key)
-            if not proxied_path:
-                return get_nosuchbucket_response(sharing_name), None
 
-            # Vol-E viewer sends URLs with literal % characters (not URL-encoded)
-            # FastAPI automatically decodes path parameters - % chars are treated as escapes, creating a garbled sharing_name if they're present
-            # We therefore need to handle two cases:
-            #   1. Properly encoded requests (sharing_name matches DB value of proxied_path.sharing_name)
-            #   2. Vol-E's unencoded requests (unquote(proxied_path.sharing_name) matches the garbled request value)
-            if proxied_path.sharing_name != sharing_name and unquote(proxied_path.sharing_name) != sharing_name:
-                return get_error_response(404, "NoSuchKey", f"Sharing name mismatch for sharing key {sharing_key}", sharing_name), None
+    def _get_proxy_route(sharing_key: str, sharing_name: str) -> ProxyRoute | Response:
+        """Get the route of a data link, from the route cache if possible"""
+        # Drop the routes of data links changed by other server processes
+        db.poll_cache_invalidations(settings.db_url)
+        route_cache = get_proxy_route_cache()
+        route = route_cache.get(sharing_key, fsp_registry.get)
+        if route is None:
+            with db.get_db_session(settings.db_url) as session:
+                proxied_path = db.get_proxied_path_by_sharing_key(session, sharing_key)
+                if not proxied_path:
+                    return get_nosuchbucket_response(sharing_name)
+
+                fsp = fsp_registry.get(proxied_path.fsp_name)
+                if not fsp:
+                    return get_error_response(400, "InvalidArgument", f"File share path {proxied_path.fsp_name} not found", sharing_name)
+                # Expand ~ to user's home directory before constructing the mount path
+                expanded_mount_path = os.path.expanduser(fsp.mount_path)
+                mount_path = f"{expanded_mount_path}/{proxied_path.path}"
+                # Use the read size configured for the file share (larger reads are faster on network filesystems)
+                buffer_size = get_read_size_policy().get_share_read_size(expanded_mount_path)
+                client = FileProxyClient(proxy_kwargs={'target_name': proxied_path.sharing_name},
+                                         path=mount_path, buffer_size=buffer_size)
+                route = ProxyRoute(sharing_key=sharing_key, sharing_name=proxied_path.sharing_name,
+                                   username=proxied_path.username, fsp=fsp, mount_path=mount_path, client=client)
+            route_cache.put(route)
+
+        # Vol-E viewer sends URLs with literal % characters (not URL-encoded)
+        # FastAPI automatically decodes path parameters - % chars are treated as escapes, creating a garbled sharing_name if they're present
+        # We therefore need to handle two cases:
+        #   1. Properly encoded requests (sharing_name matches DB value of proxied_path.sharing_name)
+        #   2. Vol-E's unencoded requests (unquote(proxied_path.sharing_name) matches the garbled request value)
+        if route.sharing_name != sharing_name and unquote(route.sharing_name) != sharing_name:
+            return get_error_response(404, "NoSuchKey", f"Sharing name mismatch for sharing key {sharing_key}", sharing_name)
+        return route
+
+
+    async def _run_read_ahead(username: str, fn: Callable[[], Any]) -> Any:
+        """Run a read-ahead with the file access permissions of the user, off the event loop"""
+        if user_executor is not None:
+            return await user_executor.run(username, fn)
+        return await asyncio.get_running_loop().run_in_executor(content_executor, fn)
+
+
+    def _start_read_ahead(route: ProxyRoute, key: str, length: int):
+        """
+        Count the request for a chunk behind a data link, and warm its neighbouring
+        chunks in the background if read-ahead is enabled for the file share
+        """
+        read_ahead = get_read_ahead()
+        root_path = route.client.root_path
+        read_ahead.record_request(root_path, key)
+        # Switching the credentials of the whole process is not safe off the event loop
+        if settings.use_access_flags and user_executor is None:
+            return
+        if read_ahead.is_enabled(root_path):
+            read_ahead.schedule(root_path, key, length, lambda fn: _run_read_ahead(route.username, fn))
 
-            fsp = db.get_file_share_path(session, proxied_path.fsp_name)
-            if not fsp:
-                return get_error_response(400, "InvalidArgument", f"File share path {proxied_path.fsp_name} not found", sharing_name), None
-            # Expand ~ to user's home directory before constructing the mount path
-            expanded_mount_path = os.path.expanduser(fsp.mount_path)
-            mount_path = f"{expanded_mount_path}/{proxied_path.path}"
-            # Use 256KB buffer for better performance on network filesystems
-            return FileProxyClient(proxy_kwargs={'target_name': sharing_name}, path=mount_path, buffer_size=256*1024), _get_user_context(proxied_path.username)
+
+    def _run_proxy_call(coro: Awaitable[Any]) -> Any:
+        """
+        Run a call to the FileProxyClient, whose coroutines do blocking file access
+        without awaiting anything, to completion on the current thread
+        """
+        try:
+            coro.send(None)
+        except StopIteration as e:
+            return e.value
+        coro.close()
+        raise RuntimeError("The proxy client call did not complete synchronously")
 
 
     @asynccontextmanager
@@ -263,8 +356,14 @@ def create_app(settings):
 
         logger.info(f"Server ready")
         yield
-        # Cleanup (if needed)
-        pass
+
+        if user_executor is not None:
+            user_executor.shutdown()
+        content_executor.shutdown(wait=False, cancel_futures=True)
+
+        # Write the last accessed times of sessions that are still pending
+        with db.get_db_session(settings.db_url) as session:
+            db.flush_session_access_times(session)
 
     app = FastAPI(lifespan=lifespan)
 
@@ -272,6 +371,9 @@ def create_app(settings):
     # This logs HTTP access information with authenticated username
     app.add_middleware(AccessLogMiddleware, settings=settings)
 
+    # Share one database session between authentication and the endpoint
+    app.add_middleware(db.RequestSessionMiddleware)
+
     # Generate random session_secret_key if not configured
     if settings.session_secret_key is None:
         settings.session_secret_key = secrets.token_urlsafe(32)
@@ -340,6 +442,26 @@ def create_app(settings):
         return {"version": APP_VERSION}
 
 
+    @app.get("/api/cache-stats", response_model=dict,
+             description="Get hit/miss counters for the server's in-process caches and database connections")
+    async def cache_stats_endpoint(username: str = Depends(get_current_user)):
+        return {
+            **identity.get_id_name_cache_stats(),
+            "listings": get_listing_cache_stats(),
+            "binary_detection": get_binary_cache_stats(),
+            "content": get_content_cache_stats(),
+            "file_share_paths": fsp_registry.stats(),
+            "proxy_routes": get_proxy_route_cache_stats(),
+            "missing_sharing_keys": db.get_missing_sharing_key_stats(),
+            "missing_objects": get_missing_object_cache().stats(),
+            "read_ahead": get_read_ahead_stats(),
+            "db_connections": db.get_connection_stats(),
+            "sessions": db.get_session_cache_stats(),
+            "invalidations": db.get_cache_invalidation_stats(),
+            "read_sizes": get_read_size_policy().stats(),
+        }
+
+
     # Authentication routes
     @app.get("/api/auth/login", include_in_schema=settings.enable_okta_auth,
              description="Initiate OKTA OAuth login flow")
@@ -384,6 +506,9 @@ def create_app(settings):
             if not username:
                 raise HTTPException(status_code=400, detail="Unable to extract username from OKTA response")
 
+            # Refresh the user's cached group memberships on login
+            identity.invalidate_user_identity(username)
+
             # Create session in database
             expires_at = datetime.now(UTC) + timedelta(hours=settings.session_expiry_hours)
 
@@ -494,9 +619,7 @@ def create_app(settings):
     @app.get("/api/file-share-paths", response_model=FileSharePathResponse,
              description="Get all file share paths from the database")
     async def get_file_share_paths() -> List[FileSharePath]:
-        with db.get_db_session(settings.db_url) as session:
-            paths = db.get_file_share_paths(session)
-            return FileSharePathResponse(paths=paths)
+        return FileSharePathResponse(paths=fsp_registry.get_paths())
 
 
     @app.get("/api/external-buckets", response_model=ExternalBucketResponse,
@@ -936,6 +1059,75 @@ def create_app(settings):
         return NeuroglancerShortLinkResponse(links=links)
 
 
+    async def _cached_content_response(file_handle, stat_result: os.stat_result, start: int, length: int,
+                                       status_code: int, headers: dict, media_type: str) -> Optional[Response]:
+        """
+        Send a small byte range of a file that was opened in the user context from
+        the content cache, reading and caching it on a miss. Returns None if the
+        range is not cached, in which case the caller streams it from the file.
+        The file is closed if a response is returned.
+        """
+        content_cache = get_content_cache()
+        if not content_cache.accepts(length):
+            return None
+        try:
+            content = await content_cache.read(file_handle, stat_result, start, length, content_executor)
+        except BaseException:
+            file_handle.close()
+            raise
+        if content is None:
+            return None
+        file_handle.close()
+        return Response(content=content, status_code=status_code, headers=headers, media_type=media_type)
+
+
+    def _request_proxy_object(client: FileProxyClient, path: str, request_object: Callable[[], Awaitable[Any]]):
+        """
+        Request an object through the /files proxy, in the user context. Objects that
+        were not found are remembered in the missing object cache, so that repeated
+        probes for them do not reach the proxy client.
+        """
+        missing_objects = get_missing_object_cache()
+        if missing_objects.is_missing(client.root_path, path):
+            return get_nosuchkey_response(path)
+        result = _run_proxy_call(request_object())
+        if isinstance(result, Response) and result.status_code == 404:
+            missing_objects.put(client.root_path, path)
+        return result
+
+
+    def _file_handle_validators(handle: ObjectHandle):
+        """Returns the ETag and modification time of the file opened by the /files proxy"""
+        stat_result = os.fstat(handle.file_handle.fileno())
+        return make_etag(stat_result), stat_result.st_mtime
+
+
+    def _file_handle_if_range_matches(request: Request, handle: ObjectHandle) -> bool:
+        """Evaluate the If-Range header of a /files request against the opened file"""
+        if_range = request.headers.get("if-range")
+        if not if_range:
+            return True
+        etag, mtime = _file_handle_validators(handle)
+        return if_range_matches(if_range, etag, mtime)
+
+
+    def _apply_file_handle_validators(request: Request, handle: ObjectHandle) -> Optional[Response]:
+        """
+        Add the ETag of the file opened by the /files proxy to its headers, and
+        evaluate the conditional request headers against it. Returns a 304 response
+        (closing the file) if the client's copy is current, otherwise None.
+        """
+        etag, mtime = _file_handle_validators(handle)
+        handle.headers["ETag"] = etag
+        if is_not_modified(request.headers, etag, mtime):
+            handle.close()
+            headers = {"ETag": etag}
+            if "Last-Modified" in handle.headers:
+                headers["Last-Modified"] = handle.headers["Last-Modified"]
+            return Response(status_code=304, headers=headers)
+        return None
+
+
     @app.get("/files/{sharing_key}/{sharing_name}")
     @app.get("/files/{sharing_key}/{sharing_name}/{path:path}")
     async def target_dispatcher(request: Request,
@@ -954,27 +1146,45 @@ def create_app(settings):
         if 'acl' in request.query_params:
             return get_read_access_acl()
 
-        client, ctx = _get_file_proxy_client(sharing_key, sharing_name)
-        if isinstance(client, Response):
-            return client
+        route = _get_proxy_route(sharing_key, sharing_name)
+        if isinstance(route, Response):
+            return route
+        client = route.client
 
         if list_type:
             if list_type == 2:
-                with ctx:
-                    return await client.list_objects_v2(continuation_token, delimiter, \
-                        encoding_type, fetch_owner, max_keys, prefix, start_after)
+                return await _run_as_user(route.username, lambda: _run_proxy_call(client.list_objects_v2(
+                    continuation_token, delimiter, encoding_type, fetch_owner, max_keys, prefix, start_after)))
             else:
                 return get_error_response(400, "InvalidArgument", f"Invalid list type {list_type}", path)
         else:
             range_header = request.headers.get("range")
 
+            def _open_object():
+                handle = _request_proxy_object(client, path, lambda: client.open_object(path, range_header))
+                if (isinstance(handle, ObjectHandle) and range_header
+                        and not _file_handle_if_range_matches(request, handle)):
+                    # The client's copy is outdated, so send the whole file instead of the ranges
+                    handle.close()
+                    handle = _run_proxy_call(client.open_object(path))
+                return handle
+
             # Open file in user context, then immediately exit
             # The file descriptor retains access rights after we switch back to root
-            with ctx:
-                handle = await client.open_object(path, range_header)
+            handle = await _run_as_user(route.username, _open_object)
 
             # Context exited! Now stream without holding the lock
             if isinstance(handle, ObjectHandle):
+                not_modified = _apply_file_handle_validators(request, handle)
+                if not_modified is not None:
+                    return not_modified
+                if not range_header:
+                    _start_read_ahead(route, path, handle.content_length)
+                cached = await _cached_content_response(handle.file_handle, os.fstat(handle.file_handle.fileno()),
+                                                        handle.start, handle.content_length, handle.status_code,
+                                                        handle.headers, handle.media_type)
+                if cached is not None:
+                    return cached
                 return client.stream_object(handle)
             else:
                 # Error response (e.g., file not found, invalid range)
@@ -982,13 +1192,34 @@ def create_app(settings):
 
 
     @app.head("/files/{sharing_key}/{sharing_name}/{path:path}")
-    async def head_object(sharing_key: str, sharing_name: str, path: str):
+    async def head_object(request: Request, sharing_key: str, sharing_name: str, path: str):
         try:
-            client, ctx = _get_file_proxy_client(sharing_key, sharing_name)
-            if isinstance(client, Response):
-                return client
-            with ctx:
-                return await client.head_object(path)
+            route = _get_proxy_route(sharing_key, sharing_name)
+            if isinstance(route, Response):
+                return route
+            client = route.client
+
+            def _head_object():
+                response = _request_proxy_object(client, path, lambda: client.head_object(path))
+                if response.status_code != 200:
+                    return response, None
+                try:
+                    # The proxy found a file inside the shared directory at this path
+                    return response, os.stat(os.path.join(client.root_path, path))
+                except OSError:
+                    return response, None
+
+            response, stat_result = await _run_as_user(route.username, _head_object)
+            if stat_result is None:
+                return response
+            etag = make_etag(stat_result)
+            response.headers["ETag"] = etag
+            if is_not_modified(request.headers, etag, stat_result.st_mtime):
+                headers = {"ETag": etag}
+                if "Last-Modified" in response.headers:
+                    headers["Last-Modified"] = response.headers["Last-Modified"]
+                return Response(status_code=304, headers=headers)
+            return response
         except:
             logger.opt(exception=sys.exc_info()).info("Error requesting head")
             return get_error_response(500, "InternalError", "Error requesting HEAD", path)
@@ -1006,11 +1237,9 @@ def create_app(settings):
 
     def _get_filestore(path_name: str):
         """Get a filestore for the given path name."""
-        # Get file share path using centralized function and filter for the requested path
-        with db.get_db_session(settings.db_url) as session:
-            fsp = db.get_file_share_path(session, path_name)
-            if fsp is None:
-                return None, f"File share path '{path_name}' not found"
+        fsp = fsp_registry.get(path_name)
+        if fsp is None:
+            return None, f"File share path '{path_name}' not found"
 
         # Create a filestore for the file share path
         filestore = _get_mounted_filestore(fsp)
@@ -1024,36 +1253,28 @@ def create_app(settings):
     @app.get("/api/profile", description="Get the current user's profile")
     async def get_profile(username: str = Depends(get_current_user)):
         """Get the current user's profile"""
-        with _get_user_context(username):
+        def _get_profile():
 
             # Find matching file share path for home directory
-            with db.get_db_session(settings.db_url) as session:
-                paths = db.get_file_share_paths(session)
+            paths = fsp_registry.get_paths()
 
-                # First, check if there's a "home" FSP (for ~/ paths)
-                home_fsp = next((fsp for fsp in paths if fsp.mount_path in ('~', '~/')), None)
-                if home_fsp:
-                    home_directory_name = "."
-                else:
-                    # If no "home" FSP exists, fall back to finding by mount path
-                    home_directory_path = os.path.expanduser(f"~{username}")
-                    home_parent = os.path.dirname(home_directory_path)
-                    home_fsp = next((fsp for fsp in paths if fsp.mount_path == home_parent), None)
-                    home_directory_name = os.path.basename(home_directory_path)
+            # First, check if there's a "home" FSP (for ~/ paths)
+            home_fsp = next((fsp for fsp in paths if fsp.mount_path in ('~', '~/')), None)
+            if home_fsp:
+                home_directory_name = "."
+            else:
+                # If no "home" FSP exists, fall back to finding by mount path
+                home_directory_path = os.path.expanduser(f"~{username}")
+                home_parent = os.path.dirname(home_directory_path)
+                home_fsp = next((fsp for fsp in paths if fsp.mount_path == home_parent), None)
+                home_directory_name = os.path.basename(home_directory_path)
 
-                home_fsp_name = home_fsp.name if home_fsp else None
+            home_fsp_name = home_fsp.name if home_fsp else None
 
             # Get user groups
             user_groups = []
             try:
-                user_info = pwd.getpwnam(username)
-                all_groups = grp.getgrall()
-                for group in all_groups:
-                    if username in group.gr_mem:
-                        user_groups.append(group.gr_name)
-                primary_group = grp.getgrgid(user_info.pw_gid).gr_name
-                if primary_group not in user_groups:
-                    user_groups.append(primary_group)
+                user_groups = identity.get_user_group_names(username)
             except Exception as e:
                 logger.error(f"Error getting groups for user {username}: {str(e)}")
 
@@ -1064,6 +1285,8 @@ def create_app(settings):
                 "groups": user_groups,
             }
 
+        return await _run_as_user(username, _get_profile)
+
     # SSH Key Management endpoints
     @app.get("/api/ssh-keys", response_model=sshkeys.SSHKeyListResponse,
              description="List Fileglancer-managed SSH keys")
@@ -1106,7 +1329,8 @@ def create_app(settings):
 
     # File content endpoint
     @app.head("/api/content/{path_name:path}")
-    async def head_file_content(path_name: str,
+    async def head_file_content(request: Request,
+                                path_name: str,
                                 subpath: Optional[str] = Query(''),
                                 username: str = Depends(get_current_user)):
         """Handle HEAD requests to get file metadata without content"""
@@ -1116,7 +1340,7 @@ def create_app(settings):
         else:
             filestore_name, _, subpath = path_name.partition('/')
 
-        with _get_user_context(username):
+        def _get_headers():
             filestore, error = _get_filestore(filestore_name)
             if filestore is None:
                 raise HTTPException(status_code=404 if "not found" in error else 500, detail=error)
@@ -1125,23 +1349,25 @@ def create_app(settings):
             content_type = guess_content_type(file_name)
 
             try:
-                file_info = filestore.get_file_info(subpath)
+                stat_result = os.stat(filestore._check_path_in_root(subpath))
+                etag = make_etag(stat_result)
+                validators = {'ETag': etag, 'Last-Modified': format_http_date(stat_result.st_mtime)}
+                # Answer before sampling the file for binary content
+                if is_not_modified(request.headers, etag, stat_result.st_mtime):
+                    return Response(status_code=304, headers=validators)
 
-                is_binary = filestore.check_is_binary(subpath)
+                is_binary = filestore.check_is_binary(subpath, stat_result=stat_result)
 
                 headers = {
                     'Accept-Ranges': 'bytes',
                     'X-Is-Binary': 'true' if is_binary else 'false',
+                    **validators,
                 }
 
                 if content_type == 'application/octet-stream' and file_name:
                     headers['Content-Disposition'] = f'attachment; filename="{file_name}"'
 
-                if hasattr(file_info, 'size') and file_info.size is not None:
-                    headers['Content-Length'] = str(file_info.size)
-
-                if hasattr(file_info, 'last_modified') and file_info.last_modified is not None:
-                    headers['Last-Modified'] = format_timestamp(file_info.last_modified)
+                headers['Content-Length'] = str(0 if stat.S_ISDIR(stat_result.st_mode) else stat_result.st_size)
 
                 return Response(status_code=200, headers=headers, media_type=content_type)
 
@@ -1151,6 +1377,8 @@ def create_app(settings):
             except PermissionError:
                 raise HTTPException(status_code=403, detail="Permission denied")
 
+        return await _run_as_user(username, _get_headers)
+
 
     @app.get("/api/content/{path_name:path}")
     async def get_file_content(request: Request, path_name: str, subpath: Optional[str] = Query(''), username: str = Depends(get_current_user)):
@@ -1163,7 +1391,7 @@ def create_app(settings):
 
         # Open file with user's permissions, then immediately release the context
         # The file descriptor retains the access rights after we switch back to root
-        with _get_user_context(username):
+        def _open_file():
             filestore, error = _get_filestore(filestore_name)
             if filestore is None:
                 raise HTTPException(status_code=404 if "not found" in error else 500, detail=error)
@@ -1181,6 +1409,7 @@ def create_app(settings):
                 # Open the file while we have user's permissions
                 full_path = filestore._check_path_in_root(subpath)
                 file_handle = open(full_path, 'rb')
+                stat_result = os.fstat(file_handle.fileno())
 
             except RootCheckError as e:
                 # Path attempts to escape root directory - try to find a valid fsp for this absolute path
@@ -1189,8 +1418,7 @@ def create_app(settings):
                 # Use the full_path from the exception
                 full_path = e.full_path
 
-                with db.get_db_session(settings.db_url) as session:
-                    match = db.find_fsp_from_absolute_path(session, full_path)
+                match = fsp_registry.find(full_path)
 
                 if match:
                     fsp, relative_subpath = match
@@ -1212,25 +1440,55 @@ def create_app(settings):
             except PermissionError:
                 raise HTTPException(status_code=403, detail="Permission denied")
 
+            return filestore, file_name, content_type, file_size, file_handle, stat_result
+
+        opened = await _run_as_user(username, _open_file)
+        if isinstance(opened, Response):
+            return opened
+        filestore, file_name, content_type, file_size, file_handle, stat_result = opened
+
         # Context exited! We're back to root, but file_handle retains user's access rights
         # Now we can stream the file asynchronously without holding the user context lock
 
+        etag = make_etag(stat_result)
+        validators = {'ETag': etag, 'Last-Modified': format_http_date(stat_result.st_mtime)}
+        if is_not_modified(request.headers, etag, stat_result.st_mtime):
+            file_handle.close()
+            return Response(status_code=304, headers=validators)
+
         range_header = request.headers.get('Range')
+        if range_header and not if_range_matches(request.headers.get('If-Range'), etag, stat_result.st_mtime):
+            # The client's copy is outdated, so send the whole file instead of the ranges
+            range_header = None
 
         if range_header:
-            range_result = parse_range_header(range_header, file_size)
-            if range_result is None:
+            ranges = parse_range_header_ranges(range_header, file_size, settings.content_max_ranges)
+            if ranges is None:
                 file_handle.close()
                 return Response(
                     status_code=416,
                     headers={'Content-Range': f'bytes */{file_size}'}
                 )
 
-            start, end = range_result
+            if len(ranges) > 1:
+                headers = {'Accept-Ranges': 'bytes', **validators}
+                if content_type == 'application/octet-stream' and file_name:
+                    headers['Content-Disposition'] = f'attachment; filename="{file_name}"'
+
+                def read_range(start: int, end: int):
+                    return filestore.stream_file_async(file_handle, content_executor, start=start, end=end,
+                                                       buffer_size=filestore.get_read_size(end - start + 1),
+                                                       close_file=False)
+
+                return MultipartByteRangesResponse(file_handle, read_range, ranges, file_size,
+                                                   content_type, headers=headers)
+
+            start, end = ranges[0]
             content_length = end - start + 1
 
             headers = {
                 'Accept-Ranges': 'bytes',
+                **validators,
                 'Content-Length': str(content_length),
                 'Content-Range': f'bytes {start}-{end}/{file_size}',
             }
@@ -1238,8 +1496,17 @@ def create_app(settings):
             if content_type == 'application/octet-stream' and file_name:
                 headers['Content-Disposition'] = f'attachment; filename="{file_name}"'
 
-            return StreamingResponse(
-                filestore.stream_file_range(start=start, end=end, file_handle=file_handle),
+            cached = await _cached_content_response(file_handle, stat_result, start, content_length,
+                                                    206, headers, content_type)
+            if cached is not None:
+                return cached
+
+            return FileHandleResponse(
+                file_handle,
+                filestore.stream_file_async(file_handle, content_executor, start=start, end=end,
+                                            buffer_size=filestore.get_read_size(content_length)),
+                offset=start,
+                count=content_length,
                 status_code=206,
                 headers=headers,
                 media_type=content_type
@@ -1247,58 +1514,191 @@ def create_app(settings):
         else:
             headers = {
                 'Accept-Ranges': 'bytes',
+                **validators,
                 'Content-Length': str(file_size),
             }
 
             if content_type == 'application/octet-stream' and file_name:
                 headers['Content-Disposition'] = f'attachment; filename="{file_name}"'
 
-            return StreamingResponse(
-                filestore.stream_file_contents(file_handle=file_handle),
+            cached = await _cached_content_response(file_handle, stat_result, 0, file_size,
+                                                    200, headers, content_type)
+            if cached is not None:
+                return cached
+
+            return FileHandleResponse(
+                file_handle,
+                filestore.stream_file_async(file_handle, content_executor,
+                                            buffer_size=filestore.get_read_size(file_size)),
+                offset=0,
+                count=file_size,
                 status_code=200,
                 headers=headers,
                 media_type=content_type
             )
 
 
+    def _read_listing_batch(filestore: Filestore, files: Generator[Tuple[Optional[tuple], Optional[FileInfo]], None, None],
+                            binary: bool) -> List[Tuple[Optional[tuple], Optional[FileInfo]]]:
+        """Read the next batch of (sort key, FileInfo) pairs of a listing, with is_binary set if requested"""
+        batch = list(islice(files, LISTING_STREAM_BATCH_SIZE))
+        if binary:
+            batch = [(key, file_info if file_info is None else filestore.set_binary_flag(file_info))
+                     for key, file_info in batch]
+        return batch
+
+
+    async def _stream_file_infos(username: str, info: FileInfo, read_batch: Callable[[], list],
+                                 files: Generator[Tuple[Optional[tuple], Optional[FileInfo]], None, None],
+                                 first_batch: list, limit: Optional[int], sort: Optional[str], descending: bool):
+        """
+        Generate a directory listing as newline-delimited JSON, one batch of entries at a time.
+
+        The first line is the directory's own info, followed by one line per entry,
+        and a final next_cursor line for paginated listings. The remaining entries are
+        read with read_batch in the user context one batch at a time, and the context
+        is released while each batch is sent. If the listing fails part way, an error
+        line is sent instead of the remaining entries.
+        """
+        try:
+            yield b'{"info":' + info.model_dump_json().encode() + b'}\n'
+            batch = first_batch
+            # Entries that could not be stat'ed still count towards the page
+            count = 0
+            last_key = None
+            while batch:
+                lines = []
+                for key, file_info in batch:
+                    if limit is not None and count == limit:
+                        # There is at least one more entry after this page
+                        next_cursor = encode_listing_cursor_key(last_key, sort, descending)
+                        lines.append(json.dumps({"next_cursor": next_cursor}).encode() + b'\n')
+                        yield b''.join(lines)
+                        return
+                    if file_info is not None:
+                        lines.append(b'{"file":' + file_info.model_dump_json().encode() + b'}\n')
+                    count += 1
+                    last_key = key
+                yield b''.join(lines)
+
+                try:
+                    batch = await _run_as_user(username, read_batch)
+                except (PermissionError, FileNotFoundError) as e:
+                    logger.error(f"Error while streaming directory listing: {e}")
+                    yield json.dumps({"error": "Directory listing failed"}).encode() + b'\n'
+                    return
+
+            if limit is not None:
+                yield b'{"next_cursor":null}\n'
+        finally:
+            files.close()
+
+
     @app.get("/api/files/{path_name}")
-    async def get_file_metadata(path_name: str, subpath: Optional[str] = Query(''),
+    async def get_file_metadata(request: Request, path_name: str, subpath: Optional[str] = Query(''),
+                                sort: Optional[Literal["name", "size", "mtime"]] = Query(None, description="The field to sort directory entries by (name if not set). Directories are always listed first."),
+                                order: Literal["asc", "desc"] = Query("asc", description="The sort order of directory entries"),
+                                limit: Optional[int] = Query(None, ge=1, description="The maximum number of directory entries to return. If not set, all entries are returned."),
+                                offset: int = Query(0, ge=0, description="The number of directory entries to skip"),
+                                cursor: Optional[str] = Query(None, description="The next_cursor returned with the previous page of directory entries"),
+                                stream: bool = Query(False, description="Stream the listing as newline-delimited JSON (same as Accept: application/x-ndjson)"),
+                                binary: bool = Query(False, description="Include is_binary for each file, detected from a sample of its content"),
                                 username: str = Depends(get_current_user)):
-        """Handle GET requests to list directory contents or return info for the file/folder itself"""
+        """
+        Handle GET requests to list directory contents or return info for the file/folder itself.
+
+        When a limit is given, the listing is paginated and the response includes
+        a next_cursor, which is passed as the cursor of the request for the next
+        page, or is null on the last page. Cursors continue after the last entry
+        returned, so pages stay consistent while entries are added or removed.
+
+        Directory listings are streamed as newline-delimited JSON if stream=true
+        is given or the request accepts application/x-ndjson. Without a sort or a
+        limit, the entries are then sent in directory order as they are read,
+        instead of building the whole listing in memory. Sorted streamed listings
+        only keep the requested page in memory, so they should be given a limit.
+
+        With binary=true, each file has is_binary set as returned by HEAD
+        /api/content, so that the client does not need a request per file.
+        """
 
         if subpath:
             filestore_name = path_name
         else:
             filestore_name, _, subpath = path_name.partition('/')
 
-        with _get_user_context(username):
+        stream = stream or "application/x-ndjson" in request.headers.get("accept", "")
+        descending = order == "desc"
+        if stream and sort is None and limit is None and cursor is None:
+            # Sorting would read the whole directory before sending the first entry
+            sort_by = None
+        else:
+            sort_by = sort or "name"
+        start_after = None
+        if cursor is not None:
+            try:
+                start_after = decode_listing_cursor(cursor, sort_by, descending)
+            except ValueError as e:
+                raise HTTPException(status_code=400, detail=str(e))
+
+        def _get_metadata():
             filestore, error = _get_filestore(filestore_name)
             if filestore is None:
                 raise HTTPException(status_code=404 if "not found" in error else 500, detail=error)
 
             try:
-                with db.get_db_session(settings.db_url) as session:
-                    file_info = filestore.get_file_info(subpath, current_user=username, session=session)
-                    logger.trace(f"File info: {file_info}")
-
-                    result = {"info": json.loads(file_info.model_dump_json())}
-
-                    if file_info.is_dir:
-                        try:
-                            files = list(filestore.yield_file_infos(subpath, current_user=username, session=session))
-                            result["files"] = [json.loads(f.model_dump_json()) for f in files]
-                        except PermissionError:
-                            logger.error(f"Permission denied when listing files in directory: {subpath}")
-                            result["files"] = []
-                            result["error"] = "Permission denied when listing directory contents"
-                            return JSONResponse(content=result, status_code=403)
-                        except FileNotFoundError:
-                            logger.error(f"Directory not found during listing: {subpath}")
-                            result["files"] = []
-                            result["error"] = "Directory contents not found"
-                            return JSONResponse(content=result, status_code=404)
-
-                    return result
+                fsp_index = fsp_registry.get_index()
+                file_info = filestore.get_file_info(subpath, current_user=username, fsp_index=fsp_index)
+                logger.trace(f"File info: {file_info}")
+
+                if file_info.is_dir and stream:
+                    files = filestore.yield_keyed_file_infos(subpath, current_user=username, fsp_index=fsp_index,
+                                                             sort_by=sort_by, descending=descending,
+                                                             start_after=start_after, offset=offset,
+                                                             limit=None if limit is None else limit + 1)
+                    read_batch = lambda: _read_listing_batch(filestore, files, binary)
+                    try:
+                        # Read the first batch now, so that errors are reported with a status code
+                        first_batch = read_batch()
+                    except (PermissionError, FileNotFoundError):
+                        files.close()
+                        raise
+                    return StreamingResponse(
+                        _stream_file_infos(username, file_info, read_batch, files, first_batch, limit,
+                                           sort_by, descending),
+                        media_type="application/x-ndjson"
+                    )
+
+                result = {"info": json.loads(file_info.model_dump_json())}
+
+                if file_info.is_dir:
+                    try:
+                        # Select one extra entry to find out if there is a next page. Entries
+                        # that could not be stat'ed are selected without a FileInfo.
+                        keyed_files = list(filestore.yield_keyed_file_infos(
+                            subpath, current_user=username, fsp_index=fsp_index,
+                            sort_by=sort_by, descending=descending, start_after=start_after,
+                            offset=offset, limit=None if limit is None else limit + 1))
+                        if limit is not None:
+                            has_more = len(keyed_files) > limit
+                            keyed_files = keyed_files[:limit]
+                            result["next_cursor"] = encode_listing_cursor_key(keyed_files[-1][0], sort_by, descending) if has_more else None
+                        files = [f for _, f in keyed_files if f is not None]
+                        if binary:
+                            files = filestore.yield_binary_flags(files)
+                        result["files"] = [json.loads(f.model_dump_json()) for f in files]
+                    except PermissionError:
+                        logger.error(f"Permission denied when listing files in directory: {subpath}")
+                        result["files"] = []
+                        result["error"] = "Permission denied when listing directory contents"
+                        return JSONResponse(content=result, status_code=403)
+                    except FileNotFoundError:
+                        logger.error(f"Directory not found during listing: {subpath}")
+                        result["files"] = []
+                        result["error"] = "Directory contents not found"
+                        return JSONResponse(content=result, status_code=404)
+
+                return result
 
             except RootCheckError as e:
                 # Path attempts to escape root directory - try to find a valid fsp for this absolute path
@@ -1306,8 +1706,7 @@ def create_app(settings):
 
                 full_path = e.full_path
 
-                with db.get_db_session(settings.db_url) as session:
-                    match = db.find_fsp_from_absolute_path(session, full_path)
+                match = fsp_registry.find(full_path)
 
                 if match:
                     fsp, relative_subpath = match
@@ -1329,6 +1728,8 @@ def create_app(settings):
             except PermissionError:
                 raise HTTPException(status_code=403, detail="Permission denied")
 
+        return await _run_as_user(username, _get_metadata)
+
 
     @app.post("/api/files/{path_name}")
     async def create_file_or_dir(path_name: str,
@@ -1356,7 +1757,7 @@ def create_app(settings):
         # Use the validated and sanitized path for all operations
         validated_subpath = normalized_path
 
-        with _get_user_context(username):
+        def _create():
             filestore, error = _get_filestore(path_name)
             if filestore is None:
                 raise HTTPException(status_code=404 if "not found" in error else 500, detail=error)
@@ -1366,11 +1767,11 @@ def create_app(settings):
                 if file_type == "directory":
                     logger.info(f"User {username} creating directory {path_name}/{validated_subpath}")
                     # Path is validated above - safe to use in filesystem operation
-                    filestore.create_dir(validated_subpath)
+                    return filestore.create_dir(validated_subpath)
                 elif file_type == "file":
                     logger.info(f"User {username} creating file {path_name}/{validated_subpath}")
                     # Path is validated above - safe to use in filesystem operation
-                    filestore.create_empty_file(validated_subpath)
+                    return filestore.create_empty_file(validated_subpath)
                 else:
                     raise HTTPException(status_code=400, detail="Invalid file type")
 
@@ -1379,7 +1780,8 @@ def create_app(settings):
             except PermissionError as e:
                 raise HTTPException(status_code=403, detail=str(e))
 
-            return JSONResponse(status_code=201, content={"message": "Item created"})
+        _publish_cache_invalidations(await _run_as_user(username, _create))
+        return JSONResponse(status_code=201, content={"message": "Item created"})
 
 
     @app.patch("/api/files/{path_name}")
@@ -1388,7 +1790,7 @@ def create_app(settings):
                                  body: Dict = Body(...),
                                  username: str = Depends(get_current_user)):
         """Handle PATCH requests to rename or update file permissions"""
-        with _get_user_context(username):
+        def _update():
             filestore, error = _get_filestore(path_name)
             if filestore is None:
                 raise HTTPException(status_code=404 if "not found" in error else 500, detail=error)
@@ -1416,19 +1818,25 @@ def create_app(settings):
             try:
                 if new_permissions is not None and new_permissions != old_file_info.permissions:
                     logger.info(f"User {username} changing permissions of {old_file_info.absolute_path} to {new_permissions}")
-                    filestore.change_file_permissions(subpath, new_permissions)
+                    invalidations.extend(filestore.change_file_permissions(subpath, new_permissions))
 
                 if new_path is not None and new_path != old_file_info.path:
                     logger.info(f"User {username} renaming {old_file_info.absolute_path} to {validated_new_path}")
                     # Path is validated above - safe to use in filesystem operation
-                    filestore.rename_file_or_dir(old_file_info.path, validated_new_path)
+                    invalidations.extend(filestore.rename_file_or_dir(old_file_info.path, validated_new_path))
 
             except PermissionError as e:
                 raise HTTPException(status_code=403, detail=str(e))
             except OSError as e:
                 raise HTTPException(status_code=500, detail=str(e))
 
-            return JSONResponse(status_code=200, content={"message": "Permissions changed"})
+        invalidations = []
+        try:
+            await _run_as_user(username, _update)
+        finally:
+            # Also publish a permission change made before a failed rename
+            _publish_cache_invalidations(invalidations)
+        return JSONResponse(status_code=200, content={"message": "Permissions changed"})
 
 
     @app.delete("/api/files/{fsp_name}")
@@ -1436,18 +1844,19 @@ def create_app(settings):
                                  subpath: Optional[str] = Query(''),
                                  username: str = Depends(get_current_user)):
         """Handle DELETE requests to remove a file or (empty) directory"""
-        with _get_user_context(username):
+        def _delete():
             filestore, error = _get_filestore(fsp_name)
             if filestore is None:
                 raise HTTPException(status_code=404 if "not found" in error else 500, detail=error)
 
             try:
                 logger.info(f"User {username} deleting {filestore.get_root_path()}/{subpath}")
-                filestore.remove_file_or_dir(subpath)
+                return filestore.remove_file_or_dir(subpath)
             except PermissionError as e:
                 raise HTTPException(status_code=403, detail=str(e))
 
-            return JSONResponse(status_code=200, content={"message": "Item deleted"})
+        _publish_cache_invalidations(await _run_as_user(username, _delete))
+        return JSONResponse(status_code=200, content={"message": "Item deleted"})
 
 
     @app.post("/api/auth/simple-login", include_in_schema=not settings.enable_okta_auth)
@@ -1470,6 +1879,9 @@ def create_app(settings):
         if not next_url.startswith("/"):
             next_url = "/browse"
 
+        # Refresh the user's cached group memberships on login
+        identity.invalidate_user_identity(username)
+
         # Create session in database
         expires_at = datetime.now(UTC) + timedelta(hours=settings.session_expiry_hours)
 
@@ -70,38 +70,66 @@ def get_session_from_cookie(request: Request, settings: Settings) -> Optional[db
     if not session_id:
         return None
 
-    # Get session from database
+    # The session is validated once per request, and shared by the access log and the endpoints
+    cached = getattr(request.state, "user_session", None)
+    if cached is not None and cached[0] == session_id:
+        return cached[1]
+
+    user_session = _validate_session(session_id, settings)
+    request.state.user_session = (session_id, user_session)
+    return user_session
+
+
+def _validate_session(session_id: str, settings: Settings) -> Optional[db.SessionDB]:
+    """Get the session with the given id, if it is valid, and record the access"""
+    # Drop the sessions logged out through other server processes
+    db.poll_cache_invalidations(settings.db_url)
+    user_session = db.get_cached_user_session(session_id)
+    if user_session is None or _get_invalid_reason(user_session, settings):
+        # Not cached, or no longer valid: check it against the database
+        user_session = _load_session(session_id, settings)
+        if not user_session:
+            return None
+
+    # Update last accessed time (batched with the accesses to other sessions)
+    db.record_session_access(settings.db_url, session_id)
+    return user_session
+
+
+def _get_invalid_reason(user_session: db.SessionDB, settings: Settings) -> Optional[str]:
+    """Return why a session is no longer valid, or None if it is valid"""
+    # Check if session is expired
+    # Note: SQLAlchemy doesn't preserve timezone info, so we add UTC back
+    expires_at_utc = user_session.expires_at.replace(tzinfo=UTC)
+    if expires_at_utc < datetime.now(UTC):
+        return "Session expired"
+
+    # Check if session secret key has changed (if hash is stored)
+    if user_session.session_secret_key_hash:
+        current_key_hash = _hash_session_secret_key(settings.session_secret_key)
+        if user_session.session_secret_key_hash != current_key_hash:
+            return "Session secret key changed"
+
+    return None
+
+
+def _load_session(session_id: str, settings: Settings) -> Optional[db.SessionDB]:
+    """Get a session from the database and cache it if it is valid, or delete it if it is not"""
     with db.get_db_session(settings.db_url) as session:
         user_session = db.get_session_by_id(session, session_id)
 
         if not user_session:
             return None
 
-        # Check if session is expired
-        # Note: SQLAlchemy doesn't preserve timezone info, so we add UTC back
-        expires_at_utc = user_session.expires_at.replace(tzinfo=UTC)
-        if expires_at_utc < datetime.now(UTC):
-            logger.info(f"Session expired for user {user_session.username}")
+        reason = _get_invalid_reason(user_session, settings)
+        if reason:
+            logger.info(f"{reason}, revoking session for user {user_session.username}")
             db.delete_session(session, session_id)
             return None
 
-        # Check if session secret key has changed (if hash is stored)
-        if user_session.session_secret_key_hash:
-            current_key_hash = _hash_session_secret_key(settings.session_secret_key)
-            if user_session.session_secret_key_hash != current_key_hash:
-                logger.warning(f"Session secret key changed, revoking session for user {user_session.username}")
-                db.delete_session(session, session_id)
-                return None
-
-        # Update last accessed time
-        db.update_session_access_time(session, session_id)
-
-        # Access all attributes while still in session context to avoid DetachedInstanceError
-        # This forces SQLAlchemy to load all attributes before the session closes
-        _ = user_session.username
-        _ = user_session.email
-        _ = user_session.session_id
-
+        # Detach the session with all its attributes loaded, so that it can be used
+        # after the database session closes, and by later requests
+        db.cache_user_session(session, user_session)
         return user_session
 
 
@@ -120,6 +148,8 @@ def get_current_user(request: Request, settings: Settings) -> str:
             detail="Authentication required. Please log in."
         )
 
+    # Make the user available to the access log
+    request.state.username = user_session.username
     return user_session.username
 
 
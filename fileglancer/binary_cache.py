@@ -0,0 +1,98 @@
+"""
+A shared cache of binary-detection results.
+
+Whether a file is likely binary is decided from a sample of its content, which
+costs an open and a read for every HEAD request and directory listing entry.
+The result is cached by the identity of the file (st_dev, st_ino) together
+with its modification time and size, so a file that is rewritten is sampled
+again. The cache is shared between users, so callers must check that the user
+can read a file before using its cached result.
+"""
+
+import os
+import threading
+from typing import Dict, Optional, Tuple
+
+from cachetools import LRUCache
+
+from fileglancer.cache_utils import is_mtime_settled
+from fileglancer.settings import get_settings
+
+
+def _binary_cache_key(stat_result: os.stat_result, sample_size: int) -> Tuple[int, int, int, int, int]:
+    return (stat_result.st_dev, stat_result.st_ino, stat_result.st_mtime_ns, stat_result.st_size, sample_size)
+
+
+class BinaryCache:
+    """A bounded LRU cache of binary-detection results, keyed by file identity and modification time"""
+
+    def __init__(self, maxsize: int):
+        self._cache = LRUCache(maxsize=maxsize)
+        self._lock = threading.Lock()
+        self.hits = 0
+        self.misses = 0
+
+    @property
+    def enabled(self) -> bool:
+        return self._cache.maxsize > 0
+
+    def get(self, stat_result: os.stat_result, sample_size: int) -> Optional[bool]:
+        """Get the cached result for a file, if it has not changed since it was sampled"""
+        if not self.enabled:
+            return None
+        with self._lock:
+            is_binary = self._cache.get(_binary_cache_key(stat_result, sample_size))
+            if is_binary is not None:
+                self.hits += 1
+            else:
+                self.misses += 1
+            return is_binary
+
+    def put(self, stat_result: os.stat_result, sample_size: int, is_binary: bool):
+        """Cache the result for a file that was sampled after stat_result was taken"""
+        if not self.enabled or not is_mtime_settled(stat_result.st_mtime_ns):
+            return
+        with self._lock:
+            self._cache[_binary_cache_key(stat_result, sample_size)] = is_binary
+
+    def invalidate_file(self, st_dev: int, st_ino: int):
+        """Remove the results of the file with the given identity, which was removed or replaced"""
+        with self._lock:
+            for key in [k for k in self._cache.keys() if k[0] == st_dev and k[1] == st_ino]:
+                self._cache.pop(key, None)
+
+    def clear(self):
+        """Remove all results from the cache"""
+        with self._lock:
+            self._cache.clear()
+
+    def stats(self) -> Dict[str, int]:
+        """Get the hit/miss counters and current size of the cache"""
+        with self._lock:
+            return {
+                "hits": self.hits,
+                "misses": self.misses,
+                "size": len(self._cache),
+                "maxsize": int(self._cache.maxsize),
+            }
+
+
+_binary_cache = None
+
+
+def get_binary_cache() -> BinaryCache:
+    """Get or initialize the shared binary-detection cache"""
+    global _binary_cache
+    if _binary_cache is None:
+        _binary_cache = BinaryCache(maxsize=get_settings().binary_cache_size)
+    return _binary_cache
+
+
+def invalidate_binary_results(st_dev: int, st_ino: int):
+    """Remove the cached binary-detection results of a file"""
+    get_binary_cache().invalidate_file(st_dev, st_ino)
+
+
+def get_binary_cache_stats() -> Dict[str, int]:
+    """Get the hit/miss counters and current size of the binary-detection cache"""
+    return get_binary_cache().stats()
@@ -0,0 +1,17 @@
+"""
+Helpers shared by the in-memory caches of file system state.
+"""
+
+import time
+from typing import Optional
+
+# Files and directories modified more recently than this are not cached, since
+# more changes within the same modification time would go unnoticed
+MIN_MTIME_AGE_NS = 2_000_000_000
+
+
+def is_mtime_settled(mtime_ns: int, now_ns: Optional[int] = None) -> bool:
+    """Check if something last modified at mtime_ns is old enough to be cached, as of now_ns or now"""
+    if now_ns is None:
+        now_ns = time.time_ns()
+    return now_ns - mtime_ns >= MIN_MTIME_AGE_NS
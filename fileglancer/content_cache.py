@@ -0,0 +1,116 @@
+"""
+A cache of small file contents and byte ranges, shared by /api/content and the /files proxy.
+
+When many users view the same dataset, the same chunks are read from the
+network file system over and over. Small reads are kept in memory, keyed by
+the identity of the file (st_dev, st_ino), its modification time and size, and
+the byte range, so a file that is rewritten is read again. The total size of
+the cached content is bounded, and the least recently used content is evicted
+first.
+
+The cache only saves the read. Callers still open the file with the
+permissions of the requesting user, and take the key from fstat() of that
+file, before cached content is served.
+"""
+
+import asyncio
+import os
+import threading
+from concurrent.futures import Executor
+from typing import BinaryIO, Dict, Optional, Tuple
+
+from cachetools import LRUCache
+
+from fileglancer.cache_utils import is_mtime_settled
+from fileglancer.settings import get_settings
+
+
+def _content_cache_key(stat_result: os.stat_result, start: int, length: int) -> Tuple[int, ...]:
+    return (stat_result.st_dev, stat_result.st_ino, stat_result.st_mtime_ns, stat_result.st_size, start, length)
+
+
+class ContentCache:
+    """A bounded LRU cache of byte ranges of files, whose size is the total number of bytes cached"""
+
+    def __init__(self, max_bytes: int, max_object_size: int):
+        self._cache = LRUCache(maxsize=max_bytes, getsizeof=len)
+        self._lock = threading.Lock()
+        self.max_object_size = min(max_object_size, max_bytes)
+        self.hits = 0
+        self.misses = 0
+
+    def accepts(self, length: int) -> bool:
+        """Check if a range of the given length is read through the cache"""
+        return 0 < length <= self.max_object_size
+
+    async def read(self, file_handle: BinaryIO, stat_result: os.stat_result, start: int, length: int,
+                   executor: Executor) -> Optional[bytes]:
+        """
+        Get a byte range of an open file from the cache, or read it in the executor and cache it.
+
+        stat_result must come from fstat() of file_handle. Returns None if the file
+        was shorter than expected, in which case the caller should stream it instead.
+        """
+        key = _content_cache_key(stat_result, start, length)
+        with self._lock:
+            content = self._cache.get(key)
+            if content is not None:
+                self.hits += 1
+                return content
+            self.misses += 1
+
+        loop = asyncio.get_running_loop()
+        content = await loop.run_in_executor(executor, os.pread, file_handle.fileno(), length, start)
+        if len(content) != length:
+            return None
+        if is_mtime_settled(stat_result.st_mtime_ns):
+            with self._lock:
+                self._cache[key] = content
+        return content
+
+    def invalidate_file(self, st_dev: int, st_ino: int):
+        """Remove the cached content of the file with the given identity, which was removed or replaced"""
+        with self._lock:
+            for key in [k for k in self._cache.keys() if k[0] == st_dev and k[1] == st_ino]:
+                self._cache.pop(key, None)
+
+    def clear(self):
+        """Remove all content from the cache"""
+        with self._lock:
+            self._cache.clear()
+
+    def stats(self) -> Dict[str, float]:
+        """Get the hit/miss counters and current size of the cache"""
+        with self._lock:
+            requests = self.hits + self.misses
+            return {
+                "hits": self.hits,
+                "misses": self.misses,
+                "hit_ratio": round(self.hits / requests, 4) if requests else 0.0,
+                "entries": len(self._cache),
+                "bytes": int(self._cache.currsize),
+                "max_bytes": int(self._cache.maxsize),
+            }
+
+
+_content_cache = None
+
+
+def get_content_cache() -> ContentCache:
+    """Get or initialize the shared content cache"""
+    global _content_cache
+    if _content_cache is None:
+        settings = get_settings()
+        _content_cache = ContentCache(max_bytes=settings.content_cache_size,
+                                      max_object_size=settings.content_cache_max_object_size)
+    return _content_cache
+
+
+def invalidate_file_content(st_dev: int, st_ino: int):
+    """Remove the cached content of a file"""
+    get_content_cache().invalidate_file(st_dev, st_ino)
+
+
+def get_content_cache_stats() -> Dict[str, float]:
+    """Get the hit/miss counters and current size of the content cache"""
+    return get_content_cache().stats()
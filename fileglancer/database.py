@@ -1,18 +1,26 @@
 import secrets
 import hashlib
-from datetime import datetime, UTC
+from datetime import datetime, timedelta, UTC
 import os
+import time
+import threading
+from contextlib import contextmanager
+from contextvars import ContextVar
 from functools import lru_cache
 
-from sqlalchemy import create_engine, Column, String, Integer, DateTime, JSON, UniqueConstraint
+from sqlalchemy import create_engine, event, bindparam, Column, String, Integer, DateTime, JSON, UniqueConstraint
 from sqlalchemy.orm import sessionmaker, declarative_base, Session
 from sqlalchemy.engine.url import make_url
 from sqlalchemy.pool import StaticPool
-from typing import Optional, Dict, List
+from typing import Callable, Optional, Dict, List, Tuple
 from loguru import logger
-from cachetools import LRUCache
+from cachetools import LRUCache, TTLCache
 
+from fileglancer.binary_cache import invalidate_binary_results
+from fileglancer.content_cache import invalidate_file_content
+from fileglancer.listing_cache import invalidate_listing
 from fileglancer.model import FileSharePath
+from fileglancer.proxy_routes import get_proxy_route_cache, invalidate_proxy_route
 from fileglancer.settings import get_settings
 from fileglancer.utils import slugify_path
 
@@ -26,9 +34,49 @@ _migrations_run = False
 # Engine cache - maintain multiple engines for different database URLs
 _engine_cache = {}
 
+# Session factory cache - one sessionmaker per database URL and session class
+_sessionmaker_cache = {}
+
+# Connection pool checkouts and request scopes, for measuring checkouts per request
+_connection_stats = {"checkouts": 0, "requests": 0}
+
+# Sessions of the current request (None outside of a request)
+_request_sessions: ContextVar[Optional["RequestSessions"]] = ContextVar("request_sessions", default=None)
+
 # Sharing key cache - LRU cache for ProxiedPathDB objects
 _sharing_key_cache = None
 
+# Unknown sharing keys - TTL cache of sharing keys not found in the database
+_missing_sharing_key_cache = None
+_missing_sharing_key_stats = {"hits": 0, "misses": 0}
+
+# Validated user sessions - TTL cache of session id to detached SessionDB objects
+_user_session_cache = None
+_user_session_cache_lock = threading.Lock()
+_user_session_cache_stats = {"hits": 0, "misses": 0}
+
+# Last accessed times not yet written to the database - session id to access time
+_pending_session_access = {}
+_pending_session_access_lock = threading.Lock()
+_last_session_access_flush = time.monotonic()
+
+# Mount prefix index - (file share paths it was built from, MountPrefixIndex)
+_mount_prefix_index = None
+
+# File share path registries, by database URL
+_fsp_registries = {}
+_fsp_registries_lock = threading.Lock()
+
+# Cache invalidation buses, by database URL, and the handlers of each cache name
+_cache_invalidation_buses = {}
+_cache_invalidation_buses_lock = threading.Lock()
+_cache_invalidation_handlers = {}
+_cache_invalidation_stats = {"published": 0, "received": 0, "polls": 0}
+_cache_invalidation_stats_lock = threading.Lock()
+
+# How long published cache invalidations are kept in the database
+CACHE_INVALIDATION_RETENTION = timedelta(hours=1)
+
 def _get_sharing_key_cache():
     """Get or initialize the sharing key cache"""
     global _sharing_key_cache
@@ -37,6 +85,16 @@ def _get_sharing_key_cache():
         _sharing_key_cache = LRUCache(maxsize=settings.sharing_key_cache_size)
     return _sharing_key_cache
 
+
+def _get_missing_sharing_key_cache():
+    """Get or initialize the cache of unknown sharing keys"""
+    global _missing_sharing_key_cache
+    if _missing_sharing_key_cache is None:
+        settings = get_settings()
+        _missing_sharing_key_cache = TTLCache(maxsize=settings.negative_cache_size,
+                                              ttl=settings.negative_cache_ttl_seconds)
+    return _missing_sharing_key_cache
+
 Base = declarative_base()
 class FileSharePathDB(Base):
     """Database model for storing file share paths"""
@@ -136,6 +194,16 @@ class TicketDB(Base):
     # )
 
 
+class CacheInvalidationDB(Base):
+    """Database model for cache invalidations published to the other server processes"""
+    __tablename__ = 'cache_invalidations'
+
+    id = Column(Integer, primary_key=True, autoincrement=True)
+    cache_name = Column(String, nullable=False)
+    cache_key = Column(String, nullable=False)
+    created_at = Column(DateTime, nullable=False, index=True, default=lambda: datetime.now(UTC))
+
+
 class SessionDB(Base):
     """Database model for storing user sessions"""
     __tablename__ = 'sessions'
@@ -215,6 +283,10 @@ def initialize_database(db_url):
     logger.debug("Database initialization completed")
 
 
+def _count_checkout(dbapi_connection, connection_record, connection_proxy):
+    _connection_stats["checkouts"] += 1
+
+
 def _get_engine(db_url):
     """Get or create a cached database engine for the given URL"""
     global _engine_cache
@@ -223,6 +295,14 @@ def _get_engine(db_url):
     if db_url in _engine_cache:
         return _engine_cache[db_url]
 
+    engine = _create_engine(db_url)
+    event.listen(engine, "checkout", _count_checkout)
+    _engine_cache[db_url] = engine
+    return engine
+
+
+def _create_engine(db_url):
+    """Create a database engine for the given URL"""
     url = make_url(db_url)
     if url.drivername.startswith("sqlite"):
         if url.database in (None, "", ":memory:"):
@@ -233,8 +313,7 @@ def _get_engine(db_url):
                 connect_args={"check_same_thread": False},
                 poolclass=StaticPool
             )
-            _engine_cache[db_url] = engine
-            logger.info(f"In-memory SQLite engine created and cached")
+            logger.info(f"In-memory SQLite engine created")
             return engine
 
         # File-based SQLite
@@ -245,8 +324,7 @@ def _get_engine(db_url):
             db_url,
             connect_args={"check_same_thread": False},  # Needed for SQLite with multiple threads
         )
-        _engine_cache[db_url] = engine
-        logger.info(f"File-based SQLite engine created and cached for: {url.database}")
+        logger.info(f"File-based SQLite engine created for: {url.database}")
         return engine
 
     # For other databases, use connection pooling options
@@ -261,7 +339,6 @@ def _get_engine(db_url):
     logger.info(f"  Pool recycle: 3600 seconds")
     logger.info(f"  Pool pre-ping: enabled")
 
-    # Create new engine and cache it
     engine = create_engine(
         db_url,
         pool_size=settings.db_pool_size,
@@ -269,20 +346,112 @@ def _get_engine(db_url):
         pool_recycle=3600,  # Recycle connections after 1 hour
         pool_pre_ping=True  # Verify connections before use
     )
-    _engine_cache[db_url] = engine
-
-    logger.info(f"Database engine created and cached for: {make_url(db_url).render_as_string(hide_password=True)}")
+    logger.info(f"Database engine created for: {make_url(db_url).render_as_string(hide_password=True)}")
     return engine
 
 
+class RequestSession(Session):
+    """
+    A session shared by all the code handling one request.
+
+    Callers use it like any other session, in a with block, but leaving the block
+    does not close it, so that the request keeps using the same connection. If the
+    block raises, the transaction is rolled back so that the session stays usable.
+    The session is closed, and its connection returned to the pool, when the
+    response starts (see RequestSessionMiddleware) or at the end of the request.
+    """
+
+    def __exit__(self, type_, value, traceback):
+        if type_ is not None:
+            self.rollback()
+
+
+def _get_sessionmaker(db_url, class_=Session):
+    """Get or create a cached session factory for the given URL"""
+    key = (db_url, class_)
+    factory = _sessionmaker_cache.get(key)
+    if factory is None:
+        # Objects of a request session stay valid after a commit for the rest of the request
+        factory = sessionmaker(bind=_get_engine(db_url), class_=class_,
+                               expire_on_commit=class_ is not RequestSession)
+        _sessionmaker_cache[key] = factory
+    return factory
+
+
 def get_db_session(db_url):
-    """Create and return a database session using a cached engine"""
-    engine = _get_engine(db_url)
-    Session = sessionmaker(bind=engine)
-    session = Session()
+    """
+    Create and return a database session using a cached engine.
+
+    Within request_session_scope(), the same session is returned until the
+    request's sessions are closed, and it is created on first use.
+    """
+    request_sessions = _request_sessions.get()
+    if request_sessions is None or request_sessions.closed:
+        return _get_sessionmaker(db_url)()
+    session = request_sessions.sessions.get(db_url)
+    if session is None:
+        session = _get_sessionmaker(db_url, RequestSession)()
+        request_sessions.sessions[db_url] = session
     return session
 
 
+class RequestSessions:
+    """The sessions shared by the code handling one request, by database URL"""
+
+    def __init__(self):
+        self.sessions: Dict[str, Session] = {}
+        self.closed = False
+
+    def close(self):
+        """
+        Close the shared sessions, returning their connections to the pool.
+        Later calls to get_db_session() return new sessions, as outside of a request.
+        """
+        self.closed = True
+        sessions, self.sessions = self.sessions, {}
+        for session in sessions.values():
+            session.close()
+
+
+@contextmanager
+def request_session_scope():
+    """Share one session per database between all calls to get_db_session() in this context"""
+    request_sessions = RequestSessions()
+    token = _request_sessions.set(request_sessions)
+    _connection_stats["requests"] += 1
+    try:
+        yield request_sessions
+    finally:
+        _request_sessions.reset(token)
+        request_sessions.close()
+
+
+class RequestSessionMiddleware:
+    """ASGI middleware that gives each HTTP request one shared database session"""
+
+    def __init__(self, app):
+        self.app = app
+
+    async def __call__(self, scope, receive, send):
+        if scope["type"] != "http":
+            await self.app(scope, receive, send)
+            return
+        with request_session_scope() as request_sessions:
+            async def send_closing_sessions(message):
+                # Sending the body can take long (e.g. file downloads), so do not
+                # hold a connection, or a transaction, while it is sent
+                if message["type"] == "http.response.start":
+                    request_sessions.close()
+                await send(message)
+
+            await self.app(scope, receive, send_closing_sessions)
+
+
+def get_connection_stats() -> Dict[str, int]:
+    """Get the number of connection pool checkouts and of requests with a shared session"""
+    return dict(_connection_stats)
+
+
 def dispose_engine(db_url=None):
     """Dispose of cached engine(s) and close connections"""
     global _engine_cache
@@ -292,10 +461,13 @@ def dispose_engine(db_url=None):
         for engine in _engine_cache.values():
             engine.dispose()
         _engine_cache.clear()
+        _sessionmaker_cache.clear()
     elif db_url in _engine_cache:
         # Dispose specific engine
         _engine_cache[db_url].dispose()
         del _engine_cache[db_url]
+        for key in [key for key in _sessionmaker_cache if key[0] == db_url]:
+            del _sessionmaker_cache[key]
 
 
 def get_all_paths(session, fsp_name: Optional[str] = None):
@@ -458,6 +630,7 @@ def get_proxied_paths(session: Session, username: str, fsp_name: str = None, pat
 
 def get_proxied_path_by_sharing_key(session: Session, sharing_key: str) -> Optional[ProxiedPathDB]:
     """Get a proxied path by sharing key with LRU caching"""
+    poll_cache_invalidations(get_settings().db_url, session)
     cache = _get_sharing_key_cache()
 
     # Check cache first
@@ -465,16 +638,25 @@ def get_proxied_path_by_sharing_key(session: Session, sharing_key: str) -> Optio
         logger.trace(f"Cache HIT for sharing key: {sharing_key}")
         return cache[sharing_key]
 
+    # Unknown keys (stale bookmarks, probing clients) are remembered for a short time
+    missing_cache = _get_missing_sharing_key_cache()
+    if sharing_key in missing_cache:
+        _missing_sharing_key_stats["hits"] += 1
+        logger.trace(f"Cache HIT for unknown sharing key: {sharing_key}")
+        return None
+
     # Query database if not in cache
     logger.trace(f"Cache MISS for sharing key: {sharing_key}, querying database")
     proxied_path = session.query(ProxiedPathDB).filter_by(sharing_key=sharing_key).first()
 
-    # Only cache valid results (not None)
     if proxied_path is not None:
         cache[sharing_key] = proxied_path
         logger.debug(f"Cached result for sharing key: {sharing_key}, cache size: {len(cache)}")
     else:
-        logger.trace(f"Not caching None result for sharing key: {sharing_key}")
+        _missing_sharing_key_stats["misses"] += 1
+        if missing_cache.maxsize > 0:
+            missing_cache[sharing_key] = True
+        logger.trace(f"Cached unknown sharing key: {sharing_key}")
 
     return proxied_path
 
@@ -484,6 +666,8 @@ def _invalidate_sharing_key_cache(sharing_key: str):
     cache = _get_sharing_key_cache()
     was_present = sharing_key in cache
     cache.pop(sharing_key, None)
+    _get_missing_sharing_key_cache().pop(sharing_key, None)
+    invalidate_proxy_route(sharing_key)
     if was_present:
         logger.debug(f"Invalidated cache entry for sharing key: {sharing_key}, cache size: {len(cache)}")
 
@@ -493,51 +677,206 @@ def _clear_sharing_key_cache():
     cache = _get_sharing_key_cache()
     old_size = len(cache)
     cache.clear()
+    _get_missing_sharing_key_cache().clear()
+    get_proxy_route_cache().clear()
     if old_size > 0:
         logger.debug(f"Cleared entire sharing key cache, removed {old_size} entries")
 
 
+def get_missing_sharing_key_stats() -> Dict[str, int]:
+    """Get the hit/miss counters and size of the cache of unknown sharing keys"""
+    return {**_missing_sharing_key_stats, "size": len(_get_missing_sharing_key_cache())}
+
+
+class MountPrefixIndex:
+    """
+    An index of file share paths by their resolved mount path.
+
+    Mount paths are expanded and resolved once when the index is built. Absolute
+    paths are matched against the longest mount path that contains them, by
+    looking up each of their parent directories, so nested file shares resolve
+    to the innermost share.
+    """
+
+    def __init__(self, paths: List[FileSharePath]):
+        self._fsp_by_mount_path = {}
+        for fsp in paths:
+            # Expand ~ to user's home directory and resolve symlinks to match Filestore behavior
+            mount_path = os.path.realpath(os.path.expanduser(fsp.mount_path))
+            # If two shares have the same mount path, the first one is used
+            self._fsp_by_mount_path.setdefault(mount_path, fsp)
+
+    def find(self, absolute_path: str) -> Optional[tuple[FileSharePath, str]]:
+        """
+        Find the file share path containing the given absolute path.
+
+        Returns:
+            Tuple of (FileSharePath, relative_subpath) if a match is found, None otherwise
+        """
+        # Resolve symlinks in the input path (e.g., /var -> /private/var on macOS)
+        normalized_path = os.path.realpath(absolute_path)
+
+        prefix = normalized_path
+        while True:
+            fsp = self._fsp_by_mount_path.get(prefix)
+            if fsp is not None:
+                subpath = normalized_path[len(prefix):].lstrip(os.sep)
+                logger.debug(f"Found match for path: {absolute_path} in fsp: {fsp.name} with subpath: {subpath}")
+                return (fsp, subpath)
+            parent = os.path.dirname(prefix)
+            if parent == prefix:
+                return None
+            prefix = parent
+
+
+def get_mount_prefix_index(session: Session) -> MountPrefixIndex:
+    """
+    Get the mount prefix index for the current file share paths.
+
+    The file share paths are read once per call, and the index is only rebuilt
+    when they have changed, so callers resolving many paths (like a directory
+    listing full of symlinks) should get the index once and reuse it.
+    """
+    global _mount_prefix_index
+    paths = get_file_share_paths(session)
+    key = tuple(fsp.model_dump_json() for fsp in paths)
+    cached = _mount_prefix_index
+    if cached is not None and cached[0] == key:
+        return cached[1]
+    index = MountPrefixIndex(paths)
+    _mount_prefix_index = (key, index)
+    return index
+
+
 def find_fsp_from_absolute_path(session: Session, absolute_path: str) -> Optional[tuple[FileSharePath, str]]:
     """
-    Find the file share path that exactly matches the given absolute path.
+    Find the file share path that contains the given absolute path.
 
-    This function iterates through all file share paths and checks if the absolute
-    path exists within any of them. Returns the first exact match found.
+    If the path is within several (nested) file shares, the share with the
+    longest mount path is returned.
 
     Args:
         session: Database session
         absolute_path: Absolute file path to match against file shares
 
     Returns:
-        Tuple of (FileSharePath, relative_subpath) if an exact match is found, None otherwise
+        Tuple of (FileSharePath, relative_subpath) if a match is found, None otherwise
     """
-    # Resolve symlinks in the input path (e.g., /var -> /private/var on macOS)
-    normalized_path = os.path.realpath(absolute_path)
+    return get_mount_prefix_index(session).find(absolute_path)
 
-    # Get all file share paths
-    paths = get_file_share_paths(session)
 
-    for fsp in paths:
-        # Expand ~ to user's home directory and resolve symlinks to match Filestore behavior
-        expanded_mount_path = os.path.expanduser(fsp.mount_path)
-        expanded_mount_path = os.path.realpath(expanded_mount_path)
-
-        # Check if the normalized path starts with this mount path
-        if normalized_path.startswith(expanded_mount_path):
-            # Calculate the relative subpath
-            if normalized_path == expanded_mount_path:
-                subpath = ""
-                logger.debug(f"Found exact match for path: {absolute_path} in fsp: {fsp.name} with subpath: {subpath}")
-                return (fsp, subpath)
-            else:
-                # Ensure we're matching on a directory boundary
-                remainder = normalized_path[len(expanded_mount_path):]
-                if remainder.startswith(os.sep):
-                    subpath = remainder.lstrip(os.sep)
-                    logger.debug(f"Found exact match for path: {absolute_path} in fsp: {fsp.name} with subpath: {subpath}")
-                    return (fsp, subpath)
+class _FileSharePathSnapshot:
+    """An immutable view of the file share paths, replaced as a whole when they change"""
+
+    def __init__(self, paths: List[FileSharePath]):
+        self.paths = paths
+        self.by_name = {}
+        for fsp in paths:
+            self.by_name.setdefault(fsp.name, fsp)
+        self.index = MountPrefixIndex(paths)
+
 
-    return None
+class FileSharePathRegistry:
+    """
+    An in-memory copy of the file share paths, for lookups that do not query the database.
+
+    When the paths come from the database, the registry checks the db_last_updated
+    time of the file_share_paths row in the last_refresh table at most once per
+    refresh interval, and reloads the paths when it has changed. If there is no
+    such row, the paths are reloaded on every check instead. A lookup of a name
+    or path that is not found checks for changes immediately, so that new file
+    shares can be used right away.
+
+    Paths from the local configuration (file_share_mounts) never change, and are
+    loaded once.
+    """
+
+    def __init__(self, db_url: str, refresh_interval: float):
+        self.db_url = db_url
+        self.refresh_interval = refresh_interval
+        self._lock = threading.Lock()
+        self._snapshot = None
+        self._last_updated = None
+        self._checked_at = 0.0
+        self.checks = 0
+        self.reloads = 0
+
+    def _is_fresh(self) -> bool:
+        return self._snapshot is not None and time.monotonic() - self._checked_at < self.refresh_interval
+
+    def _get_snapshot(self, force: bool = False) -> _FileSharePathSnapshot:
+        if not force and self._is_fresh():
+            return self._snapshot
+        with self._lock:
+            # Another thread may have refreshed the paths while we waited for the lock
+            if force or not self._is_fresh():
+                self._refresh()
+            return self._snapshot
+
+    def _refresh(self):
+        """Reload the file share paths if they have changed. Must be called with the lock held."""
+        settings = get_settings()
+        if settings.file_share_mounts and self._snapshot is not None:
+            # Paths from the local configuration do not change
+            self._checked_at = time.monotonic()
+            return
+
+        with get_db_session(self.db_url) as session:
+            self.checks += 1
+            last_updated = None
+            if not settings.file_share_mounts:
+                last_refresh = get_last_refresh(session, "file_share_paths")
+                last_updated = last_refresh.db_last_updated if last_refresh else None
+            if self._snapshot is None or last_updated is None or last_updated != self._last_updated:
+                self._snapshot = _FileSharePathSnapshot(get_file_share_paths(session))
+                self._last_updated = last_updated
+                self.reloads += 1
+                logger.debug(f"Loaded {len(self._snapshot.paths)} file share paths (last updated: {last_updated})")
+        self._checked_at = time.monotonic()
+
+    def get_paths(self) -> List[FileSharePath]:
+        """Get all file share paths"""
+        return self._get_snapshot().paths
+
+    def get(self, name: str) -> Optional[FileSharePath]:
+        """Get a file share path by name"""
+        fsp = self._get_snapshot().by_name.get(name)
+        if fsp is None:
+            fsp = self._get_snapshot(force=True).by_name.get(name)
+        return fsp
+
+    def get_index(self) -> MountPrefixIndex:
+        """Get the mount prefix index of the file share paths"""
+        return self._get_snapshot().index
+
+    def find(self, absolute_path: str) -> Optional[tuple[FileSharePath, str]]:
+        """Find the file share path containing the given absolute path, like find_fsp_from_absolute_path()"""
+        match = self._get_snapshot().index.find(absolute_path)
+        if match is None:
+            match = self._get_snapshot(force=True).index.find(absolute_path)
+        return match
+
+    def stats(self) -> Dict[str, int]:
+        """Get the number of checks for changes and reloads of the file share paths"""
+        snapshot = self._snapshot
+        return {
+            "checks": self.checks,
+            "reloads": self.reloads,
+            "size": len(snapshot.paths) if snapshot is not None else 0,
+        }
+
+
+def get_file_share_path_registry(db_url: str) -> FileSharePathRegistry:
+    """Get or initialize the file share path registry for the given database"""
+    registry = _fsp_registries.get(db_url)
+    if registry is None:
+        with _fsp_registries_lock:
+            registry = _fsp_registries.get(db_url)
+            if registry is None:
+                settings = get_settings()
+                registry = FileSharePathRegistry(db_url, settings.file_share_paths_refresh_seconds)
+                _fsp_registries[db_url] = registry
+    return registry
 
 
 def _validate_proxied_path(session: Session, fsp_name: str, path: str) -> None:
@@ -576,7 +915,10 @@ def create_proxied_path(session: Session, username: str, sharing_name: str, fsp_
         updated_at=now
     )
     session.add(proxied_path)
+    # Other server processes may have cached the new key as unknown
+    publish_cache_invalidation(session, "sharing_key", sharing_key)
     session.commit()
+    _get_missing_sharing_key_cache().pop(sharing_key, None)
 
     # Cache the new proxied path
     cache = _get_sharing_key_cache()
@@ -610,12 +952,14 @@ def update_proxied_path(session: Session,
 
     _validate_proxied_path(session, proxied_path.fsp_name, proxied_path.path)
     proxied_path.updated_at = datetime.now(UTC)
+    publish_cache_invalidation(session, "sharing_key", sharing_key)
 
     session.commit()
 
     # Update cache with the modified object
     cache = _get_sharing_key_cache()
     cache[sharing_key] = proxied_path
+    invalidate_proxy_route(sharing_key)
     logger.debug(f"Updated cache entry for sharing key: {sharing_key}, cache size: {len(cache)}")
     return proxied_path
 
@@ -623,6 +967,7 @@ def update_proxied_path(session: Session,
 def delete_proxied_path(session: Session, username: str, sharing_key: str):
     """Delete a proxied path"""
     session.query(ProxiedPathDB).filter_by(username=username, sharing_key=sharing_key).delete()
+    publish_cache_invalidation(session, "sharing_key", sharing_key)
     session.commit()
 
     # Remove from cache
@@ -787,7 +1132,9 @@ def update_session_access_time(session: Session, session_id: str):
 def delete_session(session: Session, session_id: str):
     """Delete a session (logout)"""
     session.query(SessionDB).filter_by(session_id=session_id).delete()
+    publish_cache_invalidation(session, "user_session", session_id)
     session.commit()
+    invalidate_cached_user_session(session_id)
 
 
 def delete_expired_sessions(session: Session):
@@ -796,3 +1143,252 @@ def delete_expired_sessions(session: Session):
     deleted = session.query(SessionDB).filter(SessionDB.expires_at < now).delete()
     session.commit()
     return deleted
+
+
+def _get_user_session_cache():
+    """Get or initialize the validated user session cache"""
+    global _user_session_cache
+    if _user_session_cache is None:
+        settings = get_settings()
+        _user_session_cache = TTLCache(maxsize=settings.session_cache_size,
+                                       ttl=settings.session_cache_ttl_seconds)
+    return _user_session_cache
+
+
+def get_cached_user_session(session_id: str) -> Optional[SessionDB]:
+    """
+    Get a previously validated session from the cache.
+
+    The caller is still responsible for checking expiry and the secret key hash.
+    """
+    with _user_session_cache_lock:
+        user_session = _get_user_session_cache().get(session_id)
+        if user_session is None:
+            _user_session_cache_stats["misses"] += 1
+        else:
+            _user_session_cache_stats["hits"] += 1
+        return user_session
+
+
+def cache_user_session(session: Session, user_session: SessionDB):
+    """Detach a validated session from the database session and cache it"""
+    session.expunge(user_session)
+    with _user_session_cache_lock:
+        cache = _get_user_session_cache()
+        if cache.maxsize > 0:
+            cache[user_session.session_id] = user_session
+
+
+def invalidate_cached_user_session(session_id: str):
+    """Remove a session from the validated session cache"""
+    with _user_session_cache_lock:
+        _get_user_session_cache().pop(session_id, None)
+
+
+def record_session_access(db_url: str, session_id: str):
+    """
+    Record an access to a session.
+
+    The last accessed times are kept in memory and written to the database in a
+    single batch at most every session_access_flush_seconds.
+    """
+    global _last_session_access_flush
+    now = datetime.now(UTC)
+    interval = get_settings().session_access_flush_seconds
+    with _pending_session_access_lock:
+        _pending_session_access[session_id] = now
+        if time.monotonic() - _last_session_access_flush < interval:
+            return
+        _last_session_access_flush = time.monotonic()
+    with get_db_session(db_url) as session:
+        flush_session_access_times(session)
+
+
+def flush_session_access_times(session: Session) -> int:
+    """Write the pending last accessed times of sessions to the database, returning the number written"""
+    global _pending_session_access
+    with _pending_session_access_lock:
+        pending, _pending_session_access = _pending_session_access, {}
+    if not pending:
+        return 0
+    table = SessionDB.__table__
+    stmt = (table.update()
+            .where(table.c.session_id == bindparam("b_session_id"))
+            .values(last_accessed_at=bindparam("b_last_accessed_at")))
+    try:
+        session.execute(stmt, [{"b_session_id": session_id, "b_last_accessed_at": accessed_at}
+                               for session_id, accessed_at in pending.items()])
+        session.commit()
+    except Exception as e:
+        session.rollback()
+        logger.warning(f"Failed to update last accessed time of {len(pending)} sessions: {e}")
+        return 0
+    logger.debug(f"Updated last accessed time of {len(pending)} sessions")
+    return len(pending)
+
+
+def get_session_cache_stats() -> Dict[str, int]:
+    """Get the hit/miss counters and size of the validated session cache"""
+    with _user_session_cache_lock:
+        stats = {**_user_session_cache_stats, "size": len(_get_user_session_cache())}
+    with _pending_session_access_lock:
+        stats["pending_access_updates"] = len(_pending_session_access)
+    return stats
+
+
+class CacheInvalidationBus:
+    """
+    Applies the cache invalidations published by the server processes sharing a database.
+
+    Each process keeps its own in-memory caches, so a change made by one process
+    (e.g. one of the uvicorn workers) is published as a row of the
+    cache_invalidations table, committed with the change itself. Every process
+    polls the table at most once per poll interval, when a cache that depends on
+    it is used, and removes the published keys from its own caches by calling
+    the handler registered for each cache name.
+
+    Rows are read by creation time with an overlap, rather than by id, because
+    ids are not committed in order. Rows already applied are remembered for as
+    long as they can be read again.
+    """
+
+    # How far back each poll reads, to tolerate transactions that commit late
+    # and clocks that differ between hosts
+    POLL_OVERLAP = timedelta(seconds=60)
+
+    def __init__(self, db_url: str, poll_interval: float):
+        self.db_url = db_url
+        self.poll_interval = poll_interval
+        self._lock = threading.Lock()
+        self._checked_at = None
+        self._polled_since = None
+        # Ids of the rows applied, with their creation time
+        self._applied: Dict[int, datetime] = {}
+
+    def _is_due(self) -> bool:
+        return self._checked_at is None or time.monotonic() - self._checked_at >= self.poll_interval
+
+    def poll(self, session: Optional[Session] = None):
+        """Apply the invalidations published since the last poll, if the poll interval has passed"""
+        if not self._is_due():
+            return
+        # Another thread is already polling, so there is no need to wait for it
+        if not self._lock.acquire(blocking=False):
+            return
+        try:
+            if not self._is_due():
+                return
+            self._checked_at = time.monotonic()
+            if session is not None:
+                self._poll(session)
+            else:
+                # Not the request's shared session, whose transaction would stay
+                # open while the response is prepared
+                session = _get_sessionmaker(self.db_url)()
+                try:
+                    self._poll(session)
+                finally:
+                    session.close()
+        finally:
+            self._lock.release()
+
+    def _poll(self, session: Session):
+        now = datetime.now(UTC)
+        since = (self._polled_since or now) - self.POLL_OVERLAP
+        rows = (session.query(CacheInvalidationDB.id, CacheInvalidationDB.cache_name,
+                              CacheInvalidationDB.cache_key, CacheInvalidationDB.created_at)
+                .filter(CacheInvalidationDB.created_at >= since)
+                .all())
+        received = 0
+        for row_id, cache_name, cache_key, created_at in rows:
+            if row_id in self._applied:
+                continue
+            self._applied[row_id] = created_at
+            handler = _cache_invalidation_handlers.get(cache_name)
+            if handler is not None:
+                handler(cache_key)
+                received += 1
+        with _cache_invalidation_stats_lock:
+            _cache_invalidation_stats["polls"] += 1
+            _cache_invalidation_stats["received"] += received
+        # Forget the rows that the next poll will not read again
+        since = since.replace(tzinfo=None)
+        self._applied = {row_id: created_at for row_id, created_at in self._applied.items()
+                         if created_at.replace(tzinfo=None) >= since}
+        self._polled_since = now
+
+
+def get_cache_invalidation_bus(db_url: str) -> CacheInvalidationBus:
+    """Get or initialize the cache invalidation bus for the given database"""
+    bus = _cache_invalidation_buses.get(db_url)
+    if bus is None:
+        with _cache_invalidation_buses_lock:
+            bus = _cache_invalidation_buses.get(db_url)
+            if bus is None:
+                bus = CacheInvalidationBus(db_url, get_settings().cache_invalidation_poll_seconds)
+                _cache_invalidation_buses[db_url] = bus
+    return bus
+
+
+def register_cache_invalidation_handler(cache_name: str, handler: Callable[[str], None]):
+    """Register the function that removes a key from the cache with the given name"""
+    _cache_invalidation_handlers[cache_name] = handler
+
+
+def publish_cache_invalidation(session: Session, cache_name: str, cache_key: str):
+    """
+    Publish the invalidation of a cache key to all server processes, when the session
+    is committed. Rows older than CACHE_INVALIDATION_RETENTION are deleted at the same time.
+    """
+    publish_cache_invalidations(session, [(cache_name, cache_key)])
+
+
+def publish_cache_invalidations(session: Session, invalidations: List[Tuple[str, str]]):
+    """Publish the invalidations of (cache name, cache key) pairs, like publish_cache_invalidation()"""
+    if not invalidations:
+        return
+    now = datetime.now(UTC)
+    session.query(CacheInvalidationDB).filter(CacheInvalidationDB.created_at < now - CACHE_INVALIDATION_RETENTION).delete()
+    session.add_all([CacheInvalidationDB(cache_name=cache_name, cache_key=cache_key, created_at=now)
+                     for cache_name, cache_key in invalidations])
+    with _cache_invalidation_stats_lock:
+        _cache_invalidation_stats["published"] += len(invalidations)
+
+
+def apply_cache_invalidations(invalidations: List[Tuple[str, str]]):
+    """Apply the invalidations of (cache name, cache key) pairs to the caches of this process"""
+    for cache_name, cache_key in invalidations:
+        _cache_invalidation_handlers[cache_name](cache_key)
+
+
+def poll_cache_invalidations(db_url: str, session: Optional[Session] = None):
+    """
+    Apply the cache invalidations published by other server processes, if it is time to check.
+    The session is used for the check if given, otherwise a session is opened when needed.
+    """
+    get_cache_invalidation_bus(db_url).poll(session)
+
+
+def get_cache_invalidation_stats() -> Dict[str, int]:
+    """Get the number of invalidations published and received by this process"""
+    with _cache_invalidation_stats_lock:
+        return dict(_cache_invalidation_stats)
+
+
+def _invalidate_listing_tree(path: str):
+    """Remove the cached listings of a directory and all directories below it"""
+    invalidate_listing(path, recursive=True)
+
+
+def _invalidate_file_caches(file_key: str):
+    """Remove the cached results and content of a file, whose key is st_dev:st_ino"""
+    st_dev, st_ino = (int(n) for n in file_key.split(":"))
+    invalidate_binary_results(st_dev, st_ino)
+    invalidate_file_content(st_dev, st_ino)
+
+
+register_cache_invalidation_handler("sharing_key", _invalidate_sharing_key_cache)
+register_cache_invalidation_handler("user_session", invalidate_cached_user_session)
+register_cache_invalidation_handler("listing", invalidate_listing)
+register_cache_invalidation_handler("listing_tree", _invalidate_listing_tree)
+register_cache_invalidation_handler("file", _invalidate_file_caches)
@@ -4,22 +4,106 @@ rooted at a specific directory.
 """
 
 import os
+import json
 import stat
-import pwd
-import grp
+import time
+import heapq
+import base64
 import shutil
-
-from pydantic import BaseModel
-from typing import Optional, Generator
+import asyncio
+import threading
+from collections import Counter
+from contextlib import closing
+from itertools import islice
+from concurrent.futures import Executor
+from operator import itemgetter
+
+from pydantic import BaseModel, model_serializer
+from typing import Optional, Generator, AsyncGenerator, Iterable, List, Tuple, Dict
 from loguru import logger
 
-from .database import find_fsp_from_absolute_path
+from .binary_cache import get_binary_cache
+from .database import MountPrefixIndex, apply_cache_invalidations, find_fsp_from_absolute_path, get_mount_prefix_index
+from .identity import (UserIdentity, get_user_identity, get_user_name, get_group_name,
+                       has_read_permission, has_write_permission)
+from .listing_cache import CachedListing, get_listing_cache
 from .model import FileSharePath
+from .settings import get_settings
 from .utils import is_likely_binary
 
 # Default buffer size for streaming file contents
 DEFAULT_BUFFER_SIZE = 8192
 
+# Fields that directory listings can be sorted by
+LISTING_SORT_FIELDS = ("name", "size", "mtime")
+
+# Whether os.access() can check the effective uid/gid, which is what the user context sets
+_ACCESS_EFFECTIVE_IDS = os.access in os.supports_effective_ids
+
+# Smallest read used to send file content, even for tiny files and ranges
+MIN_READ_SIZE = 4096
+
+
+class ReadSizePolicy:
+    """
+    Chooses the size of the reads used to send file content.
+
+    Each file share has a preferred read size, configured by mount path (e.g.
+    larger reads for parallel file systems than for local disks). Files and
+    ranges smaller than that are sent with a single read of their length. The
+    chosen sizes are counted, so that they can be reported in the metrics.
+    """
+
+    def __init__(self, default_size: int, sizes_by_path: Dict[str, int]):
+        self.default_size = default_size
+        # Longest path first, so that the most specific mount path wins
+        self._sizes_by_path = sorted(((os.path.realpath(os.path.expanduser(path)), size)
+                                      for path, size in sizes_by_path.items()),
+                                     key=lambda item: len(item[0]), reverse=True)
+        self._share_sizes = {}
+        self._chosen = Counter()
+        self._lock = threading.Lock()
+
+    def get_share_read_size(self, root_path: str) -> int:
+        """Get the preferred read size of the file share mounted at root_path"""
+        size = self._share_sizes.get(root_path)
+        if size is None:
+            real_path = os.path.realpath(root_path)
+            size = next((size for path, size in self._sizes_by_path
+                         if real_path == path or real_path.startswith(path.rstrip(os.sep) + os.sep)),
+                        self.default_size)
+            self._share_sizes[root_path] = size
+        return size
+
+    def choose(self, root_path: str, length: Optional[int]) -> int:
+        """Choose the read size for sending length bytes (None if unknown) from the given file share"""
+        size = self.get_share_read_size(root_path)
+        if length is not None:
+            size = min(size, max(length, MIN_READ_SIZE))
+        with self._lock:
+            self._chosen[size] += 1
+        return size
+
+    def stats(self) -> Dict[str, Dict[str, int]]:
+        """Get the configured read sizes of the file shares seen so far, and how often each size was chosen"""
+        with self._lock:
+            return {
+                "shares": dict(self._share_sizes),
+                "chosen": {str(size): count for size, count in sorted(self._chosen.items())},
+            }
+
+
+_read_size_policy = None
+
+
+def get_read_size_policy() -> ReadSizePolicy:
+    """Get or initialize the read size policy from the settings"""
+    global _read_size_policy
+    if _read_size_policy is None:
+        settings = get_settings()
+        _read_size_policy = ReadSizePolicy(settings.content_read_size, settings.content_read_sizes)
+    return _read_size_policy
+
 
 class RootCheckError(ValueError):
     """
@@ -48,6 +132,15 @@ class FileInfo(BaseModel):
     hasWrite: Optional[bool] = None
     is_symlink: bool = False
     symlink_target_fsp: Optional[dict] = None  # {"fsp_name": str, "subpath": str}
+    is_binary: Optional[bool] = None  # Only set when requested, see Filestore.yield_binary_flags()
+
+    @model_serializer(mode="wrap")
+    def _omit_unset_is_binary(self, handler):
+        # Only listings that asked for is_binary include it
+        data = handler(self)
+        if data.get("is_binary") is None:
+            data.pop("is_binary", None)
+        return data
 
     @staticmethod
     def _safe_readlink(path: str, root_path: Optional[str] = None) -> Optional[str]:
@@ -77,14 +170,18 @@ class FileInfo(BaseModel):
 
     @classmethod
     def _get_symlink_target_fsp(cls, absolute_path: str, is_symlink: bool, session,
-                                root_path: Optional[str]) -> Optional[dict]:
+                                root_path: Optional[str],
+                                fsp_index: Optional[MountPrefixIndex] = None) -> Optional[dict]:
         """
         Resolve a symlink target to a file share path.
 
+        The target is matched against fsp_index if given, which saves reading
+        the file share paths for each symlink of a directory listing.
+
         Returns a dict with fsp_name and subpath if the target is in a known file share,
         or None if not a symlink, target not found, or target not in any file share.
         """
-        if not is_symlink or session is None:
+        if not is_symlink or (session is None and fsp_index is None):
             return None
 
         # Read the symlink target safely
@@ -99,7 +196,10 @@ class FileInfo(BaseModel):
 
         # Try to find which file share contains this target
         try:
-            match = find_fsp_from_absolute_path(session, target)
+            if fsp_index is not None:
+                match = fsp_index.find(target)
+            else:
+                match = find_fsp_from_absolute_path(session, target)
             if match:
                 fsp, subpath = match
 
@@ -126,7 +226,8 @@ class FileInfo(BaseModel):
     def from_stat(cls, path: str, absolute_path: str,
                   lstat_result: os.stat_result, stat_result: os.stat_result,
                   current_user: str = None, session = None,
-                  root_path: Optional[str] = None):
+                  root_path: Optional[str] = None,
+                  fsp_index: Optional[MountPrefixIndex] = None):
         """
         Create FileInfo from pre-computed stat results.
 
@@ -138,6 +239,7 @@ class FileInfo(BaseModel):
             current_user: Username for permission checking (optional).
             session: Database session for symlink resolution (optional).
             root_path: Filestore root for defense-in-depth validation in symlink reading (optional).
+            fsp_index: Index of file share paths for symlink resolution, used instead of the session (optional).
         """
         if path is None or path == "":
             raise ValueError("Path cannot be None or empty")
@@ -150,27 +252,20 @@ class FileInfo(BaseModel):
         permissions = stat.filemode(stat_result.st_mode)
         last_modified = stat_result.st_mtime
 
-        try:
-            owner = pwd.getpwuid(stat_result.st_uid).pw_name
-        except KeyError:
-            # If the user ID is not found, use the user ID as the owner
-            owner = str(stat_result.st_uid)
-
-        try:
-            group = grp.getgrgid(stat_result.st_gid).gr_name
-        except KeyError:
-            # If the group ID is not found, use the group ID as the group
-            group = str(stat_result.st_gid)
+        # Unknown ids are reported as the numeric id
+        owner = get_user_name(stat_result.st_uid)
+        group = get_group_name(stat_result.st_gid)
 
         # Calculate read/write permissions for current user
         hasRead = None
         hasWrite = None
         if current_user is not None:
-            hasRead = cls._has_read_permission(stat_result, current_user, owner, group)
-            hasWrite = cls._has_write_permission(stat_result, current_user, owner, group)
+            identity = get_user_identity(current_user)
+            hasRead = cls._has_read_permission(stat_result, identity)
+            hasWrite = cls._has_write_permission(stat_result, identity)
 
         # Resolve symlink target to file share path if applicable
-        symlink_target_fsp = cls._get_symlink_target_fsp(absolute_path, is_symlink, session, root_path)
+        symlink_target_fsp = cls._get_symlink_target_fsp(absolute_path, is_symlink, session, root_path, fsp_index)
 
         return cls(
             name=name,
@@ -189,60 +284,115 @@ class FileInfo(BaseModel):
         )
 
     @staticmethod
-    def _has_read_permission(stat_result: os.stat_result, current_user: str, owner: str, group: str) -> bool:
-        """Check if current user has read permission"""
-        mode = stat_result.st_mode
+    def _has_read_permission(stat_result: os.stat_result, identity: Optional[UserIdentity]) -> bool:
+        """Check if the user with the given identity has read permission"""
+        return has_read_permission(stat_result, identity)
 
-        # Check owner permissions
-        if current_user == owner:
-            return bool(mode & stat.S_IRUSR)
+    @staticmethod
+    def _has_write_permission(stat_result: os.stat_result, identity: Optional[UserIdentity]) -> bool:
+        """Check if the user with the given identity has write permission"""
+        return has_write_permission(stat_result, identity)
 
-        # Check group permissions
-        try:
-            user_groups = [g.gr_name for g in grp.getgrall() if current_user in g.gr_mem]
-            # Also add user's primary group
-            try:
-                primary_gid = pwd.getpwnam(current_user).pw_gid
-                primary_group = grp.getgrgid(primary_gid).gr_name
-                user_groups.append(primary_group)
-            except (KeyError, OSError):
-                pass
 
-            if group in user_groups:
-                return bool(mode & stat.S_IRGRP)
-        except (KeyError, OSError):
-            pass
+def _listing_sort_key(is_dir: bool, name: str, size: int, mtime: float,
+                      sort_by: str, descending: bool) -> tuple:
+    """
+    Return the sort key of a directory entry. Keys of entries in the same
+    directory are unique, since they end with the entry name. Directories sort
+    first in ascending order, and last in descending order, so that reversing
+    the order of the keys still lists directories first.
+    """
+    group = is_dir if descending else not is_dir
+    if sort_by == "size":
+        return (group, size, name)
+    if sort_by == "mtime":
+        return (group, mtime, name)
+    return (group, name)
 
-        # Check other permissions
-        return bool(mode & stat.S_IROTH)
 
-    @staticmethod
-    def _has_write_permission(stat_result: os.stat_result, current_user: str, owner: str, group: str) -> bool:
-        """Check if current user has write permission"""
-        mode = stat_result.st_mode
+def _file_info_sort_key(file_info: FileInfo, sort_by: str, descending: bool) -> tuple:
+    """Return the sort key of a directory entry from its FileInfo"""
+    return _listing_sort_key(file_info.is_dir, file_info.name, file_info.size,
+                             file_info.last_modified, sort_by, descending)
 
-        # Check owner permissions
-        if current_user == owner:
-            return bool(mode & stat.S_IWUSR)
 
-        # Check group permissions
-        try:
-            user_groups = [g.gr_name for g in grp.getgrall() if current_user in g.gr_mem]
-            # Also add user's primary group
-            try:
-                primary_gid = pwd.getpwnam(current_user).pw_gid
-                primary_group = grp.getgrgid(primary_gid).gr_name
-                user_groups.append(primary_group)
-            except (KeyError, OSError):
-                pass
+def _select_listing_page(keyed_entries, descending: bool, start_after: Optional[tuple],
+                         offset: int, limit: Optional[int]) -> list:
+    """
+    Sort items whose first element is a sort key from _listing_sort_key(),
+    and return the requested page. Only the items up to the end of the page
+    are kept while the items are consumed.
+    """
+    if start_after is not None:
+        if descending:
+            keyed_entries = (ke for ke in keyed_entries if ke[0] < start_after)
+        else:
+            keyed_entries = (ke for ke in keyed_entries if ke[0] > start_after)
 
-            if group in user_groups:
-                return bool(mode & stat.S_IWGRP)
-        except (KeyError, OSError):
-            pass
+    if limit is None:
+        selected = sorted(keyed_entries, key=itemgetter(0), reverse=descending)
+    elif descending:
+        selected = heapq.nlargest(offset + limit, keyed_entries, key=itemgetter(0))
+    else:
+        selected = heapq.nsmallest(offset + limit, keyed_entries, key=itemgetter(0))
+    return selected[offset:]
+
+
+def encode_listing_cursor(file_info: FileInfo, sort_by: str, descending: bool) -> str:
+    """
+    Encode an opaque cursor that continues a directory listing after the given entry.
+    """
+    return encode_listing_cursor_key(_file_info_sort_key(file_info, sort_by, descending), sort_by, descending)
+
+
+def encode_listing_cursor_key(key: tuple, sort_by: str, descending: bool) -> str:
+    """
+    Encode an opaque cursor that continues a directory listing after the entry
+    with the given sort key, as yielded by Filestore.yield_keyed_file_infos().
+    """
+    data = json.dumps({"sort": sort_by, "desc": descending, "key": key}, separators=(',', ':'))
+    return base64.urlsafe_b64encode(data.encode()).decode()
+
+
+def decode_listing_cursor(cursor: str, sort_by: str, descending: bool) -> tuple:
+    """
+    Decode a cursor from encode_listing_cursor() into a sort key for
+    Filestore.yield_file_infos(start_after=...).
 
-        # Check other permissions
-        return bool(mode & stat.S_IWOTH)
+    Raises:
+        ValueError: If the cursor is malformed or was created for a different sort order.
+    """
+    try:
+        data = json.loads(base64.urlsafe_b64decode(cursor.encode()))
+        key = tuple(data["key"])
+        cursor_sort_by = data["sort"]
+        cursor_descending = data["desc"]
+    except (ValueError, TypeError, KeyError) as e:
+        raise ValueError(f"Invalid cursor: {e}")
+
+    if cursor_sort_by != sort_by or cursor_descending != descending:
+        raise ValueError("Cursor was created for a different sort order")
+
+    # Check the types so that the key compares with the keys of the entries
+    expected_types = (bool, str) if sort_by == "name" else (bool, (int, float), str)
+    if len(key) != len(expected_types) or not all(
+            isinstance(value, expected) for value, expected in zip(key, expected_types)):
+        raise ValueError("Invalid cursor: malformed sort key")
+    return key
+
+
+def _get_file_invalidations(path: str) -> List[Tuple[str, str]]:
+    """
+    Get the invalidations of the cached content of the file at the given path,
+    before it is removed or replaced, so that its inode number is not reused with stale content.
+    """
+    try:
+        stat_result = os.lstat(path)
+    except OSError:
+        return []
+    if not stat.S_ISREG(stat_result.st_mode):
+        return []
+    return [("file", f"{stat_result.st_dev}:{stat_result.st_ino}")]
 
 
 class Filestore:
@@ -262,6 +412,11 @@ class Filestore:
         self.root_path = os.path.realpath(expanded_path)
 
 
+    def get_read_size(self, length: Optional[int] = None) -> int:
+        """Get the read size for sending length bytes of a file in this Filestore"""
+        return get_read_size_policy().choose(self.root_path, length)
+
+
     def _check_path_in_root(self, path: Optional[str]) -> str:
         """
         Check if a path is within the root directory and return the full path.
@@ -288,16 +443,15 @@ class Filestore:
         return full_path
 
 
-    def _get_file_info_from_path(self, full_path: str, current_user: str = None, session = None) -> FileInfo:
+    def _get_file_info_from_path(self, full_path: str, current_user: str = None, session = None,
+                                 fsp_index: Optional[MountPrefixIndex] = None) -> FileInfo:
         """
         Get the FileInfo for a file or directory at the given path.
 
-        full_path comes from either:
-        1. _check_path_in_root() which validates user input against the root
-        2. os.path.join(verified_directory, entry) where entry is from os.listdir()
-
-        In both cases, the path has been validated or constructed from validated
-        components. We pass full_path (not realpath) to from_stat so that lstat()
+        full_path is constructed from user input, so it is validated against the
+        root here before use. Directory listings use _get_file_info_from_dir_entry()
+        instead, which validates the directory once for all of its entries.
+        We pass full_path (not realpath) to from_stat so that lstat()
         can detect symlinks. Symlink targets may be outside the root (cross-fileshare
         symlinks), which is valid - we detect and report them without following.
 
@@ -356,7 +510,7 @@ class Filestore:
         return FileInfo.from_stat(
             rel_path, full_path, lstat_result, stat_result,
             current_user=current_user, session=session,
-            root_path=self.root_path,
+            root_path=self.root_path, fsp_index=fsp_index,
         )
 
 
@@ -383,7 +537,8 @@ class Filestore:
         return os.path.abspath(os.path.join(self.root_path, relative_path))
 
 
-    def get_file_info(self, path: Optional[str] = None, current_user: str = None, session = None) -> FileInfo:
+    def get_file_info(self, path: Optional[str] = None, current_user: str = None, session = None,
+                      fsp_index: Optional[MountPrefixIndex] = None) -> FileInfo:
         """
         Get the FileInfo for a file or directory at the given path.
 
@@ -394,6 +549,7 @@ class Filestore:
                 May be None, in which case hasRead and hasWrite will be None.
             session: Database session for symlink resolution.
                 May be None, in which case symlink_target_fsp will be None.
+            fsp_index: Index of file share paths for symlink resolution, used instead of the session.
 
         Raises:
             RootCheckError: If path attempts to escape root directory
@@ -402,82 +558,123 @@ class Filestore:
             full_path = self.root_path
         else:
             full_path = os.path.join(self.root_path, path)
-        return self._get_file_info_from_path(full_path, current_user, session)
+        return self._get_file_info_from_path(full_path, current_user, session, fsp_index)
 
 
-    def check_is_binary(self, path: Optional[str] = None, sample_size: int = 4096) -> bool:
+    def check_is_binary(self, path: Optional[str] = None, sample_size: int = 4096,
+                        stat_result: Optional[os.stat_result] = None) -> bool:
         """
         Check if a file is likely binary by reading a sample of its contents.
 
+        Results are kept in the shared binary-detection cache, and reused while
+        the file's modification time and size are unchanged.
+
         Args:
             path (str): The relative path to the file to check.
                 May be None, in which case the root is checked (always returns False for directories).
             sample_size (int): Number of bytes to read for binary detection. Defaults to 4096.
+            stat_result (os.stat_result): The stat result of the file, if the caller already has it.
 
         Returns:
             bool: True if the file appears to be binary, False otherwise.
-                Returns False for directories.
+                Returns False for directories. Returns True if the file cannot be read.
 
         Raises:
-            ValueError: If path attempts to escape root directory
-            FileNotFoundError: If the file does not exist
-            PermissionError: If the file cannot be read
+            RootCheckError: If path attempts to escape root directory
         """
         full_path = self._check_path_in_root(path)
 
-        # Directories are not binary
-        if os.path.isdir(full_path):
-            return False
-
         try:
+            if stat_result is None:
+                stat_result = os.stat(full_path)
+
+            # Directories are not binary
+            if stat.S_ISDIR(stat_result.st_mode):
+                return False
+
+            # Cached results are shared between users, so only use them if this user could read the file
+            binary_cache = get_binary_cache()
+            is_binary = binary_cache.get(stat_result, sample_size)
+            if is_binary is not None and os.access(full_path, os.R_OK, effective_ids=_ACCESS_EFFECTIVE_IDS):
+                return is_binary
+
             with open(full_path, 'rb') as f:
                 sample = f.read(sample_size)
-                return is_likely_binary(sample)
+            is_binary = is_likely_binary(sample)
+            binary_cache.put(stat_result, sample_size, is_binary)
+            return is_binary
         except Exception as e:
             # If we can't read the file, assume it's binary to be safe
             logger.warning(f"Could not read file sample for binary detection: {e}")
             return True
 
 
-    def check_is_binary(self, path: Optional[str] = None, sample_size: int = 4096) -> bool:
+    def set_binary_flag(self, file_info: FileInfo) -> FileInfo:
         """
-        Check if a file is likely binary by reading a sample of its contents.
+        Return the given FileInfo with is_binary set if it is a file, for listings
+        that show which files can be previewed. is_binary is left unset for
+        directories and for symlinks that point outside the root.
+        """
+        if not file_info.is_dir and file_info.path is not None:
+            try:
+                return file_info.model_copy(update={"is_binary": self.check_is_binary(file_info.path)})
+            except RootCheckError:
+                pass
+        return file_info
 
-        Args:
-            path (str): The relative path to the file to check.
-                May be None, in which case the root is checked (always returns False for directories).
-            sample_size (int): Number of bytes to read for binary detection. Defaults to 4096.
 
-        Returns:
-            bool: True if the file appears to be binary, False otherwise.
-                Returns False for directories.
+    def yield_binary_flags(self, file_infos: Iterable[FileInfo]) -> Generator[FileInfo, None, None]:
+        """Yield the given FileInfo objects with is_binary set for each file"""
+        for file_info in file_infos:
+            yield self.set_binary_flag(file_info)
 
-        Raises:
-            ValueError: If path attempts to escape root directory
-            FileNotFoundError: If the file does not exist
-            PermissionError: If the file cannot be read
+
+    def yield_file_infos(self, path: Optional[str] = None, current_user: str = None, session = None,
+                         fsp_index: Optional[MountPrefixIndex] = None, sort_by: Optional[str] = "name", descending: bool = False,
+                         start_after: Optional[tuple] = None, offset: int = 0,
+                         limit: Optional[int] = None) -> Generator[FileInfo, None, None]:
+        """
+        Yield a FileInfo object for each child of the given path. The arguments
+        are the same as for yield_keyed_file_infos(), and entries that could
+        not be stat'ed are skipped.
         """
-        from .utils import is_likely_binary
+        with closing(self.yield_keyed_file_infos(path, current_user, session, fsp_index, sort_by, descending,
+                                                 start_after, offset, limit)) as keyed_file_infos:
+            for _, file_info in keyed_file_infos:
+                if file_info is not None:
+                    yield file_info
 
-        full_path = self._check_path_in_root(path)
 
-        # Directories are not binary
-        if os.path.isdir(full_path):
-            return False
+    def yield_keyed_file_infos(self, path: Optional[str] = None, current_user: str = None, session = None,
+                               fsp_index: Optional[MountPrefixIndex] = None, sort_by: Optional[str] = "name",
+                               descending: bool = False, start_after: Optional[tuple] = None, offset: int = 0,
+                               limit: Optional[int] = None) -> Generator[Tuple[Optional[tuple], Optional[FileInfo]], None, None]:
+        """
+        Yield a (sort key, FileInfo) pair for each child of the given path.
 
-        try:
-            with open(full_path, 'rb') as f:
-                sample = f.read(sample_size)
-                return is_likely_binary(sample)
-        except Exception as e:
-            # If we can't read the file, assume it's binary to be safe
-            logger.warning(f"Could not read file sample for binary detection: {e}")
-            return True
+        The directory is read in a single pass with os.scandir(). The directory
+        itself is validated against the root once, and each entry is built from
+        its DirEntry, so a regular entry costs a single lstat. Only symlinks
+        need additional calls to stat and resolve their targets.
 
+        Directories are always listed first. When a limit is given, only the
+        requested page of entries is kept while the directory is read, and
+        FileInfo objects are only built for that page. Sorting by name uses the
+        d_type returned by readdir, so the entries outside the page are never
+        stat'ed.
 
-    def yield_file_infos(self, path: Optional[str] = None, current_user: str = None, session = None) -> Generator[FileInfo, None, None]:
-        """
-        Yield a FileInfo object for each child of the given path.
+        Without a sort field, entries are listed in directory order, and each one
+        is built as it is read, so that the first entries are available before the
+        whole directory has been read. Such listings cannot be paginated.
+
+        Complete listings of directories with symlink resolution (a session or fsp_index) are
+        kept in the shared listing cache, and are reused for any sort order or
+        page while the directory's modification time does not change.
+
+        The sort key is None for unsorted listings. The FileInfo is None for an
+        entry of the page that could not be stat'ed, because it was removed or
+        is not accessible, so that the number of pairs still tells whether more
+        entries follow a page.
 
         Args:
             path (str): The relative path to the directory to list.
@@ -486,25 +683,219 @@ class Filestore:
                 May be None, in which case hasRead and hasWrite will be None.
             session: Database session for symlink resolution.
                 May be None, in which case symlink_target_fsp will be None for symlinks.
+            fsp_index (MountPrefixIndex): Index of file share paths for symlink resolution.
+                If given, it is used instead of reading the file share paths with the session.
+            sort_by (str): One of LISTING_SORT_FIELDS. Ties are broken by name.
+                May be None to list the entries in directory order.
+            descending (bool): Sort in descending order (directories are still listed first).
+            start_after (tuple): Only list entries after this sort key,
+                as returned by decode_listing_cursor().
+            offset (int): Number of entries to skip.
+            limit (int): Maximum number of entries to list. May be None to list all entries.
 
         Raises:
             PermissionError: If the path is not accessible due to permissions.
             FileNotFoundError: If the path does not exist.
+            ValueError: If sort_by is not a valid sort field, or if an unsorted listing is paginated.
         """
+        if sort_by is None:
+            if start_after is not None or limit is not None:
+                raise ValueError("Unsorted listings cannot be paginated")
+        elif sort_by not in LISTING_SORT_FIELDS:
+            raise ValueError(f"Invalid sort field: {sort_by}")
+
         full_path = self._check_path_in_root(path)
 
-        entries = os.listdir(full_path)
-        # Sort entries in alphabetical order, with directories listed first
-        entries.sort(key=lambda e: (not os.path.isdir(
-                                        os.path.join(full_path, e)), e))
-        for entry in entries:
-            entry_path = os.path.join(full_path, entry)
+        listing_cache = get_listing_cache()
+        cacheable = False
+        if listing_cache.enabled:
+            dir_stat = os.stat(full_path)
+            # Cached listings are shared between users, so only use them if this
+            # user could read the directory and stat its entries
+            if os.access(full_path, os.R_OK | os.X_OK, effective_ids=_ACCESS_EFFECTIVE_IDS):
+                listing = listing_cache.get(full_path, self.root_path, dir_stat)
+                if listing is not None:
+                    yield from self._yield_cached_file_infos(full_path, listing, current_user, session, fsp_index,
+                                                             sort_by, descending, start_after, offset, limit)
+                    return
+                # Only complete listings are cached, with symlink targets resolved
+                cacheable = (session is not None or fsp_index is not None) and start_after is None and offset == 0 and limit is None
+                now_ns = time.time_ns()
+
+        it = os.scandir(full_path)
+        try:
+            if sort_by is None:
+                selected = ((None, entry) for entry in islice(it, offset, None))
+            else:
+                keyed_entries = self._yield_keyed_entries(it, sort_by, descending)
+                selected = _select_listing_page(keyed_entries, descending, start_after, offset, limit)
+                it.close()
+            yield from self._yield_selected_file_infos(full_path, selected, current_user, session, fsp_index,
+                                                       (dir_stat, now_ns) if cacheable else None)
+        finally:
+            it.close()
+
+
+    def _yield_selected_file_infos(self, full_path: str, selected, current_user: str, session,
+                                   fsp_index: Optional[MountPrefixIndex],
+                                   cache_as: Optional[Tuple[os.stat_result, int]]):
+        """
+        Yield the (sort key, FileInfo) pairs of the selected (sort key, entry) pairs of a directory.
+        If cache_as gives the directory's stat and the time it was read, the entries are
+        the complete listing, and it is put in the listing cache at the end.
+        """
+        cacheable = cache_as is not None
+        cached_entries = []
+        cached_symlinks = []
+        for key, entry in selected:
             try:
-                yield self._get_file_info_from_path(entry_path, current_user, session)
+                lstat_result, stat_result = self._stat_dir_entry(entry)
+                # Read the file share paths once for all the symlinks in the listing
+                if fsp_index is None and session is not None and stat.S_ISLNK(lstat_result.st_mode):
+                    fsp_index = get_mount_prefix_index(session)
+                file_info = self._get_file_info_from_dir_entry(full_path, entry.name, entry.path,
+                                                               lstat_result, stat_result,
+                                                               current_user, session, fsp_index)
             except PermissionError as e:
                 # Skip files we don't have permission to access
-                logger.error(f"Permission denied accessing entry: {entry_path}: {e}")
+                logger.error(f"Permission denied accessing entry: {entry.path}: {e}")
+                yield key, None
                 continue
+            except FileNotFoundError as e:
+                # Skip files that were removed while the directory was being listed
+                logger.warning(f"Entry disappeared during listing: {entry.path}: {e}")
+                yield key, None
+                continue
+            if cacheable:
+                if file_info.is_symlink:
+                    cached_symlinks.append(entry.name)
+                else:
+                    cached_entries.append((file_info, stat_result))
+            yield key, file_info
+
+        if cacheable:
+            dir_stat, now_ns = cache_as
+            get_listing_cache().put(full_path, self.root_path, dir_stat, cached_entries, cached_symlinks, now_ns)
+
+
+    def _yield_cached_file_infos(self, dir_path: str, listing: CachedListing, current_user: str, session,
+                                 fsp_index: Optional[MountPrefixIndex],
+                                 sort_by: str, descending: bool, start_after: Optional[tuple],
+                                 offset: int, limit: Optional[int]):
+        """
+        Yield the (sort key, FileInfo) pairs of a cached directory listing, with hasRead and
+        hasWrite computed for the current user. Symlinks are not cached, and are
+        stat'ed again with the permissions of the current user.
+        """
+        keyed_entries = []
+        for file_info, stat_result in listing.entries:
+            keyed_entries.append((_file_info_sort_key(file_info, sort_by, descending), file_info, stat_result))
+        if fsp_index is None and listing.symlinks and session is not None:
+            fsp_index = get_mount_prefix_index(session)
+        for name in listing.symlinks:
+            try:
+                file_info = self._get_file_info_from_path(os.path.join(dir_path, name), current_user, session,
+                                                          fsp_index)
+            except (PermissionError, FileNotFoundError) as e:
+                logger.warning(f"Could not stat symlink during listing: {name}: {e}")
+                continue
+            keyed_entries.append((_file_info_sort_key(file_info, sort_by, descending), file_info, None))
+
+        identity = get_user_identity(current_user) if current_user is not None else None
+        if sort_by is None:
+            selected = [(None, file_info, stat_result) for _, file_info, stat_result in keyed_entries[offset:]]
+        else:
+            selected = _select_listing_page(keyed_entries, descending, start_after, offset, limit)
+        for key, file_info, stat_result in selected:
+            if stat_result is None:
+                yield key, file_info
+            elif current_user is None:
+                yield key, file_info.model_copy(update={"hasRead": None, "hasWrite": None})
+            else:
+                yield key, file_info.model_copy(update={
+                    "hasRead": has_read_permission(stat_result, identity),
+                    "hasWrite": has_write_permission(stat_result, identity),
+                })
+
+
+    @classmethod
+    def _yield_keyed_entries(cls, entries, sort_by: str, descending: bool):
+        """Yield (sort key, entry) pairs, skipping entries that cannot be stat'ed"""
+        for entry in entries:
+            is_dir = cls._entry_is_dir(entry)
+            if sort_by == "name":
+                yield _listing_sort_key(is_dir, entry.name, 0, 0, sort_by, descending), entry
+                continue
+            try:
+                _, stat_result = cls._stat_dir_entry(entry)
+            except PermissionError as e:
+                logger.error(f"Permission denied accessing entry: {entry.path}: {e}")
+                continue
+            except FileNotFoundError as e:
+                logger.warning(f"Entry disappeared during listing: {entry.path}: {e}")
+                continue
+            size = 0 if is_dir else stat_result.st_size
+            yield _listing_sort_key(is_dir, entry.name, size, stat_result.st_mtime, sort_by, descending), entry
+
+
+    @staticmethod
+    def _entry_is_dir(entry: os.DirEntry) -> bool:
+        """Check if a directory entry is a directory (following symlinks), using the cached d_type if possible"""
+        try:
+            return entry.is_dir()
+        except OSError:
+            return False
+
+
+    @staticmethod
+    def _stat_dir_entry(entry: os.DirEntry) -> Tuple[os.stat_result, os.stat_result]:
+        """
+        Return the lstat and stat results of a directory entry. Both are cached
+        by the DirEntry. The stat result of a broken symlink is its lstat result.
+        """
+        lstat_result = entry.stat(follow_symlinks=False)
+        if not stat.S_ISLNK(lstat_result.st_mode):
+            return lstat_result, lstat_result
+        try:
+            return lstat_result, entry.stat(follow_symlinks=True)
+        except (FileNotFoundError, PermissionError, OSError) as e:
+            logger.warning(f"Broken symlink detected: {entry.path}: {e}")
+            return lstat_result, lstat_result
+
+
+    def _get_file_info_from_dir_entry(self, dir_path: str, name: str, entry_path: str,
+                                      lstat_result: os.stat_result, stat_result: os.stat_result,
+                                      current_user: str = None, session = None,
+                                      fsp_index: Optional[MountPrefixIndex] = None) -> FileInfo:
+        """
+        Get the FileInfo for an entry of a directory listing, from the results of _stat_dir_entry().
+
+        dir_path must come from _check_path_in_root(), so it is a resolved path
+        within the root, and the entry must come from os.scandir(dir_path). Since the
+        entry name cannot contain a path separator, the entry path is within the
+        root without any further validation. A non-symlink entry is its own
+        resolved path, so its relative path is derived without calling realpath.
+        """
+        if dir_path == self.root_path:
+            dir_rel_path = ''
+        else:
+            dir_rel_path = os.path.relpath(dir_path, self.root_path)
+
+        if stat.S_ISLNK(lstat_result.st_mode):
+            # Symlinks are reported with the path of their resolved target
+            full_real = os.path.realpath(entry_path)
+            if full_real == self.root_path:
+                rel_path = '.'
+            else:
+                rel_path = os.path.relpath(full_real, self.root_path)
+        else:
+            rel_path = os.path.join(dir_rel_path, name) if dir_rel_path else name
+
+        return FileInfo.from_stat(
+            rel_path, entry_path, lstat_result, stat_result,
+            current_user=current_user, session=session,
+            root_path=self.root_path, fsp_index=fsp_index,
+        )
 
 
     def stream_file_contents(self, path: str = None, buffer_size: int = DEFAULT_BUFFER_SIZE, file_handle = None) -> Generator[bytes, None, None]:
@@ -590,7 +981,61 @@ class Filestore:
                 file_handle.close()
 
 
-    def rename_file_or_dir(self, old_path: str, new_path: str):
+    async def stream_file_async(self, file_handle, executor: Executor, start: int = 0,
+                                end: Optional[int] = None, buffer_size: int = DEFAULT_BUFFER_SIZE,
+                                close_file: bool = True) -> AsyncGenerator[bytes, None]:
+        """
+        Stream the contents of an open file, or a byte range of it, without blocking the event loop.
+
+        Chunks are read with pread on the given executor, and the next chunk is
+        read while the previous one is being sent.
+
+        Args:
+            file_handle: An open file handle to stream from. It is closed when streaming completes,
+                unless close_file is False.
+            executor: The executor to read the file on.
+            start (int): The starting byte position (inclusive).
+            end (int): The ending byte position (inclusive), or None to stream to the end of the file.
+            buffer_size (int): The size of each read.
+            close_file (bool): Whether to close the file handle when streaming completes.
+        """
+        if start < 0:
+            raise ValueError("Start position cannot be negative")
+        if end is not None and end < start:
+            raise ValueError("End position cannot be less than start position")
+
+        fd = file_handle.fileno()
+        offset = start
+        remaining = None if end is None else end - start + 1
+
+        def read_next():
+            size = buffer_size if remaining is None else min(buffer_size, remaining)
+            return executor.submit(os.pread, fd, size, offset)
+
+        pending = read_next()
+        try:
+            while pending is not None:
+                chunk = await asyncio.wrap_future(pending)
+                if not chunk:
+                    break
+                offset += len(chunk)
+                if remaining is not None:
+                    remaining -= len(chunk)
+                # Start reading the next chunk before sending this one
+                pending = read_next() if remaining is None or remaining > 0 else None
+                yield chunk
+        finally:
+            if pending is not None:
+                # Wait for the read in progress to finish with the file before it is closed or reused
+                if close_file:
+                    pending.add_done_callback(lambda _: file_handle.close())
+                elif not pending.done():
+                    await asyncio.wrap_future(pending)
+            elif close_file:
+                file_handle.close()
+
+
+    def rename_file_or_dir(self, old_path: str, new_path: str) -> List[Tuple[str, str]]:
         """
         Rename a file at the given old path to the new path.
 
@@ -598,6 +1043,10 @@ class Filestore:
             old_path (str): The relative path to the file to rename.
             new_path (str): The new relative path for the file.
 
+        Returns:
+            The cache invalidations of the change, as (cache name, cache key) pairs, which
+            are applied to the caches of this process and should be published to the others.
+
         Raises:
             ValueError: If either path attempts to escape root directory
         """
@@ -607,16 +1056,27 @@ class Filestore:
             raise ValueError("New path cannot be None or empty")
         full_old_path = self._check_path_in_root(old_path)
         full_new_path = self._check_path_in_root(new_path)
+        # A file at the new path is replaced
+        invalidations = _get_file_invalidations(full_new_path)
         os.rename(full_old_path, full_new_path)
+        invalidations += [("listing", os.path.dirname(full_old_path)),
+                          ("listing", os.path.dirname(full_new_path)),
+                          ("listing_tree", full_old_path)]
+        apply_cache_invalidations(invalidations)
+        return invalidations
 
 
-    def remove_file_or_dir(self, path: str):
+    def remove_file_or_dir(self, path: str) -> List[Tuple[str, str]]:
         """
         Delete a file or (empty) directory at the given path.
 
         Args:
             path (str): The relative path to the file to delete.
 
+        Returns:
+            The cache invalidations of the change, as (cache name, cache key) pairs, which
+            are applied to the caches of this process and should be published to the others.
+
         Raises:
             ValueError: If path is None or empty, or attempts to escape root directory
         """
@@ -625,17 +1085,26 @@ class Filestore:
         full_path = self._check_path_in_root(path)
         if os.path.isdir(full_path):
             shutil.rmtree(full_path)
+            invalidations = [("listing_tree", full_path)]
         else:
+            invalidations = _get_file_invalidations(full_path)
             os.remove(full_path)
+        invalidations.append(("listing", os.path.dirname(full_path)))
+        apply_cache_invalidations(invalidations)
+        return invalidations
 
 
-    def create_dir(self, path: str):
+    def create_dir(self, path: str) -> List[Tuple[str, str]]:
         """
         Create a directory at the given path.
 
         Args:
             path (str): The relative path to the directory to create.
 
+        Returns:
+            The cache invalidations of the change, as (cache name, cache key) pairs, which
+            are applied to the caches of this process and should be published to the others.
+
         Raises:
             ValueError: If path is None or empty, or attempts to escape root directory
         """
@@ -643,15 +1112,22 @@ class Filestore:
             raise ValueError("Path cannot be None or empty")
         full_path = self._check_path_in_root(path)
         os.mkdir(full_path)
+        invalidations = [("listing", os.path.dirname(full_path))]
+        apply_cache_invalidations(invalidations)
+        return invalidations
 
 
-    def create_empty_file(self, path: str):
+    def create_empty_file(self, path: str) -> List[Tuple[str, str]]:
         """
         Create an empty file at the given path.
 
         Args:
             path (str): The relative path to the file to create.
 
+        Returns:
+            The cache invalidations of the change, as (cache name, cache key) pairs, which
+            are applied to the caches of this process and should be published to the others.
+
         Raises:
             ValueError: If path is None or empty, or attempts to escape root directory
         """
@@ -659,9 +1135,12 @@ class Filestore:
             raise ValueError("Path cannot be None or empty")
         full_path = self._check_path_in_root(path)
         open(full_path, 'w').close()
+        invalidations = [("listing", os.path.dirname(full_path))]
+        apply_cache_invalidations(invalidations)
+        return invalidations
 
 
-    def change_file_permissions(self, path: str, permissions: str):
+    def change_file_permissions(self, path: str, permissions: str) -> List[Tuple[str, str]]:
         """
         Change the permissions of a file at the given path.
 
@@ -670,6 +1149,10 @@ class Filestore:
             permissions (str): The new permissions to set for the file.
                 Must be a string of length 10, like '-rw-r--r--'.
 
+        Returns:
+            The cache invalidations of the change, as (cache name, cache key) pairs, which
+            are applied to the caches of this process and should be published to the others.
+
         Raises:
             ValueError: If path is None or empty, or attempts to escape root directory,
                 or permissions is not a string of length 10.
@@ -694,3 +1177,7 @@ class Filestore:
         if permissions[8] == 'w': mode |= stat.S_IWOTH
         if permissions[9] == 'x': mode |= stat.S_IXOTH
         os.chmod(full_path, mode)
+        # The directory modification time does not change, so its listing must be invalidated
+        invalidations = [("listing", os.path.dirname(full_path))]
+        apply_cache_invalidations(invalidations)
+        return invalidations
@@ -0,0 +1,222 @@
+"""
+Cached lookups of user and group identities.
+
+NSS lookups (pwd/grp) can take milliseconds each on LDAP/SSSD-backed hosts,
+so the identity of a user (uid, primary gid and the full set of gids) is
+resolved once and cached with a TTL. Permission checks are then evaluated
+against these numeric ids rather than by enumerating every group.
+
+The owner and group names shown in directory listings are resolved through
+a separate bounded cache of uid/gid to name mappings, since most entries in
+a directory share a handful of owners.
+"""
+import os
+import pwd
+import grp
+import stat
+import threading
+from typing import Callable, Dict, FrozenSet, List, NamedTuple, Optional
+
+from cachetools import TTLCache
+from loguru import logger
+
+from fileglancer.settings import get_settings
+
+# Sentinel stored in the cache for usernames that do not resolve,
+# so that repeated lookups for unknown users do not hit NSS again
+_UNKNOWN_USER = object()
+
+# User identity cache - TTL cache of UserIdentity objects keyed by username
+_user_identity_cache = None
+_user_identity_lock = threading.Lock()
+
+# Id to name caches for file owners and groups
+_user_name_cache = None
+_group_name_cache = None
+
+
+class UserIdentity(NamedTuple):
+    """The numeric identity of a user, as used for permission checks"""
+    username: str
+    uid: int
+    gid: int
+    gids: FrozenSet[int]
+
+
+def _get_user_identity_cache():
+    """Get or initialize the user identity cache"""
+    global _user_identity_cache
+    if _user_identity_cache is None:
+        settings = get_settings()
+        _user_identity_cache = TTLCache(maxsize=settings.user_identity_cache_size,
+                                        ttl=settings.user_identity_cache_ttl_seconds)
+    return _user_identity_cache
+
+
+def _resolve_user_identity(username: str) -> Optional[UserIdentity]:
+    """Look up the identity of a user via NSS, bypassing the cache"""
+    try:
+        user = pwd.getpwnam(username)
+    except KeyError:
+        logger.debug(f"User {username} not found")
+        return None
+    try:
+        gids = os.getgrouplist(username, user.pw_gid)
+    except OSError as e:
+        logger.warning(f"Could not get groups for user {username}: {e}")
+        gids = [user.pw_gid]
+    return UserIdentity(username=username, uid=user.pw_uid, gid=user.pw_gid, gids=frozenset(gids))
+
+
+def get_user_identity(username: str) -> Optional[UserIdentity]:
+    """
+    Get the identity of a user, using the cache if possible.
+
+    Returns None if the user does not exist.
+    """
+    cache = _get_user_identity_cache()
+    with _user_identity_lock:
+        identity = cache.get(username)
+    if identity is not None:
+        logger.trace(f"Cache HIT for user identity: {username}")
+        return None if identity is _UNKNOWN_USER else identity
+
+    logger.trace(f"Cache MISS for user identity: {username}")
+    identity = _resolve_user_identity(username)
+    with _user_identity_lock:
+        cache[username] = _UNKNOWN_USER if identity is None else identity
+    return identity
+
+
+def invalidate_user_identity(username: Optional[str] = None):
+    """Remove a user from the identity cache, or clear the cache if no username is given"""
+    cache = _get_user_identity_cache()
+    with _user_identity_lock:
+        if username is None:
+            cache.clear()
+        else:
+            cache.pop(username, None)
+
+
+class IdNameCache:
+    """
+    A bounded TTL cache mapping numeric user or group ids to names.
+
+    Ids that cannot be resolved are cached too, mapped to the id as a string.
+    Hit and miss counts are kept so that the cache can be sized.
+    """
+
+    def __init__(self, lookup: Callable[[int], str], maxsize: int, ttl: float):
+        self._lookup = lookup
+        self._cache = TTLCache(maxsize=maxsize, ttl=ttl)
+        self._lock = threading.Lock()
+        self.hits = 0
+        self.misses = 0
+
+    def get(self, id: int) -> str:
+        """Get the name for an id, looking it up if it is not cached"""
+        with self._lock:
+            name = self._cache.get(id)
+            if name is not None:
+                self.hits += 1
+                return name
+            self.misses += 1
+        try:
+            name = self._lookup(id)
+        except KeyError:
+            # If the id is not found, use the id itself as the name
+            name = str(id)
+        with self._lock:
+            self._cache[id] = name
+        return name
+
+    def clear(self):
+        """Remove all entries from the cache"""
+        with self._lock:
+            self._cache.clear()
+
+    def stats(self) -> Dict[str, int]:
+        """Get the hit/miss counters and current size of the cache"""
+        with self._lock:
+            return {
+                "hits": self.hits,
+                "misses": self.misses,
+                "size": len(self._cache),
+                "maxsize": int(self._cache.maxsize),
+            }
+
+
+def _get_user_name_cache() -> IdNameCache:
+    """Get or initialize the uid to user name cache"""
+    global _user_name_cache
+    if _user_name_cache is None:
+        settings = get_settings()
+        _user_name_cache = IdNameCache(lambda uid: pwd.getpwuid(uid).pw_name,
+                                       maxsize=settings.id_name_cache_size,
+                                       ttl=settings.id_name_cache_ttl_seconds)
+    return _user_name_cache
+
+
+def _get_group_name_cache() -> IdNameCache:
+    """Get or initialize the gid to group name cache"""
+    global _group_name_cache
+    if _group_name_cache is None:
+        settings = get_settings()
+        _group_name_cache = IdNameCache(lambda gid: grp.getgrgid(gid).gr_name,
+                                        maxsize=settings.id_name_cache_size,
+                                        ttl=settings.id_name_cache_ttl_seconds)
+    return _group_name_cache
+
+
+def get_user_name(uid: int) -> str:
+    """Get the name of the user with the given uid, or the uid as a string if it is unknown"""
+    return _get_user_name_cache().get(uid)
+
+
+def get_group_name(gid: int) -> str:
+    """Get the name of the group with the given gid, or the gid as a string if it is unknown"""
+    return _get_group_name_cache().get(gid)
+
+
+def get_id_name_cache_stats() -> Dict[str, Dict[str, int]]:
+    """Get the hit/miss counters of the uid and gid name caches"""
+    return {
+        "user_names": _get_user_name_cache().stats(),
+        "group_names": _get_group_name_cache().stats(),
+    }
+
+
+def get_user_group_names(username: str) -> List[str]:
+    """Get the names of all the groups a user belongs to, including their primary group"""
+    identity = get_user_identity(username)
+    if identity is None:
+        return []
+    return [get_group_name(gid) for gid in sorted(identity.gids)]
+
+
+def has_permission(stat_result: os.stat_result, identity: Optional[UserIdentity],
+                   user_bit: int, group_bit: int, other_bit: int) -> bool:
+    """
+    Check a permission against the mode bits of a stat result.
+
+    The owner bits apply if the user owns the file, otherwise the group bits
+    apply if the file's group is one of the user's groups, otherwise the
+    other bits apply. If the identity is unknown, only the other bits apply.
+    """
+    mode = stat_result.st_mode
+    if identity is not None:
+        if stat_result.st_uid == identity.uid:
+            return bool(mode & user_bit)
+        if stat_result.st_gid in identity.gids:
+            return bool(mode & group_bit)
+    return bool(mode & other_bit)
+
+
+def has_read_permission(stat_result: os.stat_result, identity: Optional[UserIdentity]) -> bool:
+    """Check if the user has read permission"""
+    return has_permission(stat_result, identity, stat.S_IRUSR, stat.S_IRGRP, stat.S_IROTH)
+
+
+def has_write_permission(stat_result: os.stat_result, identity: Optional[UserIdentity]) -> bool:
+    """Check if the user has write permission"""
+    return has_permission(stat_result, identity, stat.S_IWUSR, stat.S_IWGRP, stat.S_IWOTH)
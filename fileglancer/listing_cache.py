@@ -0,0 +1,135 @@
+"""
+A shared cache of directory listings.
+
+Listings are cached by the resolved path of the directory and are only used
+while the directory keeps the same identity (st_dev, st_ino) and modification
+time, so adding, removing or renaming an entry invalidates the listing. The
+cached entries hold the user-independent FileInfo of each entry together with
+its stat result, so that hasRead and hasWrite can be computed for each user.
+
+Changes that do not update the directory modification time (for example a
+chmod, or a file growing) are not detected, so the cache entries expire after
+a short TTL, and the server invalidates the affected listings itself when it
+changes files, in all of its processes.
+"""
+
+import os
+import threading
+from typing import TYPE_CHECKING, Dict, List, NamedTuple, Optional, Tuple
+
+from cachetools import TTLCache
+from loguru import logger
+
+from fileglancer.cache_utils import is_mtime_settled
+from fileglancer.settings import get_settings
+
+if TYPE_CHECKING:
+    from fileglancer.filestore import FileInfo
+
+
+class CachedListing(NamedTuple):
+    """A directory listing, and the identity of the directory it was read from"""
+    root_path: str
+    st_dev: int
+    st_ino: int
+    st_mtime_ns: int
+    # (FileInfo, stat result) of each entry. Symlinks are not included, since what
+    # their target resolves to depends on the permissions of the user.
+    entries: List[Tuple["FileInfo", os.stat_result]]
+    # Names of the symlinks in the directory
+    symlinks: List[str]
+
+
+class ListingCache:
+    """
+    A bounded TTL cache of directory listings, keyed by the resolved directory path.
+
+    The size of each listing is its number of entries, so maxsize bounds the
+    total number of entries held in the cache.
+    """
+
+    def __init__(self, maxsize: int, ttl: float):
+        self._cache = TTLCache(maxsize=maxsize, ttl=ttl,
+                               getsizeof=lambda listing: len(listing.entries) + len(listing.symlinks) + 1)
+        self._lock = threading.Lock()
+        self.hits = 0
+        self.misses = 0
+
+    @property
+    def enabled(self) -> bool:
+        return self._cache.maxsize > 0
+
+    def get(self, dir_path: str, root_path: str, dir_stat: os.stat_result) -> Optional[CachedListing]:
+        """Get the listing of a directory, if it is cached and the directory has not changed"""
+        with self._lock:
+            listing = self._cache.get(dir_path)
+            if (listing is not None and listing.root_path == root_path
+                    and listing.st_dev == dir_stat.st_dev
+                    and listing.st_ino == dir_stat.st_ino
+                    and listing.st_mtime_ns == dir_stat.st_mtime_ns):
+                self.hits += 1
+                return listing
+            self.misses += 1
+            return None
+
+    def put(self, dir_path: str, root_path: str, dir_stat: os.stat_result,
+            entries: List[Tuple["FileInfo", os.stat_result]], symlinks: List[str], now_ns: int):
+        """Cache the listing of a directory that was read after dir_stat was taken"""
+        if not self.enabled or not is_mtime_settled(dir_stat.st_mtime_ns, now_ns):
+            return
+        listing = CachedListing(root_path, dir_stat.st_dev, dir_stat.st_ino, dir_stat.st_mtime_ns,
+                                entries, symlinks)
+        with self._lock:
+            try:
+                self._cache[dir_path] = listing
+            except ValueError:
+                # The listing alone is larger than the cache
+                logger.debug(f"Directory listing too large to cache: {dir_path}")
+
+    def invalidate(self, path: str, recursive: bool = False):
+        """Remove the listing of a directory, and optionally of all directories below it"""
+        with self._lock:
+            self._cache.pop(path, None)
+            if recursive:
+                prefix = path.rstrip(os.sep) + os.sep
+                for key in [k for k in self._cache.keys() if k.startswith(prefix)]:
+                    self._cache.pop(key, None)
+
+    def clear(self):
+        """Remove all listings from the cache"""
+        with self._lock:
+            self._cache.clear()
+
+    def stats(self) -> Dict[str, int]:
+        """Get the hit/miss counters and current size of the cache"""
+        with self._lock:
+            return {
+                "hits": self.hits,
+                "misses": self.misses,
+                "listings": len(self._cache),
+                "size": int(self._cache.currsize),
+                "maxsize": int(self._cache.maxsize),
+            }
+
+
+_listing_cache = None
+
+
+def get_listing_cache() -> ListingCache:
+    """Get or initialize the shared directory listing cache"""
+    global _listing_cache
+    if _listing_cache is None:
+        settings = get_settings()
+        _listing_cache = ListingCache(maxsize=settings.listing_cache_max_entries,
+                                      ttl=settings.listing_cache_ttl_seconds)
+    return _listing_cache
+
+
+def invalidate_listing(path: str, recursive: bool = False):
+    """Remove the cached listing of the directory at the given resolved path"""
+    get_listing_cache().invalidate(path, recursive=recursive)
+
+
+def get_listing_cache_stats() -> Dict[str, int]:
+    """Get the hit/miss counters and current size of the listing cache"""
+    return get_listing_cache().stats()
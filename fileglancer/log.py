@@ -6,18 +6,14 @@ It replaces Uvicorn's default access logger to provide more detailed logging
 with application-level authentication context.
 """
 import time
-from typing import Callable
 
-from fastapi import Request, Response
 from loguru import logger
-from starlette.middleware.base import BaseHTTPMiddleware
-from starlette.types import ASGIApp
+from starlette.types import ASGIApp, Message, Receive, Scope, Send
 
-from fileglancer import auth
 from fileglancer.settings import Settings
 
 
-class AccessLogMiddleware(BaseHTTPMiddleware):
+class AccessLogMiddleware:
     """
     Middleware that logs HTTP access information with username when available.
 
@@ -27,61 +23,73 @@ class AccessLogMiddleware(BaseHTTPMiddleware):
     - Request method, path, and HTTP version
     - Response status code
     - Request duration in milliseconds
+
+    This is a pure ASGI middleware, so response bodies are passed through
+    without buffering or extra tasks. The username is the one resolved by the
+    endpoint's authentication (stored in the request state by
+    auth.get_current_user), so logging does not query the database. The same
+    fields are bound to the log record for structured log sinks.
     """
 
     def __init__(self, app: ASGIApp, settings: Settings):
-        super().__init__(app)
+        self.app = app
         self.settings = settings
 
-    async def dispatch(self, request: Request, call_next: Callable) -> Response:
-        """Process request and log access information"""
-        start_time = time.time()
-
-        # Extract username from session (if authenticated)
-        username = "-"
-        try:
-            user_session = auth.get_session_from_cookie(request, self.settings)
-            if user_session and user_session.username:
-                username = user_session.username
-        except Exception:
-            # Silently handle any authentication errors - user is just not authenticated
-            pass
-
-        # Process the request
-        response = await call_next(request)
+    async def __call__(self, scope: Scope, receive: Receive, send: Send):
+        if scope["type"] != "http":
+            await self.app(scope, receive, send)
+            return
 
-        # Calculate request duration
-        duration_ms = (time.time() - start_time) * 1000
+        start_time = time.perf_counter()
+        # Keep a reference to the request state, which the endpoint fills in
+        state = scope.setdefault("state", {})
+        status_code = 500
 
-        # Extract client information
-        client_host = request.client.host if request.client else "unknown"
-        client_port = request.client.port if request.client else 0
+        async def send_wrapper(message: Message):
+            nonlocal status_code
+            if message["type"] == "http.response.start":
+                status_code = message["status"]
+            await send(message)
 
-        # Get HTTP version from scope
-        http_version = request.scope.get("http_version", "1.1")
+        try:
+            await self.app(scope, receive, send_wrapper)
+        finally:
+            duration_ms = (time.perf_counter() - start_time) * 1000
+            self._log(scope, state.get("username") or "-", status_code, duration_ms)
+
+    @staticmethod
+    def _log(scope: Scope, username: str, status_code: int, duration_ms: float):
+        """Log the access in a standard access log format"""
+        client_host, client_port = scope.get("client") or ("unknown", 0)
+        method = scope["method"]
+        path = scope["path"]
+        query = scope.get("query_string", b"").decode("latin-1")
+        http_version = scope.get("http_version", "1.1")
 
         # Format log message in a standard access log format
         # Example: 192.168.1.100:54321 [username] "GET /api/files HTTP/1.1" 200 - 45.23ms
-        log_message = (
-            f"{client_host}:{client_port} [{username}] "
-            f'"{request.method} {request.url.path}'
-        )
+        log_message = f'{client_host}:{client_port} [{username}] "{method} {path}'
 
         # Add query string if present
-        if request.url.query:
-            log_message += f"?{request.url.query}"
-
-        log_message += (
-            f' HTTP/{http_version}" '
-            f"{response.status_code} - {duration_ms:.2f}ms"
+        if query:
+            log_message += f"?{query}"
+
+        log_message += f' HTTP/{http_version}" {status_code} - {duration_ms:.2f}ms'
+
+        access_logger = logger.bind(
+            client=f"{client_host}:{client_port}",
+            username=username,
+            method=method,
+            path=path,
+            query=query,
+            status=status_code,
+            duration_ms=round(duration_ms, 2),
         )
 
         # Log at INFO level for successful requests, WARNING for client errors, ERROR for server errors
-        if 200 <= response.status_code < 400:
-            logger.info(log_message)
-        elif 400 <= response.status_code < 500:
-            logger.warning(log_message)
+        if 200 <= status_code < 400:
+            access_logger.info(log_message)
+        elif 400 <= status_code < 500:
+            access_logger.warning(log_message)
         else:
-            logger.error(log_message)
-
-        return response
+            access_logger.error(log_message)
@@ -0,0 +1,221 @@
+"""
+A cache of resolved routes for the /files S3 proxy.
+
+Each data link (proxied path) is served by a FileProxyClient rooted at the
+shared directory, and accessed with the permissions of the user who shared it.
+Resolving a route reads the proxied path and its file share path, and
+constructing the client resolves the mount path on disk, which is too much to
+repeat for each of the many chunk requests of a viewer. Routes are cached by
+sharing key, and dropped when the proxied path is updated or deleted. Since
+other server processes can change proxied paths too, routes also expire after
+a short TTL.
+
+Viewers also probe for many objects that do not exist (e.g. .zattrs or
+zarr.json at every level of a Zarr hierarchy), so these misses are cached
+separately for a short time.
+"""
+
+import os
+import threading
+from typing import Callable, Dict, NamedTuple, Optional
+
+from cachetools import TTLCache
+from x2s3.client_file import FileProxyClient
+
+from fileglancer.cache_utils import is_mtime_settled
+from fileglancer.model import FileSharePath
+from fileglancer.settings import get_settings
+
+
+class ProxyRoute(NamedTuple):
+    """The resolved route of a data link"""
+    sharing_key: str
+    sharing_name: str
+    # User whose permissions are used to access the files
+    username: str
+    # File share path the route was resolved with. The route is only valid while
+    # the file share path registry returns this same object.
+    fsp: FileSharePath
+    # Absolute path of the shared directory
+    mount_path: str
+    client: FileProxyClient
+
+
+class ProxyRouteCache:
+    """A bounded TTL cache of data link routes, keyed by sharing key"""
+
+    def __init__(self, maxsize: int, ttl: float):
+        self._cache = TTLCache(maxsize=maxsize, ttl=ttl)
+        self._lock = threading.Lock()
+        self.hits = 0
+        self.misses = 0
+
+    @property
+    def enabled(self) -> bool:
+        return self._cache.maxsize > 0
+
+    def get(self, sharing_key: str, get_fsp: Callable[[str], Optional[FileSharePath]]) -> Optional[ProxyRoute]:
+        """
+        Get the cached route for a sharing key, if its file share path is unchanged.
+        get_fsp returns the current file share path for a name.
+        """
+        with self._lock:
+            route = self._cache.get(sharing_key)
+        if route is not None and get_fsp(route.fsp.name) is not route.fsp:
+            route = None
+        with self._lock:
+            if route is not None:
+                self.hits += 1
+            else:
+                self.misses += 1
+        return route
+
+    def put(self, route: ProxyRoute):
+        """Cache a route"""
+        if not self.enabled:
+            return
+        with self._lock:
+            self._cache[route.sharing_key] = route
+
+    def invalidate(self, sharing_key: str):
+        """Remove the route for a sharing key"""
+        with self._lock:
+            self._cache.pop(sharing_key, None)
+
+    def clear(self):
+        """Remove all routes from the cache"""
+        with self._lock:
+            self._cache.clear()
+
+    def stats(self) -> Dict[str, int]:
+        """Get the hit/miss counters and current size of the cache"""
+        with self._lock:
+            return {
+                "hits": self.hits,
+                "misses": self.misses,
+                "size": len(self._cache),
+                "maxsize": int(self._cache.maxsize),
+            }
+
+
+_proxy_route_cache = None
+
+
+def get_proxy_route_cache() -> ProxyRouteCache:
+    """Get or initialize the shared data link route cache"""
+    global _proxy_route_cache
+    if _proxy_route_cache is None:
+        settings = get_settings()
+        _proxy_route_cache = ProxyRouteCache(maxsize=settings.sharing_key_cache_size,
+                                             ttl=settings.proxy_route_ttl_seconds)
+    return _proxy_route_cache
+
+
+def invalidate_proxy_route(sharing_key: str):
+    """Remove the cached route for a sharing key"""
+    get_proxy_route_cache().invalidate(sharing_key)
+
+
+def get_proxy_route_cache_stats() -> Dict[str, int]:
+    """Get the hit/miss counters and current size of the data link route cache"""
+    return get_proxy_route_cache().stats()
+
+
+# Marks a key without a cached miss, since a cached miss can be None
+_NOT_CACHED = object()
+
+# Marks a directory that could not be stat'ed (e.g. without permission to traverse
+# its parents), so that misses in it are neither cached nor reused
+_UNKNOWN = object()
+
+
+def _get_parent_mtime_ns(root_path: str, key: str):
+    """
+    Get the modification time of the directory that would contain an object,
+    None if it does not exist, or _UNKNOWN if it cannot be stat'ed.
+    """
+    try:
+        return os.stat(os.path.dirname(os.path.join(root_path, key))).st_mtime_ns
+    except (FileNotFoundError, NotADirectoryError):
+        return None
+    except OSError:
+        return _UNKNOWN
+
+
+class MissingObjectCache:
+    """
+    A bounded TTL cache of object keys that were not found behind a data link.
+
+    A miss is keyed by the root path of the data link and the object key, and
+    is only reused while the directory that would contain the object has the
+    same modification time, or still does not exist. Creating, renaming or
+    removing an entry of the directory therefore invalidates the miss.
+    """
+
+    def __init__(self, maxsize: int, ttl: float):
+        self._cache = TTLCache(maxsize=maxsize, ttl=ttl)
+        self._lock = threading.Lock()
+        self.hits = 0
+        self.misses = 0
+
+    @property
+    def enabled(self) -> bool:
+        return self._cache.maxsize > 0
+
+    def is_missing(self, root_path: str, key: str) -> bool:
+        """Check if the object is known not to exist. The directory is stat'ed with the caller's permissions."""
+        if not self.enabled:
+            return False
+        cache_key = (root_path, key)
+        with self._lock:
+            entry = self._cache.get(cache_key, _NOT_CACHED)
+        # A cached entry is never _UNKNOWN, so a directory that cannot be stat'ed is not a hit
+        missing = entry is not _NOT_CACHED and _get_parent_mtime_ns(root_path, key) == entry
+        with self._lock:
+            if missing:
+                self.hits += 1
+            else:
+                self.misses += 1
+                if entry is not _NOT_CACHED:
+                    self._cache.pop(cache_key, None)
+        return missing
+
+    def put(self, root_path: str, key: str):
+        """Remember that an object does not exist"""
+        if not self.enabled:
+            return
+        parent_mtime_ns = _get_parent_mtime_ns(root_path, key)
+        if parent_mtime_ns is _UNKNOWN:
+            return
+        if parent_mtime_ns is not None and not is_mtime_settled(parent_mtime_ns):
+            return
+        with self._lock:
+            self._cache[(root_path, key)] = parent_mtime_ns
+
+    def clear(self):
+        """Remove all misses from the cache"""
+        with self._lock:
+            self._cache.clear()
+
+    def stats(self) -> Dict[str, int]:
+        """Get the hit/miss counters and current size of the cache"""
+        with self._lock:
+            return {
+                "hits": self.hits,
+                "misses": self.misses,
+                "size": len(self._cache),
+                "maxsize": int(self._cache.maxsize),
+            }
+
+
+_missing_object_cache = None
+
+
+def get_missing_object_cache() -> MissingObjectCache:
+    """Get or initialize the shared cache of objects not found behind data links"""
+    global _missing_object_cache
+    if _missing_object_cache is None:
+        settings = get_settings()
+        _missing_object_cache = MissingObjectCache(maxsize=settings.negative_cache_size,
+                                                   ttl=settings.negative_cache_ttl_seconds)
+    return _missing_object_cache
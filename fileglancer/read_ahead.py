@@ -0,0 +1,260 @@
+"""
+Read-ahead of neighbouring chunks of Zarr and N5 arrays served through the /files proxy.
+
+Viewers like Neuroglancer request the chunks of an array in spatially coherent
+patterns, so after a chunk is requested its neighbours are likely to be
+requested soon. For the file shares where it is enabled, the neighbours of a
+requested chunk are warmed in the background with posix_fadvise(WILLNEED), so
+that the kernel starts reading them from the file system before they are
+requested. Chunks are recognized by their keys:
+
+    Zarr v2     .../0.1.2
+    Zarr v3     .../c/0/1/2 or .../c.0.1.2
+    N5, nested  .../0/1/2
+
+With the "/" separator and without the "c" prefix, the trailing numbers of a
+key can also include directory names (e.g. the resolution level of OME-Zarr,
+as in 0/0/1/2), so the number of chunk axes is found from the metadata file of
+the array (.zarray, zarr.json or attributes.json) in the nearest parent
+directory. Keys without such a file are not read ahead.
+
+The warmed chunks are remembered for a short time, so that the number of them
+that were then requested can be reported.
+"""
+
+import asyncio
+import os
+import threading
+from typing import Any, Awaitable, Callable, Dict, List, Optional, Set
+
+from cachetools import TTLCache
+from loguru import logger
+
+from fileglancer.settings import get_settings
+
+# How many warmed chunks are remembered, and for how long, to count the ones that were requested
+_TRACKED_CHUNKS = 10000
+_TRACKED_CHUNK_TTL = 60
+
+# Metadata files found in the directory of an array (Zarr v2, Zarr v3 and N5)
+_ARRAY_METADATA_FILES = (".zarray", "zarr.json", "attributes.json")
+
+
+def _neighbouring_indices(indices: List[int], max_chunks: int) -> List[List[int]]:
+    """Get the indices of the chunks after and then before the given chunk along each axis"""
+    neighbours = []
+    for step in (1, -1):
+        for axis in reversed(range(len(indices))):
+            index = indices[axis] + step
+            if index >= 0:
+                neighbours.append(indices[:axis] + [index] + indices[axis + 1:])
+    return neighbours[:max_chunks]
+
+
+def _count_trailing_indices(parts: List[str]) -> int:
+    count = 0
+    while count < len(parts) and parts[-1 - count].isdigit():
+        count += 1
+    return count
+
+
+def get_neighbouring_chunk_keys(key: str, max_chunks: int, ndim: Optional[int] = None) -> List[str]:
+    """
+    Get the keys of up to max_chunks chunks next to the chunk with the given key,
+    or an empty list if the key does not look like a chunk key. For keys with the
+    "/" separator, ndim is the number of chunk axes, or None to use all the
+    trailing numbers of the key.
+    """
+    parts = key.split('/')
+    if any(part in ('', '.', '..') for part in parts):
+        return []
+    last = parts[-1]
+
+    if '.' in last:
+        # Zarr v2 (0.1.2) or Zarr v3 with the "." separator (c.0.1.2)
+        tokens = last.split('.')
+        prefix = tokens[:1] if tokens[0] == 'c' else []
+        tokens = tokens[len(prefix):]
+        if not tokens or not all(token.isdigit() for token in tokens):
+            return []
+        head = '/'.join(parts[:-1] + [''])
+        return [head + '.'.join(prefix + [str(i) for i in indices])
+                for indices in _neighbouring_indices([int(t) for t in tokens], max_chunks)]
+
+    # Zarr v3 (c/0/1/2), or N5 and Zarr v2 with the "/" separator (0/1/2)
+    count = _count_trailing_indices(parts)
+    if ndim is not None:
+        count = min(count, ndim)
+    if count == 0:
+        return []
+    head = parts[:-count]
+    return ['/'.join(head + [str(i) for i in indices])
+            for indices in _neighbouring_indices([int(p) for p in parts[-count:]], max_chunks)]
+
+
+class ReadAhead:
+    """
+    Warms the neighbouring chunks of requested chunks, on the file shares mounted
+    under the given paths. At most max_concurrency read-aheads run at once, and
+    new ones are dropped while that many are in progress.
+    """
+
+    def __init__(self, paths: List[str], max_chunks: int, max_concurrency: int):
+        self._paths = [os.path.realpath(os.path.expanduser(path)).rstrip(os.sep) for path in paths]
+        self._share_enabled: Dict[str, bool] = {}
+        self.max_chunks = max_chunks
+        self.max_concurrency = max_concurrency
+        self._warmed = TTLCache(maxsize=_TRACKED_CHUNKS, ttl=_TRACKED_CHUNK_TTL)
+        # Number of chunk axes (0 if not an array) by the directory of a chunk
+        self._ndims = TTLCache(maxsize=_TRACKED_CHUNKS, ttl=_TRACKED_CHUNK_TTL)
+        self._tasks: Set[asyncio.Task] = set()
+        self._lock = threading.Lock()
+        self.scheduled = 0
+        self.dropped = 0
+        self.warmed = 0
+        self.missing = 0
+        self.useful = 0
+
+    @property
+    def enabled(self) -> bool:
+        return bool(self._paths) and self.max_chunks > 0 and self.max_concurrency > 0 \
+            and hasattr(os, "posix_fadvise")
+
+    def is_enabled(self, root_path: str) -> bool:
+        """Check if read-ahead is enabled for the file share containing root_path"""
+        if not self.enabled:
+            return False
+        enabled = self._share_enabled.get(root_path)
+        if enabled is None:
+            real_path = os.path.realpath(root_path)
+            enabled = any(real_path == path or real_path.startswith(path + os.sep) for path in self._paths)
+            self._share_enabled[root_path] = enabled
+        return enabled
+
+    def record_request(self, root_path: str, key: str):
+        """Count a request for a chunk that was warmed by a read-ahead"""
+        with self._lock:
+            if self._warmed.pop((root_path, key), None) is not None:
+                self.useful += 1
+
+    def _get_neighbours(self, root_path: str, key: str, stat_files: bool) -> Optional[List[str]]:
+        """
+        Get the keys of the chunks to warm next to the chunk with the given key. Returns
+        None if the metadata file of the array must be looked for and stat_files is False.
+        """
+        parts = key.split('/')
+        ndim = None
+        count = _count_trailing_indices(parts)
+        if count and not (count < len(parts) and parts[-count - 1] == 'c'):
+            # The trailing numbers can include directory names
+            ndim_key = (root_path, '/'.join(parts[:-1]))
+            with self._lock:
+                ndim = self._ndims.get(ndim_key)
+            if ndim is None:
+                if not stat_files:
+                    return None
+                ndim = next((i for i in range(1, count + 1)
+                             if any(os.path.isfile(os.path.join(root_path, *parts[:-i], name))
+                                    for name in _ARRAY_METADATA_FILES)), 0)
+                with self._lock:
+                    self._ndims[ndim_key] = ndim
+            if ndim == 0:
+                return []
+        keys = get_neighbouring_chunk_keys(key, self.max_chunks, ndim)
+        with self._lock:
+            return [k for k in keys if (root_path, k) not in self._warmed]
+
+    def schedule(self, root_path: str, key: str, length: int,
+                 run_as_user: Callable[[Callable[[], Any]], Awaitable[Any]]) -> bool:
+        """
+        Start warming the first length bytes of the neighbours of a requested chunk
+        in the background. run_as_user runs a function off the event loop with the
+        permissions of the user who shared the files. Returns False if the key is
+        not a chunk key, if its neighbours were already warmed, or if too many
+        read-aheads are in progress.
+        """
+        if length <= 0 or not get_neighbouring_chunk_keys(key, self.max_chunks):
+            return False
+        # Without the array's metadata at hand, the neighbours are found by the read-ahead
+        if self._get_neighbours(root_path, key, stat_files=False) == []:
+            return False
+        with self._lock:
+            if len(self._tasks) >= self.max_concurrency:
+                self.dropped += 1
+                return False
+            self.scheduled += 1
+            task = asyncio.get_running_loop().create_task(
+                self._run(root_path, key, length, run_as_user))
+            self._tasks.add(task)
+        return True
+
+    async def _run(self, root_path: str, key: str, length: int,
+                   run_as_user: Callable[[Callable[[], Any]], Awaitable[Any]]):
+        try:
+            await run_as_user(lambda: self._warm(root_path, key, length))
+        except Exception:
+            logger.opt(exception=True).debug(f"Read-ahead failed in {root_path}")
+        finally:
+            with self._lock:
+                self._tasks.discard(asyncio.current_task())
+
+    def _warm(self, root_path: str, requested_key: str, length: int):
+        """Advise the kernel to read the neighbouring chunks. This runs with the permissions of the user."""
+        for key in self._get_neighbours(root_path, requested_key, stat_files=True):
+            # Like the proxy, do not follow symbolic links out of the shared directory
+            path = os.path.realpath(os.path.join(root_path, key))
+            try:
+                if not path.startswith(root_path + os.sep):
+                    raise FileNotFoundError(path)
+                fd = os.open(path, os.O_RDONLY)
+            except OSError:
+                with self._lock:
+                    self.missing += 1
+                continue
+            try:
+                os.posix_fadvise(fd, 0, length, os.POSIX_FADV_WILLNEED)
+            finally:
+                os.close(fd)
+            with self._lock:
+                self.warmed += 1
+                self._warmed[(root_path, key)] = True
+
+    async def wait(self):
+        """Wait for the read-aheads in progress to finish"""
+        with self._lock:
+            tasks = list(self._tasks)
+        if tasks:
+            await asyncio.gather(*tasks, return_exceptions=True)
+
+    def stats(self) -> Dict[str, float]:
+        """Get the read-ahead counters, and the fraction of warmed chunks that were then requested"""
+        with self._lock:
+            return {
+                "scheduled": self.scheduled,
+                "dropped": self.dropped,
+                "in_progress": len(self._tasks),
+                "warmed": self.warmed,
+                "missing": self.missing,
+                "useful": self.useful,
+                "useful_ratio": round(self.useful / self.warmed, 4) if self.warmed else 0.0,
+            }
+
+
+_read_ahead = None
+
+
+def get_read_ahead() -> ReadAhead:
+    """Get or initialize the chunk read-ahead from the settings"""
+    global _read_ahead
+    if _read_ahead is None:
+        settings = get_settings()
+        _read_ahead = ReadAhead(settings.read_ahead_paths, settings.read_ahead_max_chunks,
+                                settings.read_ahead_max_concurrency)
+        if settings.read_ahead_paths and not hasattr(os, "posix_fadvise"):
+            logger.warning("posix_fadvise is not supported on this platform, ignoring read_ahead_paths")
+    return _read_ahead
+
+
+def get_read_ahead_stats() -> Dict[str, float]:
+    """Get the counters of the chunk read-ahead"""
+    return get_read_ahead().stats()
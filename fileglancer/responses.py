@@ -0,0 +1,129 @@
+"""
+Responses for sending file content.
+"""
+import secrets
+from contextlib import aclosing
+from typing import AsyncIterator, Callable, Dict, List, Optional, Tuple
+
+from fastapi.responses import StreamingResponse
+from starlette.types import Receive, Scope, Send
+
+# ASGI extension for handing a file descriptor to the server, which sends it with sendfile()
+ZEROCOPY_SEND_EXTENSION = "http.response.zerocopysend"
+
+
+class FileHandleResponse(StreamingResponse):
+    """
+    A response that sends a byte range of an already open file.
+
+    The file is opened in the user context, so it is sent from its descriptor
+    rather than re-opened by path (which the server would do as root). If the
+    server supports the ASGI zero-copy send extension, the descriptor is handed
+    to the server, which sends it with sendfile() without copying the content
+    through Python. Otherwise, or when the connection uses TLS or the content is
+    encoded (where sendfile cannot be used), the given chunks are streamed.
+    """
+
+    def __init__(
+        self,
+        file_handle,
+        chunks: AsyncIterator[bytes],
+        offset: int,
+        count: int,
+        status_code: int = 200,
+        headers: Optional[Dict[str, str]] = None,
+        media_type: Optional[str] = None,
+    ):
+        """
+        Args:
+            file_handle: The open file to send. It is closed when the response completes.
+            chunks: The content of the range, used when zero-copy sending is not possible.
+                It must close file_handle when it completes.
+            offset: The position of the first byte to send.
+            count: The number of bytes to send.
+        """
+        super().__init__(chunks, status_code=status_code, headers=headers, media_type=media_type)
+        self.file_handle = file_handle
+        self.offset = offset
+        self.count = count
+
+    def _can_send_zerocopy(self, scope: Scope) -> bool:
+        return (ZEROCOPY_SEND_EXTENSION in scope.get("extensions", {})
+                and scope.get("scheme") == "http"
+                and "content-encoding" not in self.headers)
+
+    async def __call__(self, scope: Scope, receive: Receive, send: Send) -> None:
+        if not self._can_send_zerocopy(scope):
+            await super().__call__(scope, receive, send)
+            return
+
+        try:
+            await send({"type": "http.response.start", "status": self.status_code, "headers": self.raw_headers})
+            await send({
+                "type": ZEROCOPY_SEND_EXTENSION,
+                "file": self.file_handle,
+                "offset": self.offset,
+                "count": self.count,
+                "more_body": False,
+            })
+        finally:
+            self.file_handle.close()
+            await self.body_iterator.aclose()
+
+        if self.background is not None:
+            await self.background()
+
+
+class MultipartByteRangesResponse(StreamingResponse):
+    """
+    A 206 response with several byte ranges of an open file, as a multipart/byteranges body (RFC 7233).
+
+    The parts are streamed one after the other from the same file handle, which
+    is closed when the response completes. The Content-Length is known upfront.
+    """
+
+    def __init__(
+        self,
+        file_handle,
+        read_range: Callable[[int, int], AsyncIterator[bytes]],
+        ranges: List[Tuple[int, int]],
+        file_size: int,
+        content_type: str,
+        headers: Optional[Dict[str, str]] = None,
+    ):
+        """
+        Args:
+            file_handle: The open file to send. It is closed when the response completes.
+            read_range: Returns the content of the byte range from start to end (inclusive)
+                of the file, without closing it.
+            ranges: The byte ranges to send, as (start, end) positions.
+            file_size: The size of the file, for the Content-Range of each part.
+            content_type: The content type of the file.
+        """
+        self.file_handle = file_handle
+        self.read_range = read_range
+        boundary = secrets.token_hex(16)
+        self.parts = [
+            ((f"--{boundary}\r\nContent-Type: {content_type}\r\n"
+              f"Content-Range: bytes {start}-{end}/{file_size}\r\n\r\n").encode(), start, end)
+            for start, end in ranges
+        ]
+        self.closing = f"--{boundary}--\r\n".encode()
+        content_length = sum(len(header) + end - start + 1 + 2 for header, start, end in self.parts) + len(self.closing)
+
+        all_headers = dict(headers) if headers else {}
+        all_headers["Content-Length"] = str(content_length)
+        super().__init__(self._iter_parts(), status_code=206, headers=all_headers,
+                         media_type=f"multipart/byteranges; boundary={boundary}")
+
+    async def _iter_parts(self):
+        try:
+            for header, start, end in self.parts:
+                yield header
+                async with aclosing(self.read_range(start, end)) as chunks:
+                    async for chunk in chunks:
+                        yield chunk
+                yield b"\r\n"
+            yield self.closing
+        finally:
+            self.file_handle.close()
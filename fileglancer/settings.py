@@ -1,4 +1,4 @@
-from typing import List, Optional
+from typing import Dict, List, Optional
 from functools import cache
 import sys
 
@@ -29,6 +29,11 @@ class Settings(BaseSettings):
     # If true, use seteuid/setegid for file access
     use_access_flags: bool = False
 
+    # With use_access_flags, the number of worker threads that access files with per-thread
+    # credentials, so that requests from different users run in parallel (Linux only).
+    # If 0, the credentials of the whole process are switched for each request.
+    user_context_threads: int = 0
+
     # Atlassian settings for accessing JIRA services
     atlassian_url: Optional[HttpUrl] = None
     atlassian_username: Optional[str] = None
@@ -49,6 +54,64 @@ class Settings(BaseSettings):
     # Maximum size of the sharing key LRU cache
     sharing_key_cache_size: int = 1000
 
+    # Maximum number and lifetime of the cached misses of the /files proxy, for unknown
+    # sharing keys and for objects that do not exist behind a data link
+    negative_cache_size: int = 10000
+    negative_cache_ttl_seconds: int = 10
+
+    # How often each server process checks the database for changes made by the other
+    # processes (e.g. uvicorn workers), to remove them from its caches
+    cache_invalidation_poll_seconds: float = 2
+
+    # How long the resolved route of a data link is reused by the /files proxy. Routes are
+    # dropped when a data link is changed, in all server processes.
+    proxy_route_ttl_seconds: int = 600
+
+    # How often to check the database for changes to the file share paths
+    file_share_paths_refresh_seconds: int = 30
+
+    # Maximum size and lifetime of the user identity (uid/gid/groups) cache
+    user_identity_cache_size: int = 1000
+    user_identity_cache_ttl_seconds: int = 300
+
+    # Maximum size and lifetime of the uid/gid to name cache used for file owners and groups
+    id_name_cache_size: int = 10000
+    id_name_cache_ttl_seconds: int = 600
+
+    # Maximum total number of entries and lifetime of the shared directory listing cache
+    # Set listing_cache_max_entries to 0 to disable the cache
+    listing_cache_max_entries: int = 100000
+    listing_cache_ttl_seconds: int = 60
+
+    # Maximum number of files whose binary-detection result is cached
+    # Set binary_cache_size to 0 to disable the cache
+    binary_cache_size: int = 100000
+
+    # Total size in bytes of the small files and byte ranges kept in memory by each server
+    # process, for /api/content and /files, and the largest file or range that is cached
+    # Set content_cache_size to 0 to disable the cache
+    content_cache_size: int = 0
+    content_cache_max_object_size: int = 1024 * 1024
+
+    # Size of the reads used to send file content (from /api/content and /files), and the number
+    # of threads doing the reads for /api/content. content_read_sizes overrides the read size for
+    # the file shares mounted under the given paths (the longest matching path wins). Files and
+    # ranges smaller than the read size are read at once. Unless the server supports zero-copy
+    # sending, content is copied through Python, which takes less CPU per byte with larger reads.
+    content_read_size: int = 1024 * 1024
+    content_read_sizes: Dict[str, int] = {}
+    content_io_threads: int = 16
+
+    # Maximum number of byte ranges (after merging overlapping ones) in one /api/content request
+    content_max_ranges: int = 32
+
+    # Mount paths of the file shares whose data links warm the neighbouring chunks of requested
+    # Zarr and N5 chunks, the maximum number of neighbours warmed per chunk, and the maximum
+    # number of read-aheads in progress at once. Read-ahead is disabled for all other file shares.
+    read_ahead_paths: List[str] = []
+    read_ahead_max_chunks: int = 6
+    read_ahead_max_concurrency: int = 8
+
     # OKTA OAuth/OIDC settings for authentication
     okta_domain: Optional[str] = None
     okta_client_id: Optional[str] = None
@@ -61,6 +124,13 @@ class Settings(BaseSettings):
     session_cookie_name: str = 'fg_session'
     session_cookie_secure: bool = True  # Set to False for development with self-signed certs
 
+    # Maximum size and lifetime of the cache of validated sessions
+    session_cache_size: int = 10000
+    session_cache_ttl_seconds: int = 30
+
+    # How often the last accessed time of active sessions is written to the database
+    session_access_flush_seconds: int = 60
+
     # Authentication toggle - if False, falls back to $USER environment variable
     enable_okta_auth: bool = False
 
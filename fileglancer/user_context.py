@@ -1,12 +1,49 @@
 import os
 import pwd
+import sys
+import asyncio
+import ctypes
+import platform
+import contextvars
+from concurrent.futures import ThreadPoolExecutor
 from contextlib import AbstractContextManager
+from typing import Callable, TypeVar
 
 from loguru import logger
 
+from fileglancer.identity import get_user_identity
 from fileglancer.settings import get_settings
 
 
+T = TypeVar("T")
+
+# Linux system call numbers for changing the credentials of the calling thread.
+# The libc wrappers (used by os.seteuid and friends) apply the change to every
+# thread in the process, while the system calls only change the calling thread.
+_THREAD_CREDENTIAL_SYSCALLS = {
+    "x86_64": {"setgroups": 116, "setresuid": 117, "setresgid": 119},
+    "aarch64": {"setgroups": 159, "setresuid": 147, "setresgid": 149},
+}
+
+_libc = None
+
+# The maximum number of supplementary groups of a process
+_NGROUPS_MAX = os.sysconf("SC_NGROUPS_MAX")
+
+# The server's own (uid, gid, supplementary gids), restored when leaving a user context
+_server_credentials = None
+
+
+def _get_server_credentials():
+    """Get the credentials the server was started with, looking them up only once"""
+    global _server_credentials
+    if _server_credentials is None:
+        uid = os.getuid()
+        gid = os.getgid()
+        _server_credentials = (uid, gid, os.getgrouplist(pwd.getpwuid(uid).pw_name, gid))
+    return _server_credentials
+
+
 class UserContextConfigurationError(PermissionError):
     """
     Raised when user context setup fails due to configuration issues.
@@ -37,18 +74,18 @@ class EffectiveUserContext(UserContext):
     """
     def __init__(self, username: str):
         self.username = username
-        self._uid = os.getuid()
-        self._gid = os.getgid()
-        self._gids = os.getgrouplist(pwd.getpwuid(self._uid).pw_name, self._gid)
+        self._uid, self._gid, self._gids = _get_server_credentials()
         self._user = None
 
     def __enter__(self):
         logger.trace(f"Entering user context for {self.username}")
-        user = pwd.getpwnam(self.username)
+        user = get_user_identity(self.username)
+        if user is None:
+            raise KeyError(f"getpwnam(): name not found: '{self.username}'")
 
-        uid = user.pw_uid
-        gid = user.pw_gid
-        gids = os.getgrouplist(self.username, gid)
+        uid = user.uid
+        gid = user.gid
+        gids = list(user.gids)
         try:
             os.setegid(gid)
         except PermissionError as e:
@@ -66,10 +103,10 @@ class EffectiveUserContext(UserContext):
             # the maximum number of groups that could be set is os.sysconf("SC_NGROUPS_MAX")
             # so if the current user has more than that an exception will be raised
             # for now I don't limit this because I want to see if this will happen 
-            if len(gids) > os.sysconf("SC_NGROUPS_MAX"):
+            if len(gids) > _NGROUPS_MAX:
                 logger.warning((
                     f"User {self.username} is part of {len(gids)} groups "
-                    f"which is greater than {os.sysconf("SC_NGROUPS_MAX")} "
+                    f"which is greater than {_NGROUPS_MAX} "
                     "so this may result in an error"
                 ))
             os.setgroups(gids)
@@ -113,10 +150,110 @@ class EffectiveUserContext(UserContext):
         logger.trace(f"Exiting user context for {self.username}")
         os.seteuid(self._uid)
         os.setegid(self._gid)
-        if len(self._gids) > os.sysconf("SC_NGROUPS_MAX"):
-            logger.info(f"Truncate original {len(self._gids)} groups to max allowed to set: {os.sysconf("SC_NGROUPS_MAX")}")
-            os.setgroups(self._gids[:os.sysconf("SC_NGROUPS_MAX")])
+        if len(self._gids) > _NGROUPS_MAX:
+            logger.info(f"Truncate original {len(self._gids)} groups to max allowed to set: {_NGROUPS_MAX}")
+            os.setgroups(self._gids[:_NGROUPS_MAX])
         else:
             os.setgroups(self._gids)
         self._user = None
         return False
+
+
+def thread_credentials_supported() -> bool:
+    """Whether the credentials of a single thread can be changed on this platform"""
+    return sys.platform.startswith("linux") and platform.machine() in _THREAD_CREDENTIAL_SYSCALLS
+
+
+def _thread_syscall(name: str, *args):
+    """Make a credential system call for the calling thread, raising OSError on failure"""
+    global _libc
+    if _libc is None:
+        _libc = ctypes.CDLL(None, use_errno=True)
+    number = _THREAD_CREDENTIAL_SYSCALLS[platform.machine()][name]
+    if _libc.syscall(number, *args) != 0:
+        errno = ctypes.get_errno()
+        # OSError returns the matching subclass, e.g. PermissionError for EPERM
+        raise OSError(errno, f"{name}: {os.strerror(errno)}")
+
+
+def _set_thread_groups(gids):
+    _thread_syscall("setgroups", len(gids), (ctypes.c_uint * len(gids))(*gids))
+
+
+class ThreadUserContext(UserContext):
+    """
+    A context manager for setting the effective user and groups of the calling thread only.
+
+    Unlike EffectiveUserContext, other threads keep their own credentials, so
+    threads can act as different users at the same time. Linux only.
+    """
+    def __init__(self, username: str):
+        self.username = username
+        self._uid = None
+        self._gid = None
+        self._gids = None
+
+    def __enter__(self):
+        logger.trace(f"Entering thread user context for {self.username}")
+        user = get_user_identity(self.username)
+        if user is None:
+            raise KeyError(f"getpwnam(): name not found: '{self.username}'")
+
+        # These read the credentials of the calling thread
+        self._uid = os.geteuid()
+        self._gid = os.getegid()
+        self._gids = os.getgroups()
+        if self._uid == user.uid and self._gid == user.gid:
+            # Already running as this user, e.g. in a nested context
+            self._uid = None
+            return self
+        try:
+            # Groups first, while the thread still has the privileges to change them
+            _set_thread_groups(list(user.gids))
+            _thread_syscall("setresgid", -1, user.gid, -1)
+            _thread_syscall("setresuid", -1, user.uid, -1)
+        except OSError as e:
+            logger.error(f"Failed to set the thread credentials for {self.username}: {e}")
+            self._restore()
+            if isinstance(e, PermissionError) and get_settings().use_access_flags:
+                raise UserContextConfigurationError() from e
+            raise
+        return self
+
+    def __exit__(self, exc_type, exc_val, exc_tb):
+        logger.trace(f"Exiting thread user context for {self.username}")
+        self._restore()
+        return False
+
+    def _restore(self):
+        if self._uid is None:
+            return
+        _thread_syscall("setresuid", -1, self._uid, -1)
+        _thread_syscall("setresgid", -1, self._gid, -1)
+        _set_thread_groups(self._gids)
+
+
+class UserContextExecutor:
+    """
+    A pool of worker threads that run functions with the file access permissions of a user.
+
+    Each function runs in a ThreadUserContext on one of the workers, so requests
+    from different users are served in parallel without switching the
+    credentials of the whole process.
+    """
+    def __init__(self, max_workers: int):
+        self._executor = ThreadPoolExecutor(max_workers=max_workers, thread_name_prefix="user-context")
+
+    async def run(self, username: str, fn: Callable[..., T], *args) -> T:
+        """Run fn(*args) on a worker as the given user, in the current context (e.g. the request's database session)"""
+        context = contextvars.copy_context()
+        loop = asyncio.get_running_loop()
+        return await loop.run_in_executor(self._executor, context.run, self._run_as_user, username, fn, args)
+
+    @staticmethod
+    def _run_as_user(username: str, fn: Callable[..., T], args) -> T:
+        with ThreadUserContext(username):
+            return fn(*args)
+
+    def shutdown(self):
+        self._executor.shutdown(wait=True)
@@ -1,6 +1,13 @@
 import re
+import time
 from datetime import datetime, timezone
+from email.utils import formatdate, parsedate_to_datetime
 from mimetypes import guess_type
+from typing import Optional
+
+# Control characters, excluding common whitespace: 9 (tab), 10 (LF), 11 (VT), 12 (FF), 13 (CR)
+_CONTROL_BYTES = bytes(range(0, 9)) + bytes(range(14, 32))
+
 
 def slugify_path(s):
     """Slugify a path to make it into a name"""
@@ -21,6 +28,31 @@ def format_timestamp(timestamp):
     return dt.isoformat()
 
 
+def format_http_date(timestamp):
+    """Format the given timestamp as an HTTP date (RFC 7231), e.g. for the Last-Modified header."""
+    return formatdate(timestamp, usegmt=True)
+
+
+def parse_http_date(value: str) -> Optional[int]:
+    """
+    Parse a date from a conditional request header, returning it as a timestamp in whole seconds.
+
+    Clients send back the Last-Modified value they received, so ISO dates (as sent
+    by the S3 proxy) are accepted as well as HTTP dates. Returns None if the date
+    cannot be parsed.
+    """
+    try:
+        dt = parsedate_to_datetime(value)
+    except (TypeError, ValueError):
+        try:
+            dt = datetime.fromisoformat(value.strip())
+        except ValueError:
+            return None
+    if dt.tzinfo is None:
+        dt = dt.replace(tzinfo=timezone.utc)
+    return int(dt.timestamp())
+
+
 def guess_content_type(filename):
     """A wrapper for guess_type which deals with unknown MIME types"""
     content_type, _ = guess_type(filename)
@@ -50,33 +82,22 @@ def is_likely_binary(data: bytes) -> bool:
     if not data:
         return False
 
-    control_count = 0
-    for byte in data:
-        # Count control characters, excluding common whitespace:
-        # 9 (tab), 10 (LF), 11 (VT), 12 (FF), 13 (CR)
-        if byte < 9 or (byte > 13 and byte < 32):
-            control_count += 1
+    # Count control characters by deleting them, which is done in C
+    control_count = len(data) - len(data.translate(None, _CONTROL_BYTES))
 
     # If more than 1% of bytes are control characters, consider it binary
     return control_count / len(data) >= 0.01
 
 
-def parse_range_header(range_header: str, file_size: int):
-    """Parse HTTP Range header and return start and end byte positions."""
-    if not range_header or not range_header.startswith('bytes='):
+def _parse_byte_range(range_spec: str, file_size: int):
+    """Parse one byte range of a Range header, returning (start, end) or None if it is invalid or unsatisfiable."""
+    range_spec = range_spec.strip()
+    if '-' not in range_spec:
         return None
 
-    try:
-        range_spec = range_header[6:]  # Remove 'bytes=' prefix
-
-        if ',' in range_spec:
-            range_spec = range_spec.split(',')[0].strip()
-
-        if '-' not in range_spec:
-            return None
-
-        start_str, end_str = range_spec.split('-', 1)
+    start_str, end_str = range_spec.split('-', 1)
 
+    try:
         if start_str and end_str:
             start = int(start_str)
             end = int(end_str)
@@ -89,12 +110,108 @@ def parse_range_header(range_header: str, file_size: int):
             end = file_size - 1
         else:
             return None
+    except ValueError:
+        return None
+
+    if start < 0 or end < 0 or start >= file_size or start > end:
+        return None
+
+    end = min(end, file_size - 1)
+    return (start, end)
+
+
+def parse_range_header(range_header: str, file_size: int):
+    """Parse HTTP Range header and return start and end byte positions of its first range."""
+    if not range_header or not range_header.startswith('bytes='):
+        return None
+
+    range_spec = range_header[6:]  # Remove 'bytes=' prefix
+    return _parse_byte_range(range_spec.split(',')[0], file_size)
 
-        if start < 0 or end < 0 or start >= file_size or start > end:
-            return None
 
-        end = min(end, file_size - 1)
-        return (start, end)
+def parse_range_header_ranges(range_header: str, file_size: int, max_ranges: int):
+    """
+    Parse HTTP Range header with any number of ranges (RFC 7233).
+
+    Returns the satisfiable ranges as a sorted list of (start, end) byte positions,
+    with overlapping and adjacent ranges merged. Returns None if no range is
+    satisfiable, or if more than max_ranges ranges remain after merging.
+    """
+    if not range_header or not range_header.startswith('bytes='):
+        return None
+
+    range_specs = range_header[6:].split(',')
+    # Do not parse headers that are far too long, even if merging could bring them under the limit
+    if len(range_specs) > max(max_ranges, 1) * 64:
+        return None
+
+    ranges = sorted(r for r in (_parse_byte_range(spec, file_size) for spec in range_specs) if r is not None)
+    merged = []
+    for start, end in ranges:
+        if merged and start <= merged[-1][1] + 1:
+            merged[-1] = (merged[-1][0], max(merged[-1][1], end))
+        else:
+            merged.append((start, end))
+
+    if not merged or len(merged) > max_ranges:
+        return None
+    return merged
+
+
+def make_etag(stat_result, now: Optional[float] = None) -> str:
+    """
+    Make an ETag for a file from its inode, size and modification time.
+
+    The ETag is weak if the file was modified within the last second, since it
+    could then change again without its modification time changing on file
+    systems with a coarse timestamp resolution.
+    """
+    etag = f'"{stat_result.st_ino:x}-{stat_result.st_size:x}-{stat_result.st_mtime_ns:x}"'
+    if (time.time() if now is None else now) - stat_result.st_mtime < 1:
+        return f'W/{etag}'
+    return etag
+
+
+def _strip_weak(etag: str) -> str:
+    return etag[2:] if etag.startswith('W/') else etag
+
+
+def is_not_modified(request_headers, etag: str, mtime: float) -> bool:
+    """
+    Evaluate If-None-Match and If-Modified-Since (RFC 7232) for a GET or HEAD request.
+
+    Returns True if the client's copy is current, i.e. a 304 response should be sent.
+    If-None-Match uses the weak comparison and takes precedence over If-Modified-Since.
+    """
+    if_none_match = request_headers.get('if-none-match')
+    if if_none_match is not None:
+        if if_none_match.strip() == '*':
+            return True
+        etag = _strip_weak(etag)
+        return any(_strip_weak(tag.strip()) == etag for tag in if_none_match.split(','))
 
-    except (ValueError, IndexError):
-        return None
\ No newline at end of file
+    if_modified_since = request_headers.get('if-modified-since')
+    if if_modified_since:
+        date = parse_http_date(if_modified_since)
+        return date is not None and int(mtime) <= date
+
+    return False
+
+
+def if_range_matches(if_range: Optional[str], etag: str, mtime: float) -> bool:
+    """
+    Evaluate If-Range (RFC 7233), returning whether the Range header should be honoured.
+
+    The validator must match strongly, so that the ranges of a resumed download
+    come from the same content as the part already received. Otherwise the whole
+    file is sent.
+    """
+    if not if_range:
+        return True
+    if etag.startswith('W/'):
+        return False
+    if_range = if_range.strip()
+    if if_range.startswith('"') or if_range.startswith('W/'):
+        return if_range == etag
+    date = parse_http_date(if_range)
+    return date is not None and int(mtime) == date
@@ -14,6 +14,7 @@ type FileOrFolder = {
     fsp_name: string;
     subpath: string;
   } | null;
+  is_binary?: boolean | null;
 };
 
 type FileSharePath = {
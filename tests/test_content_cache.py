@@ -0,0 +1,98 @@
+import asyncio
+import os
+import time
+import shutil
+import tempfile
+from concurrent.futures import ThreadPoolExecutor
+
+import pytest
+
+from fileglancer.content_cache import ContentCache
+
+
+@pytest.fixture
+def executor():
+    executor = ThreadPoolExecutor(max_workers=2)
+    yield executor
+    executor.shutdown()
+
+
+@pytest.fixture
+def temp_dir():
+    temp_dir = tempfile.mkdtemp()
+    yield temp_dir
+    shutil.rmtree(temp_dir)
+
+
+def write_old_file(path, content, age=60):
+    """Write a file with a modification time far enough in the past for its content to be cached"""
+    with open(path, "wb") as f:
+        f.write(content)
+    t = time.time() - age
+    os.utime(path, (t, t))
+
+
+def read(cache, path, start, length, executor):
+    with open(path, "rb") as f:
+        return asyncio.run(cache.read(f, os.fstat(f.fileno()), start, length, executor))
+
+
+def test_content_is_cached_until_file_changes(temp_dir, executor):
+    path = os.path.join(temp_dir, "chunk")
+    write_old_file(path, b"0123456789")
+    cache = ContentCache(max_bytes=1024, max_object_size=100)
+
+    assert read(cache, path, 2, 4, executor) == b"2345"
+    assert read(cache, path, 2, 4, executor) == b"2345"
+    assert read(cache, path, 0, 10, executor) == b"0123456789"
+    stats = cache.stats()
+    assert stats["hits"] == 1
+    assert stats["misses"] == 2
+    assert stats["bytes"] == 14
+
+    write_old_file(path, b"abcdefghij", age=30)
+    assert read(cache, path, 2, 4, executor) == b"cdef"
+
+
+def test_recently_modified_content_is_not_cached(temp_dir, executor):
+    path = os.path.join(temp_dir, "chunk")
+    with open(path, "wb") as f:
+        f.write(b"0123456789")
+    cache = ContentCache(max_bytes=1024, max_object_size=100)
+
+    assert read(cache, path, 0, 10, executor) == b"0123456789"
+    assert cache.stats()["entries"] == 0
+
+
+def test_short_read_is_not_cached(temp_dir, executor):
+    path = os.path.join(temp_dir, "chunk")
+    write_old_file(path, b"0123456789")
+    cache = ContentCache(max_bytes=1024, max_object_size=100)
+
+    assert read(cache, path, 8, 4, executor) is None
+    assert cache.stats()["entries"] == 0
+
+
+def test_content_is_evicted_by_size(temp_dir, executor):
+    cache = ContentCache(max_bytes=25, max_object_size=100)
+    assert cache.max_object_size == 25
+    assert cache.accepts(25)
+    assert not cache.accepts(26)
+    assert not cache.accepts(0)
+
+    for name in ("a", "b", "c"):
+        path = os.path.join(temp_dir, name)
+        write_old_file(path, name.encode() * 10)
+        read(cache, path, 0, 10, executor)
+    stats = cache.stats()
+    assert stats["entries"] == 2
+    assert stats["bytes"] == 20
+
+    # The least recently used file was evicted
+    assert read(cache, os.path.join(temp_dir, "a"), 0, 10, executor) == b"a" * 10
+    assert cache.stats()["hits"] == 0
+
+
+def test_disabled_cache_accepts_nothing():
+    cache = ContentCache(max_bytes=0, max_object_size=100)
+    assert not cache.accepts(1)
@@ -1,13 +1,17 @@
 import tempfile
 import os
+import sys
 import shutil
-from datetime import datetime
+import subprocess
+from datetime import datetime, timedelta, UTC
 
 import pytest
 import pandas as pd
-from sqlalchemy import create_engine
+from sqlalchemy import create_engine, text
 from sqlalchemy.orm import sessionmaker
+import fileglancer.database
 from fileglancer.database import *
+from fileglancer.database import _get_sessionmaker
 from fileglancer.utils import slugify_path
 
 def create_file_share_path_dicts(df):
@@ -268,6 +272,98 @@ def test_find_fsp_from_absolute_path_exact_match(db_session, temp_dir):
     assert result[1] == os.path.join("subdir", "nested")
 
 
+def test_find_fsp_from_absolute_path_nested_mounts(db_session, temp_dir):
+    """Test that the innermost of nested file shares is found"""
+    inner_dir = os.path.join(temp_dir, "inner")
+    os.makedirs(os.path.join(inner_dir, "data"))
+    for name, mount_path in [("outer", temp_dir), ("inner", inner_dir)]:
+        db_session.add(FileSharePathDB(
+            name=name,
+            zone="testzone",
+            group="testgroup",
+            storage="local",
+            mount_path=mount_path,
+            mac_path=mount_path,
+            windows_path=mount_path,
+            linux_path=mount_path
+        ))
+    db_session.commit()
+
+    result = find_fsp_from_absolute_path(db_session, os.path.join(inner_dir, "data"))
+    assert result[0].name == "inner"
+    assert result[1] == "data"
+
+    result = find_fsp_from_absolute_path(db_session, os.path.join(temp_dir, "other"))
+    assert result[0].name == "outer"
+    assert result[1] == "other"
+
+    # A sibling with the same prefix is not within the inner share
+    result = find_fsp_from_absolute_path(db_session, inner_dir + "2")
+    assert result[0].name == "outer"
+    assert result[1] == "inner2"
+
+
+def test_get_mount_prefix_index_is_reused(db_session, temp_dir):
+    """Test that the mount prefix index is only rebuilt when the file share paths change"""
+    db_session.add(FileSharePathDB(name="a", zone="z", group="g", storage="local", mount_path=temp_dir,
+                                   mac_path=temp_dir, windows_path=temp_dir, linux_path=temp_dir))
+    db_session.commit()
+    index = get_mount_prefix_index(db_session)
+    assert get_mount_prefix_index(db_session) is index
+
+    db_session.add(FileSharePathDB(name="b", zone="z", group="g", storage="local", mount_path="/b",
+                                   mac_path="/b", windows_path="/b", linux_path="/b"))
+    db_session.commit()
+    assert get_mount_prefix_index(db_session) is not index
+
+
+def _add_fsp(session, name, mount_path):
+    session.add(FileSharePathDB(name=name, zone="z", group="g", storage="local", mount_path=mount_path,
+                                mac_path=mount_path, windows_path=mount_path, linux_path=mount_path))
+    session.commit()
+
+
+def test_file_share_path_registry_lookups(db_session, temp_dir):
+    """Test that the registry serves lookups from memory and picks up new file shares on a miss"""
+    _add_fsp(db_session, "a", temp_dir)
+    registry = FileSharePathRegistry(str(db_session.get_bind().url), refresh_interval=3600)
+    assert [fsp.name for fsp in registry.get_paths()] == ["a"]
+    assert registry.get("a").mount_path == temp_dir
+    assert registry.find(os.path.join(temp_dir, "x"))[0].name == "a"
+    assert registry.stats()["reloads"] == 1
+
+    _add_fsp(db_session, "b", "/b")
+    # Within the refresh interval, the paths are not reloaded...
+    assert [fsp.name for fsp in registry.get_paths()] == ["a"]
+    # ...unless a lookup misses
+    assert registry.get("b").mount_path == "/b"
+    assert registry.get("missing") is None
+    assert [fsp.name for fsp in registry.get_paths()] == ["a", "b"]
+
+
+def test_file_share_path_registry_uses_last_refresh(db_session, temp_dir):
+    """Test that the registry only reloads the paths when their last refresh time changes"""
+    _add_fsp(db_session, "a", temp_dir)
+    last_refresh = LastRefreshDB(table_name="file_share_paths",
+                                 source_last_updated=datetime(2025, 1, 1),
+                                 db_last_updated=datetime(2025, 1, 1))
+    db_session.add(last_refresh)
+    db_session.commit()
+
+    registry = FileSharePathRegistry(str(db_session.get_bind().url), refresh_interval=0)
+    registry.get_paths()
+    registry.get_paths()
+    stats = registry.stats()
+    assert stats["checks"] == 2
+    assert stats["reloads"] == 1
+
+    _add_fsp(db_session, "b", "/b")
+    last_refresh.db_last_updated = datetime(2025, 1, 2)
+    db_session.commit()
+    assert [fsp.name for fsp in registry.get_paths()] == ["a", "b"]
+    assert registry.stats()["reloads"] == 2
+
+
 def test_find_fsp_from_absolute_path_no_match(db_session, temp_dir):
     """Test finding FSP from absolute path with no match"""
     # Create a file share path
@@ -419,3 +515,253 @@ def test_find_fsp_from_absolute_path_with_symlink_resolution(db_session, temp_di
     finally:
         shutil.rmtree(symlink_container)
 
+
+
+def test_request_session_scope_shares_session(temp_dir):
+    """Test that one session is shared within a request scope and closed at its end"""
+    db_url = f"sqlite:///{os.path.join(temp_dir, 'scope.db')}"
+    try:
+        with request_session_scope():
+            with get_db_session(db_url) as session1:
+                session1.execute(text("SELECT 1"))
+            with get_db_session(db_url) as session2:
+                assert session2 is session1
+                # Leaving the with block does not close the shared session
+                assert session2.in_transaction()
+        assert not session1.in_transaction()
+        # Outside of a scope every call creates a new session from the cached factory
+        assert get_db_session(db_url) is not get_db_session(db_url)
+        assert _get_sessionmaker(db_url) is _get_sessionmaker(db_url)
+    finally:
+        dispose_engine(db_url)
+
+
+def test_request_session_scope_rolls_back_on_error(temp_dir):
+    """Test that an error in one block does not leave the shared session unusable"""
+    db_url = f"sqlite:///{os.path.join(temp_dir, 'scope.db')}"
+    try:
+        with request_session_scope():
+            with pytest.raises(ValueError):
+                with get_db_session(db_url) as session:
+                    session.execute(text("SELECT 1"))
+                    raise ValueError("boom")
+            with get_db_session(db_url) as session:
+                assert session.execute(text("SELECT 1")).scalar() == 1
+    finally:
+        dispose_engine(db_url)
+
+
+def test_request_sessions_are_closed_when_response_starts(temp_dir):
+    """Test that the shared session does not hold a connection while the response body is sent"""
+    import asyncio
+
+    db_url = f"sqlite:///{os.path.join(temp_dir, 'scope.db')}"
+    checked_out = []
+
+    async def app(scope, receive, send):
+        with get_db_session(db_url) as session:
+            session.execute(text("SELECT 1"))
+        checked_out.append(fileglancer.database._get_engine(db_url).pool.checkedout())
+        await send({"type": "http.response.start", "status": 200, "headers": []})
+        checked_out.append(fileglancer.database._get_engine(db_url).pool.checkedout())
+        with get_db_session(db_url) as session:
+            assert not isinstance(session, RequestSession)
+            session.execute(text("SELECT 1"))
+        checked_out.append(fileglancer.database._get_engine(db_url).pool.checkedout())
+        await send({"type": "http.response.body", "body": b"", "more_body": False})
+
+    async def send(message):
+        pass
+
+    try:
+        asyncio.run(RequestSessionMiddleware(app)({"type": "http"}, None, send))
+        assert checked_out == [1, 0, 0]
+    finally:
+        dispose_engine(db_url)
+
+
+def test_cached_user_session_is_invalidated_on_delete(db_session):
+    """Test that a validated session is served from the cache until it is deleted"""
+    user_session = create_session(db_session, "testuser", None,
+                                  datetime.now(UTC) + timedelta(hours=1), "secret")
+    session_id = user_session.session_id
+    cache_user_session(db_session, user_session)
+    cached = get_cached_user_session(session_id)
+    assert cached.username == "testuser"
+
+    delete_session(db_session, session_id)
+    assert get_cached_user_session(session_id) is None
+
+
+def test_session_access_times_are_batched(db_session, temp_dir):
+    """Test that session accesses are written to the database in one batch"""
+    db_url = f"sqlite:///{os.path.join(temp_dir, 'test.db')}"
+    created_at = datetime.now(UTC) - timedelta(minutes=5)
+    session_ids = []
+    for username in ["user1", "user2"]:
+        user_session = create_session(db_session, username, None,
+                                      datetime.now(UTC) + timedelta(hours=1), "secret")
+        user_session.last_accessed_at = created_at
+        session_ids.append(user_session.session_id)
+    db_session.commit()
+
+    # Accesses are only recorded in memory until the next flush
+    fileglancer.database.get_settings().session_access_flush_seconds = 3600
+    for session_id in session_ids:
+        record_session_access(db_url, session_id)
+    assert get_session_cache_stats()["pending_access_updates"] == 2
+    db_session.expire_all()
+    assert all(s.last_accessed_at.replace(tzinfo=UTC) == created_at
+               for s in db_session.query(SessionDB).all())
+
+    assert flush_session_access_times(db_session) == 2
+    assert get_session_cache_stats()["pending_access_updates"] == 0
+    db_session.expire_all()
+    assert all(s.last_accessed_at.replace(tzinfo=UTC) > created_at
+               for s in db_session.query(SessionDB).all())
+    assert flush_session_access_times(db_session) == 0
+
+
+def test_cache_invalidations_reach_other_processes(db_session, temp_dir):
+    """Test that an invalidation published by another server process is applied once by this one"""
+    db_url = f"sqlite:///{os.path.join(temp_dir, 'test.db')}"
+    received = []
+    register_cache_invalidation_handler("test_cache", received.append)
+    try:
+        bus = CacheInvalidationBus(db_url, poll_interval=0)
+        bus.poll()
+        assert received == []
+
+        # Publish from a separate process, as another uvicorn worker would
+        script = (
+            "from fileglancer.database import get_db_session, publish_cache_invalidation\n"
+            f"with get_db_session({db_url!r}) as session:\n"
+            "    publish_cache_invalidation(session, 'test_cache', 'key1')\n"
+            "    session.commit()\n"
+        )
+        env = {**os.environ, "FGC_EXTERNAL_PROXY_URL": "http://localhost:7878/files"}
+        subprocess.run([sys.executable, "-c", script], check=True, env=env)
+
+        bus.poll()
+        assert received == ["key1"]
+        # Rows are only applied once, although later polls read them again
+        bus.poll()
+        assert received == ["key1"]
+    finally:
+        fileglancer.database._cache_invalidation_handlers.pop("test_cache")
+
+
+def test_file_cache_invalidations_reach_other_processes(db_session, temp_dir, monkeypatch):
+    """Test that the cached listings and file contents changed by another server process are dropped"""
+    import asyncio
+    import time
+    from concurrent.futures import ThreadPoolExecutor
+    from fileglancer.binary_cache import get_binary_cache
+    from fileglancer.content_cache import ContentCache
+    from fileglancer.filestore import Filestore
+    from fileglancer.listing_cache import get_listing_cache
+    from fileglancer.model import FileSharePath
+
+    db_url = f"sqlite:///{os.path.join(temp_dir, 'test.db')}"
+    bus = CacheInvalidationBus(db_url, poll_interval=0)
+    bus.poll()
+
+    share = os.path.realpath(os.path.join(temp_dir, "share"))
+    os.makedirs(share)
+    for name in ["a.txt", "b.txt"]:
+        with open(os.path.join(share, name), "w") as f:
+            f.write("content")
+    # Only files and directories that were not just modified are cached
+    old = time.time() - 10
+    for path in [os.path.join(share, "a.txt"), os.path.join(share, "b.txt"), share]:
+        os.utime(path, (old, old))
+    share_stat = os.stat(share)
+    b_stat = os.stat(os.path.join(share, "b.txt"))
+
+    filestore = Filestore(FileSharePath(zone="test", name="share", mount_path=share))
+    list(filestore.yield_file_infos("", fsp_index=MountPrefixIndex([])))
+    assert get_listing_cache().get(share, share, share_stat) is not None
+    filestore.check_is_binary("b.txt")
+    assert get_binary_cache().get(b_stat, 4096) is not None
+    content_cache = ContentCache(max_bytes=1024, max_object_size=1024)
+    monkeypatch.setattr("fileglancer.content_cache._content_cache", content_cache)
+    with open(os.path.join(share, "b.txt"), "rb") as f, ThreadPoolExecutor(1) as executor:
+        asyncio.run(content_cache.read(f, b_stat, 0, 7, executor))
+    assert content_cache.stats()["entries"] == 1
+
+    # Change the files from a separate process, as another uvicorn worker would
+    script = (
+        "from fileglancer.database import get_db_session, publish_cache_invalidations\n"
+        "from fileglancer.filestore import Filestore\n"
+        "from fileglancer.model import FileSharePath\n"
+        f"filestore = Filestore(FileSharePath(zone='test', name='share', mount_path={share!r}))\n"
+        "invalidations = filestore.change_file_permissions('a.txt', '-rw-------')\n"
+        "invalidations += filestore.remove_file_or_dir('b.txt')\n"
+        f"with get_db_session({db_url!r}) as session:\n"
+        "    publish_cache_invalidations(session, invalidations)\n"
+        "    session.commit()\n"
+    )
+    env = {**os.environ, "FGC_EXTERNAL_PROXY_URL": "http://localhost:7878/files"}
+    subprocess.run([sys.executable, "-c", script], check=True, env=env)
+
+    bus.poll()
+    # The listing is dropped although it was read with the directory's old modification time
+    assert get_listing_cache().get(share, share, share_stat) is None
+    assert get_binary_cache().get(b_stat, 4096) is None
+    assert content_cache.stats()["entries"] == 0
+
+
+def test_cache_invalidation_poll_does_not_hold_a_connection(db_session, temp_dir):
+    """Test that polling within a request does not leave the request's session in a transaction"""
+    db_url = f"sqlite:///{os.path.join(temp_dir, 'test.db')}"
+    bus = CacheInvalidationBus(db_url, poll_interval=0)
+    polls = get_cache_invalidation_stats()["polls"]
+    with request_session_scope():
+        bus.poll()
+        assert fileglancer.database._get_engine(db_url).pool.checkedout() == 0
+        assert not get_db_session(db_url).in_transaction()
+    assert get_cache_invalidation_stats()["polls"] == polls + 1
+
+
+def test_cache_invalidation_drops_logged_out_session(db_session, temp_dir):
+    """Test that a session deleted by another process is removed from this process's cache"""
+    db_url = f"sqlite:///{os.path.join(temp_dir, 'test.db')}"
+    bus = CacheInvalidationBus(db_url, poll_interval=3600)
+    bus.poll()
+
+    user_session = create_session(db_session, "testuser", None,
+                                  datetime.now(UTC) + timedelta(hours=1), "secret")
+    session_id = user_session.session_id
+    cache_user_session(db_session, user_session)
+
+    # Only the invalidation is published, as if the session was deleted elsewhere
+    publish_cache_invalidation(db_session, "user_session", session_id)
+    db_session.commit()
+    assert get_cached_user_session(session_id) is not None
+
+    # Nothing is read until the poll interval has passed
+    bus.poll()
+    assert get_cached_user_session(session_id) is not None
+    bus.poll_interval = 0
+    bus.poll()
+    assert get_cached_user_session(session_id) is None
+
+
+def test_unknown_sharing_key_is_cached(db_session):
+    """Test that unknown sharing keys are remembered until the key is invalidated"""
+    sharing_key = "unknown-sharing-key"
+    stats = get_missing_sharing_key_stats()
+    assert get_proxied_path_by_sharing_key(db_session, sharing_key) is None
+    assert get_proxied_path_by_sharing_key(db_session, sharing_key) is None
+    new_stats = get_missing_sharing_key_stats()
+    assert new_stats["misses"] - stats["misses"] == 1
+    assert new_stats["hits"] - stats["hits"] == 1
+
+    # A key created by another process is found once its invalidation is applied
+    now = datetime.now(UTC)
+    db_session.add(ProxiedPathDB(username="testuser", sharing_key=sharing_key, sharing_name="name",
+                                 fsp_name="fsp", path="path", created_at=now, updated_at=now))
+    db_session.commit()
+    assert get_proxied_path_by_sharing_key(db_session, sharing_key) is None
+    fileglancer.database._invalidate_sharing_key_cache(sharing_key)
+    assert get_proxied_path_by_sharing_key(db_session, sharing_key).sharing_name == "name"
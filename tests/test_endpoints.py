@@ -2,7 +2,8 @@ import json
 import os
 import tempfile
 import shutil
-from datetime import datetime, timezone
+import time
+from datetime import datetime, timedelta, timezone
 from unittest.mock import patch, MagicMock
 from urllib.parse import quote
 
@@ -12,8 +13,10 @@ from pydantic import HttpUrl
 
 from fileglancer.settings import Settings
 from fileglancer.app import create_app
+import fileglancer.database
 from fileglancer.database import *
 from fileglancer.model import TicketComment
+from fileglancer.user_context import thread_credentials_supported
 
 # Test user constant for authentication override
 TEST_USERNAME = "testuser"
@@ -29,8 +32,8 @@ def temp_dir():
 
 
 @pytest.fixture
-def test_app(temp_dir):
-    """Create test FastAPI app"""
+def test_app(temp_dir, request):
+    """Create test FastAPI app, with the settings given by indirect parametrization"""
 
     # Create temp directory for test database
     db_path = os.path.join(temp_dir, "test.db")
@@ -60,7 +63,7 @@ def test_app(temp_dir):
     test_proxied_path = os.path.join(temp_dir, "new_test_proxied_path")
     os.makedirs(test_proxied_path, exist_ok=True)
 
-    settings = Settings(db_url=db_url, file_share_mounts=[])
+    settings = Settings(db_url=db_url, file_share_mounts=[], **getattr(request, "param", {}))
 
     # Monkey-patch get_settings to return our test settings
     import fileglancer.settings
@@ -378,6 +381,119 @@ def test_get_files(test_client, temp_dir):
     assert "test_file.txt" in file_names
 
 
+def test_get_files_paginated(test_client, temp_dir):
+    """Test listing a directory one page at a time"""
+    listing_dir = os.path.join(temp_dir, "paged")
+    os.makedirs(os.path.join(listing_dir, "subdir"))
+    for i in range(5):
+        with open(os.path.join(listing_dir, f"file{i}.txt"), "w") as f:
+            f.write("x" * (5 - i))
+
+    response = test_client.get("/api/files/tempdir?subpath=paged")
+    assert response.status_code == 200
+    assert "next_cursor" not in response.json()
+
+    names = []
+    cursor = None
+    while True:
+        url = "/api/files/tempdir?subpath=paged&sort=size&limit=2"
+        if cursor:
+            url += f"&cursor={cursor}"
+        response = test_client.get(url)
+        assert response.status_code == 200
+        data = response.json()
+        assert len(data["files"]) <= 2
+        names.extend(f["name"] for f in data["files"])
+        cursor = data["next_cursor"]
+        if cursor is None:
+            break
+    assert names == ["subdir", "file4.txt", "file3.txt", "file2.txt", "file1.txt", "file0.txt"]
+
+    response = test_client.get("/api/files/tempdir?subpath=paged&offset=1&limit=2")
+    assert [f["name"] for f in response.json()["files"]] == ["file0.txt", "file1.txt"]
+
+    # Cursors are only valid for the sort order they were created with
+    response = test_client.get("/api/files/tempdir?subpath=paged&sort=size&limit=2")
+    cursor = response.json()["next_cursor"]
+    response = test_client.get(f"/api/files/tempdir?subpath=paged&sort=name&limit=2&cursor={cursor}")
+    assert response.status_code == 400
+
+
+def test_get_files_paginated_with_vanished_entry(test_client, temp_dir, monkeypatch):
+    """Test that an entry removed while a page is listed does not end the listing"""
+    from fileglancer.filestore import Filestore
+
+    listing_dir = os.path.join(temp_dir, "vanishing")
+    os.makedirs(listing_dir)
+    for i in range(5):
+        with open(os.path.join(listing_dir, f"file{i}.txt"), "w") as f:
+            f.write("x")
+
+    stat_dir_entry = Filestore._stat_dir_entry
+
+    def fail_on_file1(entry):
+        if entry.name == "file1.txt":
+            raise FileNotFoundError(entry.path)
+        return stat_dir_entry(entry)
+
+    monkeypatch.setattr(Filestore, "_stat_dir_entry", staticmethod(fail_on_file1))
+
+    for stream in (False, True):
+        names = []
+        cursor = None
+        while True:
+            url = f"/api/files/tempdir?subpath=vanishing&limit=2&stream={str(stream).lower()}"
+            if cursor:
+                url += f"&cursor={cursor}"
+            response = test_client.get(url)
+            assert response.status_code == 200
+            if stream:
+                lines = [json.loads(line) for line in response.text.splitlines()]
+                names.extend(line["file"]["name"] for line in lines[1:-1])
+                cursor = lines[-1]["next_cursor"]
+            else:
+                data = response.json()
+                names.extend(f["name"] for f in data["files"])
+                cursor = data["next_cursor"]
+            if cursor is None:
+                break
+        assert names == ["file0.txt", "file2.txt", "file3.txt", "file4.txt"]
+
+
+def test_get_files_streamed(test_client, temp_dir, monkeypatch):
+    """Test streaming a directory listing as newline-delimited JSON"""
+    # Send the entries in several batches
+    monkeypatch.setattr("fileglancer.app.LISTING_STREAM_BATCH_SIZE", 1)
+    listing_dir = os.path.join(temp_dir, "streamed")
+    os.makedirs(listing_dir)
+    for i in range(3):
+        with open(os.path.join(listing_dir, f"file{i}.txt"), "w") as f:
+            f.write("x")
+
+    response = test_client.get("/api/files/tempdir?subpath=streamed",
+                               headers={"Accept": "application/x-ndjson"})
+    assert response.status_code == 200
+    assert response.headers["content-type"].startswith("application/x-ndjson")
+    lines = [json.loads(line) for line in response.text.splitlines()]
+    assert lines[0]["info"]["name"] == "streamed"
+    # Without a sort, entries are streamed in directory order
+    assert sorted(line["file"]["name"] for line in lines[1:]) == ["file0.txt", "file1.txt", "file2.txt"]
+
+    response = test_client.get("/api/files/tempdir?subpath=streamed&stream=true&sort=name&order=desc")
+    lines = [json.loads(line) for line in response.text.splitlines()]
+    assert [line["file"]["name"] for line in lines[1:]] == ["file2.txt", "file1.txt", "file0.txt"]
+
+    response = test_client.get("/api/files/tempdir?subpath=streamed&stream=true&limit=2")
+    lines = [json.loads(line) for line in response.text.splitlines()]
+    assert [line["file"]["name"] for line in lines[1:-1]] == ["file0.txt", "file1.txt"]
+    cursor = lines[-1]["next_cursor"]
+
+    response = test_client.get(f"/api/files/tempdir?subpath=streamed&stream=true&limit=2&cursor={cursor}")
+    lines = [json.loads(line) for line in response.text.splitlines()]
+    assert [line["file"]["name"] for line in lines[1:-1]] == ["file2.txt"]
+    assert lines[-1] == {"next_cursor": None}
+
+
 def test_create_directory(test_client, temp_dir):
     """Test creating a directory"""
     response = test_client.post(
@@ -453,6 +569,55 @@ def test_get_profile(test_client):
     assert isinstance(data["groups"], list)
 
 
+def test_get_cache_stats(test_client, temp_dir):
+    """Test that cache hit/miss counters are reported"""
+    with open(os.path.join(temp_dir, "stats_test.txt"), "w") as f:
+        f.write("test")
+    response = test_client.get("/api/files/tempdir")
+    assert response.status_code == 200
+
+    response = test_client.get("/api/cache-stats")
+    assert response.status_code == 200
+    data = response.json()
+    assert "user_names" in data
+    assert "group_names" in data
+    assert "listings" in data
+    assert "read_sizes" in data
+    assert data["user_names"]["hits"] + data["user_names"]["misses"] > 0
+
+
+def test_one_connection_checkout_per_request(test_app):
+    """Test that authentication and the endpoint share one database connection per request"""
+    settings = fileglancer.database.get_settings()
+    with get_db_session(settings.db_url) as session:
+        user_session = create_session(session, TEST_USERNAME, None,
+                                      datetime.now(timezone.utc) + timedelta(hours=1),
+                                      settings.session_secret_key)
+        session_id = user_session.session_id
+
+    # Authenticate with the session cookie, using the test settings
+    from fastapi import Request
+    from fileglancer import auth
+    from fileglancer.app import get_current_user
+
+    def cookie_get_current_user(request: Request):
+        return auth.get_current_user(request, settings)
+
+    test_app.dependency_overrides[get_current_user] = cookie_get_current_user
+    client = TestClient(test_app, cookies={settings.session_cookie_name: session_id})
+    assert client.get("/api/preference").status_code == 200
+
+    # Authentication reads the session, and the endpoint reads preferences
+    invalidate_cached_user_session(session_id)
+    stats = get_connection_stats()
+    response = client.get("/api/preference")
+    assert response.status_code == 200
+    new_stats = get_connection_stats()
+    assert new_stats["requests"] - stats["requests"] == 1
+    assert new_stats["checkouts"] - stats["checkouts"] == 1
+    test_app.dependency_overrides.clear()
+
+
 def test_get_notifications_no_file(test_client):
     """Test getting notifications when notifications.yaml doesn't exist"""
     response = test_client.get("/api/notifications")
@@ -610,6 +775,27 @@ def test_head_file_content_empty_file_is_not_binary(test_client, temp_dir):
     assert response.headers["X-Is-Binary"] == "false"
 
 
+def test_get_files_with_binary_flags(test_client, temp_dir):
+    """Test listing a directory with binary=true includes is_binary for each file"""
+    os.makedirs(os.path.join(temp_dir, "binary_flags"))
+    with open(os.path.join(temp_dir, "binary_flags", "data.bin"), "wb") as f:
+        f.write(b"\x00" * 100)
+    with open(os.path.join(temp_dir, "binary_flags", "text.txt"), "w") as f:
+        f.write("text")
+
+    response = test_client.get("/api/files/tempdir?subpath=binary_flags")
+    assert all("is_binary" not in f for f in response.json()["files"])
+
+    response = test_client.get("/api/files/tempdir?subpath=binary_flags&binary=true")
+    assert response.status_code == 200
+    assert {f["name"]: f["is_binary"] for f in response.json()["files"]} == {"data.bin": True, "text.txt": False}
+
+    response = test_client.get("/api/files/tempdir?subpath=binary_flags&binary=true&stream=true")
+    lines = [json.loads(line) for line in response.text.splitlines()]
+    assert {line["file"]["name"]: line["file"]["is_binary"] for line in lines[1:]} == \
+        {"data.bin": True, "text.txt": False}
+
+
 def test_get_file_content(test_client, temp_dir):
     """Test GET request for file content"""
     # Create a test file
@@ -644,6 +830,45 @@ def test_get_file_content_with_range(test_client, temp_dir):
     assert response.headers["Content-Range"] == "bytes 2-5/10"
 
 
+def test_get_file_content_with_multiple_ranges(test_client, temp_dir):
+    """Test GET request for several byte ranges returns a multipart/byteranges body"""
+    test_file = os.path.join(temp_dir, "multi_range_test.txt")
+    with open(test_file, "w") as f:
+        f.write("0123456789abcdef")
+
+    # The last two ranges overlap and are merged
+    response = test_client.get(
+        "/api/content/tempdir?subpath=multi_range_test.txt",
+        headers={"Range": "bytes=0-1, 10-12, 12-13"}
+    )
+    assert response.status_code == 206
+    content_type = response.headers["Content-Type"]
+    assert content_type.startswith("multipart/byteranges; boundary=")
+    boundary = content_type.split("boundary=")[1]
+    assert int(response.headers["Content-Length"]) == len(response.content)
+
+    parts = response.content.split(f"--{boundary}".encode())
+    assert parts[0] == b""
+    assert parts[-1] == b"--\r\n"
+    assert len(parts) == 4
+    assert b"Content-Range: bytes 0-1/16\r\n\r\n01\r\n" in parts[1]
+    assert b"Content-Range: bytes 10-13/16\r\n\r\nabcd\r\n" in parts[2]
+
+
+def test_get_file_content_too_many_ranges(test_client, temp_dir):
+    """Test GET request with more ranges than allowed returns 416"""
+    test_file = os.path.join(temp_dir, "many_ranges_test.txt")
+    with open(test_file, "w") as f:
+        f.write("x" * 1000)
+
+    ranges = ", ".join(f"{i * 10}-{i * 10 + 1}" for i in range(50))
+    response = test_client.get(
+        "/api/content/tempdir?subpath=many_ranges_test.txt",
+        headers={"Range": f"bytes={ranges}"}
+    )
+    assert response.status_code == 416
+
+
 def test_get_file_content_invalid_range(test_client, temp_dir):
     """Test GET request with invalid range returns 416"""
     # Create a test file
@@ -661,6 +886,286 @@ def test_get_file_content_invalid_range(test_client, temp_dir):
     assert "Content-Range" in response.headers
 
 
+def test_get_file_content_conditional(test_client, temp_dir):
+    """Test GET and HEAD requests with If-None-Match and If-Modified-Since return 304"""
+    test_file = os.path.join(temp_dir, "conditional_test.txt")
+    with open(test_file, "w") as f:
+        f.write("0123456789")
+    os.utime(test_file, (1700000000, 1700000000))
+
+    url = "/api/content/tempdir?subpath=conditional_test.txt"
+    response = test_client.get(url)
+    assert response.status_code == 200
+    etag = response.headers["ETag"]
+    assert not etag.startswith("W/")
+    assert response.headers["Last-Modified"] == "Tue, 14 Nov 2023 22:13:20 GMT"
+    assert test_client.head(url).headers["ETag"] == etag
+
+    for headers in [{"If-None-Match": etag}, {"If-None-Match": f'"other", W/{etag}'},
+                    {"If-Modified-Since": response.headers["Last-Modified"]}]:
+        for method in (test_client.get, test_client.head):
+            not_modified = method(url, headers=headers)
+            assert not_modified.status_code == 304
+            assert not_modified.headers["ETag"] == etag
+            assert not_modified.content == b""
+
+    # If-None-Match takes precedence over If-Modified-Since
+    response = test_client.get(url, headers={"If-None-Match": '"other"',
+                                             "If-Modified-Since": response.headers["Last-Modified"]})
+    assert response.status_code == 200
+
+    # Modifying the file changes the ETag
+    os.utime(test_file, (1700000100, 1700000100))
+    assert test_client.get(url, headers={"If-None-Match": etag}).status_code == 200
+
+
+def test_get_file_content_if_range(test_client, temp_dir):
+    """Test GET request with If-Range honours the Range header only if the file is unchanged"""
+    test_file = os.path.join(temp_dir, "if_range_test.txt")
+    with open(test_file, "w") as f:
+        f.write("0123456789")
+    os.utime(test_file, (1700000000, 1700000000))
+
+    url = "/api/content/tempdir?subpath=if_range_test.txt"
+    etag = test_client.head(url).headers["ETag"]
+
+    response = test_client.get(url, headers={"Range": "bytes=2-5", "If-Range": etag})
+    assert response.status_code == 206
+    assert response.text == "2345"
+    response = test_client.get(url, headers={"Range": "bytes=2-5", "If-Range": "Tue, 14 Nov 2023 22:13:20 GMT"})
+    assert response.status_code == 206
+
+    for if_range in ['"other"', f"W/{etag}", "Tue, 14 Nov 2023 22:13:21 GMT"]:
+        response = test_client.get(url, headers={"Range": "bytes=2-5", "If-Range": if_range})
+        assert response.status_code == 200
+        assert response.text == "0123456789"
+
+
+def test_files_proxy_conditional(test_client, temp_dir):
+    """Test the /files proxy sends ETags and honours conditional requests"""
+    os.makedirs(os.path.join(temp_dir, "proxied_conditional"))
+    test_file = os.path.join(temp_dir, "proxied_conditional", "data.txt")
+    with open(test_file, "w") as f:
+        f.write("0123456789")
+    os.utime(test_file, (1700000000, 1700000000))
+
+    response = test_client.post("/api/proxied-path?fsp_name=tempdir&path=proxied_conditional")
+    assert response.status_code == 200
+    data = response.json()
+    url = f"/files/{data['sharing_key']}/{data['sharing_name']}/data.txt"
+
+    response = test_client.get(url)
+    assert response.status_code == 200
+    etag = response.headers["ETag"]
+    assert test_client.head(url).headers["ETag"] == etag
+
+    assert test_client.get(url, headers={"If-None-Match": etag}).status_code == 304
+    assert test_client.head(url, headers={"If-None-Match": etag}).status_code == 304
+    last_modified = response.headers["Last-Modified"]
+    assert test_client.get(url, headers={"If-Modified-Since": last_modified}).status_code == 304
+
+    response = test_client.get(url, headers={"Range": "bytes=2-5", "If-Range": etag})
+    assert response.status_code == 206
+    assert response.text == "2345"
+    response = test_client.get(url, headers={"Range": "bytes=2-5", "If-Range": '"other"'})
+    assert response.status_code == 200
+    assert response.text == "0123456789"
+
+
+def test_files_proxy_head_does_not_open_file(test_client, temp_dir, monkeypatch):
+    """Test HEAD through the /files proxy stats the file instead of opening it"""
+    from x2s3.client_file import FileProxyClient
+
+    os.makedirs(os.path.join(temp_dir, "proxied_head"))
+    with open(os.path.join(temp_dir, "proxied_head", "data.txt"), "w") as f:
+        f.write("0123456789")
+    data = test_client.post("/api/proxied-path?fsp_name=tempdir&path=proxied_head").json()
+    url = f"/files/{data['sharing_key']}/{data['sharing_name']}/data.txt"
+    etag = test_client.get(url).headers["ETag"]
+
+    async def fail_open_object(self, key, range_header=None):
+        raise AssertionError("HEAD must not open the file")
+
+    monkeypatch.setattr(FileProxyClient, "open_object", fail_open_object)
+    response = test_client.head(url)
+    assert response.status_code == 200
+    assert response.headers["Content-Length"] == "10"
+    assert response.headers["ETag"] == etag
+    assert test_client.head(url, headers={"If-None-Match": etag}).status_code == 304
+
+
+@pytest.mark.skipif(os.geteuid() != 0 or not thread_credentials_supported(),
+                    reason="Requires root and per-thread credentials")
+@pytest.mark.parametrize("test_app", [{"use_access_flags": True, "user_context_threads": 2}], indirect=True)
+def test_file_access_runs_on_user_context_threads(test_app, test_client, temp_dir, monkeypatch):
+    """Test the /files proxy and file changes run on the user context threads, not the event loop"""
+    import threading
+    from x2s3.client_file import FileProxyClient
+    from fileglancer.app import get_current_user
+    from fileglancer.filestore import Filestore
+
+    test_app.dependency_overrides[get_current_user] = lambda: "root"
+    threads = set()
+
+    def record_thread(method):
+        async def wrapper(*args, **kwargs):
+            threads.add(threading.current_thread().name)
+            return await method(*args, **kwargs)
+        return wrapper
+
+    for name in ("open_object", "head_object", "list_objects_v2"):
+        monkeypatch.setattr(FileProxyClient, name, record_thread(getattr(FileProxyClient, name)))
+
+    os.makedirs(os.path.join(temp_dir, "threaded"))
+    with open(os.path.join(temp_dir, "threaded", "data.txt"), "w") as f:
+        f.write("data")
+    data = test_client.post("/api/proxied-path?fsp_name=tempdir&path=threaded").json()
+    url = f"/files/{data['sharing_key']}/{data['sharing_name']}"
+    assert test_client.get(f"{url}/data.txt").content == b"data"
+    assert test_client.head(f"{url}/data.txt").status_code == 200
+    assert test_client.get(f"{url}?list-type=2").status_code == 200
+    assert threads and all(name.startswith("user-context") for name in threads)
+
+    mkdir = Filestore.create_dir
+    monkeypatch.setattr(Filestore, "create_dir",
+                        lambda self, path: threads.add(threading.current_thread().name) or mkdir(self, path))
+    threads.clear()
+    response = test_client.post("/api/files/tempdir?subpath=threaded/new", json={"type": "directory"})
+    assert response.status_code == 201
+    assert threads and all(name.startswith("user-context") for name in threads)
+    assert test_client.delete("/api/files/tempdir?subpath=threaded/new").status_code == 200
+
+
+def test_files_proxy_route_cache(test_client, temp_dir):
+    """Test data link routes are cached, and dropped when the data link is changed"""
+    from fileglancer.proxy_routes import get_proxy_route_cache
+
+    for name in ["route_a", "route_b"]:
+        os.makedirs(os.path.join(temp_dir, name))
+        with open(os.path.join(temp_dir, name, "data.txt"), "w") as f:
+            f.write(name)
+
+    data = test_client.post("/api/proxied-path?fsp_name=tempdir&path=route_a").json()
+    sharing_key = data["sharing_key"]
+    url = f"/files/{sharing_key}/{data['sharing_name']}/data.txt"
+
+    stats = get_proxy_route_cache().stats()
+    assert test_client.get(url).text == "route_a"
+    assert test_client.get(url).text == "route_a"
+    new_stats = get_proxy_route_cache().stats()
+    assert new_stats["misses"] - stats["misses"] == 1
+    assert new_stats["hits"] - stats["hits"] == 1
+
+    # A mismatched sharing name is still rejected for a cached route
+    assert test_client.get(f"/files/{sharing_key}/other/data.txt").status_code == 404
+
+    response = test_client.put(f"/api/proxied-path/{sharing_key}?fsp_name=tempdir&path=route_b")
+    assert response.status_code == 200
+    assert test_client.get(url).text == "route_b"
+
+    assert test_client.delete(f"/api/proxied-path/{sharing_key}").status_code == 200
+    assert test_client.get(url).status_code == 404
+
+
+def test_files_proxy_missing_objects_are_cached(test_client, temp_dir):
+    """Test probes for objects that do not exist are answered from the missing object cache"""
+    from fileglancer.proxy_routes import get_missing_object_cache
+
+    shared = os.path.join(temp_dir, "missing_objects")
+    os.makedirs(shared)
+    data = test_client.post("/api/proxied-path?fsp_name=tempdir&path=missing_objects").json()
+    url = f"/files/{data['sharing_key']}/{data['sharing_name']}/.zattrs"
+    t = time.time() - 60
+    os.utime(shared, (t, t))
+
+    stats = get_missing_object_cache().stats()
+    assert test_client.get(url).status_code == 404
+    assert test_client.get(url).status_code == 404
+    assert test_client.head(url).status_code == 404
+    assert get_missing_object_cache().stats()["hits"] - stats["hits"] == 2
+
+    # The object is found as soon as it is created
+    with open(os.path.join(shared, ".zattrs"), "w") as f:
+        f.write("{}")
+    response = test_client.get(url)
+    assert response.status_code == 200
+    assert response.text == "{}"
+
+
+def test_file_content_is_cached(test_client, temp_dir, monkeypatch):
+    """Test small files and ranges are sent from the content cache until the file changes"""
+    from fileglancer.content_cache import ContentCache
+
+    cache = ContentCache(max_bytes=1024 * 1024, max_object_size=1024)
+    monkeypatch.setattr("fileglancer.content_cache._content_cache", cache)
+
+    shared = os.path.join(temp_dir, "cached_content")
+    os.makedirs(shared)
+    path = os.path.join(shared, "chunk.bin")
+    with open(path, "wb") as f:
+        f.write(b"0123456789")
+    t = time.time() - 60
+    os.utime(path, (t, t))
+    data = test_client.post("/api/proxied-path?fsp_name=tempdir&path=cached_content").json()
+    files_url = f"/files/{data['sharing_key']}/{data['sharing_name']}/chunk.bin"
+
+    for _ in range(2):
+        response = test_client.get("/api/content/tempdir?subpath=cached_content/chunk.bin",
+                                   headers={"Range": "bytes=2-5"})
+        assert response.status_code == 206
+        assert response.content == b"2345"
+        assert response.headers["Content-Range"] == "bytes 2-5/10"
+        response = test_client.get(files_url)
+        assert response.status_code == 200
+        assert response.content == b"0123456789"
+    stats = test_client.get("/api/cache-stats").json()["content"]
+    assert stats["hits"] == 2
+    assert stats["misses"] == 2
+
+    # Both endpoints read the same byte ranges from the cache
+    response = test_client.get(files_url, headers={"Range": "bytes=2-5"})
+    assert response.content == b"2345"
+    assert cache.stats()["hits"] == 3
+
+    with open(path, "wb") as f:
+        f.write(b"abcdefghij")
+    response = test_client.get("/api/content/tempdir?subpath=cached_content/chunk.bin")
+    assert response.content == b"abcdefghij"
+
+
+@pytest.mark.skipif(not hasattr(os, "posix_fadvise"), reason="posix_fadvise is not supported")
+def test_files_proxy_reads_ahead_neighbouring_chunks(test_client, temp_dir, monkeypatch):
+    """Test requesting a chunk through a data link warms its neighbours"""
+    from fileglancer.read_ahead import ReadAhead
+
+    shared = os.path.join(temp_dir, "read_ahead.zarr")
+    os.makedirs(shared)
+    for name in ("0.0", "0.1", "1.0"):
+        with open(os.path.join(shared, name), "wb") as f:
+            f.write(b"chunk " + name.encode())
+    read_ahead = ReadAhead([shared], max_chunks=6, max_concurrency=4)
+    monkeypatch.setattr("fileglancer.read_ahead._read_ahead", read_ahead)
+    data = test_client.post("/api/proxied-path?fsp_name=tempdir&path=read_ahead.zarr").json()
+    url = f"/files/{data['sharing_key']}/{data['sharing_name']}"
+
+    assert test_client.get(f"{url}/0.0").content == b"chunk 0.0"
+    deadline = time.time() + 5
+    while read_ahead.stats()["in_progress"] and time.time() < deadline:
+        time.sleep(0.01)
+    stats = test_client.get("/api/cache-stats").json()["read_ahead"]
+    assert stats["warmed"] == 2
+    assert stats["missing"] == 0
+
+    assert test_client.get(f"{url}/1.0").content == b"chunk 1.0"
+    assert read_ahead.stats()["useful"] == 1
+
+    # Revalidations do not read ahead
+    etag = test_client.get(f"{url}/0.1").headers["etag"]
+    scheduled = read_ahead.stats()["scheduled"]
+    assert test_client.get(f"{url}/0.1", headers={"If-None-Match": etag}).status_code == 304
+    assert read_ahead.stats()["scheduled"] == scheduled
+
+
 def test_get_file_content_directory_error(test_client, temp_dir):
     """Test GET request for directory content returns 400"""
     # Create a directory
@@ -3,13 +3,16 @@ import stat
 import pytest
 import tempfile
 import shutil
+import asyncio
 
+from concurrent.futures import ThreadPoolExecutor
 from contextlib import contextmanager
 from unittest.mock import Mock
 from typing import List, Callable, Optional
 
 from fileglancer import database
-from fileglancer.filestore import Filestore, FileInfo
+from fileglancer.binary_cache import get_binary_cache
+from fileglancer.filestore import Filestore, FileInfo, ReadSizePolicy, MIN_READ_SIZE
 from fileglancer.model import FileSharePath
 
 @pytest.fixture
@@ -136,6 +139,25 @@ def test_stream_file_contents(filestore):
     assert content == b"test content 2"
 
 
+@pytest.mark.parametrize("start, end, expected", [
+    (0, None, b"test content"),
+    (5, None, b"content"),
+    (2, 5, b"st c"),
+    (0, 100, b"test content"),
+])
+def test_stream_file_async(filestore, test_dir, start, end, expected):
+    async def read_all(file_handle, executor):
+        return [chunk async for chunk in filestore.stream_file_async(file_handle, executor, start=start,
+                                                                     end=end, buffer_size=3)]
+
+    file_handle = open(os.path.join(test_dir, "test.txt"), "rb")
+    with ThreadPoolExecutor(max_workers=1) as executor:
+        chunks = asyncio.run(read_all(file_handle, executor))
+    assert b"".join(chunks) == expected
+    assert all(len(chunk) <= 3 for chunk in chunks)
+    assert file_handle.closed
+
+
 def test_rename_file(filestore, test_dir):
     filestore.rename_file_or_dir("test.txt", "renamed.txt")
     assert not os.path.exists(os.path.join(test_dir, "test.txt"))
@@ -463,3 +485,184 @@ def test_broken_symlink_within_share(test_dir):
         assert broken_link_info is not None, "Broken symlink should be listed"
         assert broken_link_info.is_symlink is True, "Should be marked as symlink"
         assert broken_link_info.symlink_target_fsp is None, "symlink_target_fsp should be None for broken symlink even if target path matches share pattern"
+
+
+def test_yield_file_infos_paths_are_relative_to_root(filestore, test_dir):
+    """Test that listed entries report paths relative to the root, including for symlinks"""
+    os.symlink(os.path.join(test_dir, "subdir", "test2.txt"), os.path.join(test_dir, "subdir", "link"))
+    files = list(filestore.yield_file_infos("subdir"))
+    assert [f.name for f in files] == ["link", "test2.txt"]
+    assert files[0].path == "subdir/test2.txt"
+    assert files[0].is_symlink is True
+    assert files[1].path == "subdir/test2.txt"
+    assert files[1].absolute_path == os.path.join(filestore.get_root_path(), "subdir", "test2.txt")
+    assert files[1].size == len("test content 2")
+
+
+def test_dir_entry_paths_in_filesystem_root(test_dir):
+    """Test that entries listed in a share rooted at / have paths relative to /"""
+    filestore = Filestore(FileSharePath(zone="test", name="root", mount_path="/"))
+    dir_path = os.path.realpath(os.path.join(test_dir, "subdir"))
+    with os.scandir(dir_path) as it:
+        entry = next(it)
+    lstat_result, stat_result = Filestore._stat_dir_entry(entry)
+    file_info = filestore._get_file_info_from_dir_entry(dir_path, entry.name, entry.path,
+                                                        lstat_result, stat_result)
+    assert file_info.path == os.path.relpath(entry.path, "/")
+
+
+def test_yield_file_infos_lists_symlinked_dirs_first(filestore, test_dir):
+    """Test that symlinks to directories are sorted with directories"""
+    os.symlink(os.path.join(test_dir, "subdir"), os.path.join(test_dir, "zz_link_to_dir"))
+    files = list(filestore.yield_file_infos(""))
+    assert [f.name for f in files] == ["subdir", "zz_link_to_dir", "test.txt"]
+
+
+def test_yield_file_infos_sort_and_limit(filestore, test_dir):
+    for name, size in [("a.bin", 30), ("b.bin", 10), ("c.bin", 20)]:
+        with open(os.path.join(test_dir, name), "wb") as f:
+            f.write(b"x" * size)
+
+    names = [f.name for f in filestore.yield_file_infos("", sort_by="size")]
+    assert names == ["subdir", "b.bin", "test.txt", "c.bin", "a.bin"]
+
+    # Directories are listed first in descending order too
+    names = [f.name for f in filestore.yield_file_infos("", sort_by="name", descending=True)]
+    assert names == ["subdir", "test.txt", "c.bin", "b.bin", "a.bin"]
+
+    names = [f.name for f in filestore.yield_file_infos("", offset=1, limit=2)]
+    assert names == ["a.bin", "b.bin"]
+
+    with pytest.raises(ValueError):
+        list(filestore.yield_file_infos("", sort_by="owner"))
+
+
+def test_yield_file_infos_unsorted(filestore, test_dir):
+    for name in ["a.bin", "b.bin"]:
+        with open(os.path.join(test_dir, name), "wb") as f:
+            f.write(b"x")
+
+    names = [f.name for f in filestore.yield_file_infos("", sort_by=None)]
+    assert sorted(names) == ["a.bin", "b.bin", "subdir", "test.txt"]
+    assert len(list(filestore.yield_file_infos("", sort_by=None, offset=1))) == 3
+
+    # Entries are read one at a time
+    files = filestore.yield_file_infos("", sort_by=None)
+    assert next(files).name in names
+    files.close()
+
+    with pytest.raises(ValueError):
+        list(filestore.yield_file_infos("", sort_by=None, limit=2))
+
+
+@pytest.mark.parametrize("sort_by", ["name", "size", "mtime"])
+@pytest.mark.parametrize("descending", [False, True])
+def test_yield_file_infos_cursor_pages(filestore, test_dir, sort_by, descending):
+    from fileglancer.filestore import encode_listing_cursor, decode_listing_cursor
+    for i in range(7):
+        path = os.path.join(test_dir, f"file{i}.dat")
+        with open(path, "wb") as f:
+            f.write(b"x" * (i * 7 % 5))
+        os.utime(path, (1000 + i % 3, 1000 + i % 3))
+
+    expected = [f.name for f in filestore.yield_file_infos("", sort_by=sort_by, descending=descending)]
+    paged = []
+    start_after = None
+    while True:
+        page = list(filestore.yield_file_infos("", sort_by=sort_by, descending=descending,
+                                               start_after=start_after, limit=3))
+        paged.extend(f.name for f in page)
+        if len(page) < 3:
+            break
+        cursor = encode_listing_cursor(page[-1], sort_by, descending)
+        start_after = decode_listing_cursor(cursor, sort_by, descending)
+    assert paged == expected
+
+
+def test_decode_listing_cursor_rejects_invalid_cursors(filestore):
+    from fileglancer.filestore import encode_listing_cursor, decode_listing_cursor
+    file_info = filestore.get_file_info("test.txt")
+    cursor = encode_listing_cursor(file_info, "size", False)
+    assert decode_listing_cursor(cursor, "size", False) == (True, 12, "test.txt")
+    with pytest.raises(ValueError):
+        decode_listing_cursor(cursor, "name", False)
+    with pytest.raises(ValueError):
+        decode_listing_cursor(cursor, "size", True)
+    with pytest.raises(ValueError):
+        decode_listing_cursor("not a cursor", "size", False)
+
+
+def test_yield_file_infos_reads_file_share_paths_once(test_dir, filestore):
+    """Test that symlinks in a listing are resolved without reading the file share paths for each one"""
+    for i in range(5):
+        os.symlink(os.path.join(test_dir, "subdir"), os.path.join(test_dir, f"link{i}"))
+    fsp = FileSharePath(zone="test", name="test", mount_path=test_dir)
+    calls = []
+
+    def get_file_share_paths(session, fsp_name=None):
+        calls.append(fsp_name)
+        return [fsp]
+
+    original_get_paths = database.get_file_share_paths
+    database.get_file_share_paths = get_file_share_paths
+    try:
+        files = [f for f in filestore.yield_file_infos(None, session=Mock()) if f.is_symlink]
+    finally:
+        database.get_file_share_paths = original_get_paths
+    assert len(files) == 5
+    assert all(f.symlink_target_fsp == {"fsp_name": "test", "subpath": "subdir"} for f in files)
+    assert len(calls) == 1
+
+
+def test_read_size_policy(test_dir):
+    nested = os.path.join(test_dir, "subdir")
+    policy = ReadSizePolicy(65536, {test_dir: 1 << 20, nested: 4 << 20})
+    assert policy.get_share_read_size(test_dir) == 1 << 20
+    assert policy.get_share_read_size(nested) == 4 << 20
+    assert policy.get_share_read_size(tempfile.gettempdir()) == 65536
+
+    # Small files and ranges are read at once
+    assert policy.choose(test_dir, 100) == MIN_READ_SIZE
+    assert policy.choose(test_dir, 300000) == 300000
+    assert policy.choose(test_dir, 10 << 20) == 1 << 20
+    assert policy.choose(test_dir, None) == 1 << 20
+    assert policy.stats()["chosen"] == {str(MIN_READ_SIZE): 1, "300000": 1, str(1 << 20): 2}
+
+
+def test_check_is_binary_is_cached(filestore, test_dir):
+    get_binary_cache().clear()
+    path = os.path.join(test_dir, "data.bin")
+    with open(path, "wb") as f:
+        f.write(b"\x00\x01\x02" * 100)
+    os.utime(path, (1700000000, 1700000000))
+
+    stats = get_binary_cache().stats()
+    assert filestore.check_is_binary("data.bin") is True
+    assert filestore.check_is_binary("data.bin") is True
+    new_stats = get_binary_cache().stats()
+    assert new_stats["hits"] - stats["hits"] == 1
+    assert new_stats["misses"] - stats["misses"] == 1
+
+    # Rewriting the file invalidates the cached result
+    with open(path, "w") as f:
+        f.write("now it is text")
+    os.utime(path, (1700000000, 1700000000))
+    assert filestore.check_is_binary("data.bin") is False
+
+    # Recently modified files are not cached
+    with open(path, "wb") as f:
+        f.write(b"\x00" * 10)
+    assert filestore.check_is_binary("data.bin") is True
+    assert get_binary_cache().get(os.stat(path), 4096) is None
+
+    assert filestore.check_is_binary("subdir") is False
+    assert filestore.check_is_binary("missing.txt") is True
+
+
+def test_yield_binary_flags(filestore, test_dir):
+    with open(os.path.join(test_dir, "data.bin"), "wb") as f:
+        f.write(b"\x00" * 100)
+    files = {f.name: f for f in filestore.yield_binary_flags(filestore.yield_file_infos(""))}
+    assert files["data.bin"].is_binary is True
+    assert files["test.txt"].is_binary is False
+    assert files["subdir"].is_binary is None
@@ -0,0 +1,119 @@
+import os
+import pwd
+import stat
+from types import SimpleNamespace
+from unittest.mock import patch
+
+import pytest
+
+from fileglancer import identity
+from fileglancer.identity import UserIdentity, get_user_identity, has_read_permission, has_write_permission
+
+
+@pytest.fixture(autouse=True)
+def clear_identity_cache():
+    identity.invalidate_user_identity()
+    yield
+    identity.invalidate_user_identity()
+
+
+@pytest.fixture
+def current_username():
+    return pwd.getpwuid(os.getuid()).pw_name
+
+
+def make_stat(mode, uid=1000, gid=1000):
+    return SimpleNamespace(st_mode=stat.S_IFREG | mode, st_uid=uid, st_gid=gid)
+
+
+def test_get_user_identity(current_username):
+    user = get_user_identity(current_username)
+    assert user is not None
+    assert user.username == current_username
+    assert user.uid == os.getuid()
+    assert user.gid in user.gids
+
+
+def test_get_user_identity_unknown_user():
+    assert get_user_identity("no_such_user_fileglancer") is None
+
+
+def test_get_user_identity_is_cached(current_username):
+    with patch("fileglancer.identity._resolve_user_identity", wraps=identity._resolve_user_identity) as resolve:
+        get_user_identity(current_username)
+        get_user_identity(current_username)
+        get_user_identity("no_such_user_fileglancer")
+        get_user_identity("no_such_user_fileglancer")
+        assert resolve.call_count == 2
+
+
+def test_invalidate_user_identity(current_username):
+    with patch("fileglancer.identity._resolve_user_identity", wraps=identity._resolve_user_identity) as resolve:
+        get_user_identity(current_username)
+        identity.invalidate_user_identity(current_username)
+        get_user_identity(current_username)
+        assert resolve.call_count == 2
+
+
+def test_permissions_owner():
+    user = UserIdentity(username="u", uid=1000, gid=2000, gids=frozenset([2000]))
+    st = make_stat(0o600, uid=1000, gid=3000)
+    assert has_read_permission(st, user)
+    assert has_write_permission(st, user)
+    st = make_stat(0o077, uid=1000, gid=2000)
+    assert not has_read_permission(st, user)
+    assert not has_write_permission(st, user)
+
+
+def test_permissions_group():
+    user = UserIdentity(username="u", uid=1000, gid=2000, gids=frozenset([2000, 2001]))
+    st = make_stat(0o640, uid=1, gid=2001)
+    assert has_read_permission(st, user)
+    assert not has_write_permission(st, user)
+
+
+def test_permissions_other():
+    user = UserIdentity(username="u", uid=1000, gid=2000, gids=frozenset([2000]))
+    st = make_stat(0o006, uid=1, gid=1)
+    assert has_read_permission(st, user)
+    assert has_write_permission(st, user)
+    # Unknown users only get the other bits
+    st = make_stat(0o660, uid=1, gid=1)
+    assert not has_read_permission(st, None)
+    assert not has_write_permission(st, None)
+
+
+def test_id_name_cache_counts_hits_and_misses():
+    cache = identity.IdNameCache(lambda id: f"name{id}", maxsize=10, ttl=60)
+    assert cache.get(1) == "name1"
+    assert cache.get(1) == "name1"
+    assert cache.get(2) == "name2"
+    stats = cache.stats()
+    assert stats["hits"] == 1
+    assert stats["misses"] == 2
+    assert stats["size"] == 2
+    assert stats["maxsize"] == 10
+
+
+def test_id_name_cache_caches_unknown_ids():
+    calls = []
+
+    def lookup(id):
+        calls.append(id)
+        raise KeyError(id)
+
+    cache = identity.IdNameCache(lookup, maxsize=10, ttl=60)
+    assert cache.get(12345) == "12345"
+    assert cache.get(12345) == "12345"
+    assert calls == [12345]
+
+
+def test_id_name_cache_is_bounded():
+    cache = identity.IdNameCache(lambda id: f"name{id}", maxsize=2, ttl=60)
+    for i in range(5):
+        cache.get(i)
+    assert cache.stats()["size"] == 2
+
+
+def test_get_user_name(current_username):
+    assert identity.get_user_name(os.getuid()) == current_username
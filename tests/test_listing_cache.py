@@ -0,0 +1,128 @@
+import os
+import pwd
+import time
+import shutil
+import tempfile
+from types import SimpleNamespace
+from unittest.mock import Mock
+
+import pytest
+
+from fileglancer.filestore import Filestore
+from fileglancer.listing_cache import ListingCache, get_listing_cache
+from fileglancer.model import FileSharePath
+
+
+@pytest.fixture(autouse=True)
+def clear_listing_cache():
+    get_listing_cache().clear()
+    yield
+    get_listing_cache().clear()
+
+
+@pytest.fixture
+def test_dir():
+    temp_dir = tempfile.mkdtemp()
+    for name in ["a.txt", "b.txt"]:
+        with open(os.path.join(temp_dir, name), "w") as f:
+            f.write(name)
+    os.makedirs(os.path.join(temp_dir, "subdir"))
+    make_old(temp_dir)
+    yield temp_dir
+    shutil.rmtree(temp_dir)
+
+
+@pytest.fixture
+def filestore(test_dir):
+    return Filestore(FileSharePath(zone="test", name="test", mount_path=test_dir))
+
+
+def make_old(path, age=60):
+    """Set the modification time of a directory far enough in the past for its listing to be cached"""
+    t = time.time() - age
+    os.utime(path, (t, t))
+
+
+def list_names(filestore, path="", **kwargs):
+    return [f.name for f in filestore.yield_file_infos(path, session=Mock(), **kwargs)]
+
+
+def test_listing_is_cached(filestore):
+    stats = get_listing_cache().stats()
+    assert list_names(filestore) == ["subdir", "a.txt", "b.txt"]
+    assert list_names(filestore) == ["subdir", "a.txt", "b.txt"]
+    # Cached listings are reused for other sort orders and pages
+    assert list_names(filestore, descending=True, limit=2) == ["subdir", "b.txt"]
+    new_stats = get_listing_cache().stats()
+    assert new_stats["hits"] - stats["hits"] == 2
+    assert new_stats["listings"] == 1
+    assert new_stats["size"] == 4
+
+
+def test_listing_is_not_cached_without_session(filestore):
+    list(filestore.yield_file_infos(""))
+    assert get_listing_cache().stats()["listings"] == 0
+
+
+def test_recently_modified_directory_is_not_cached(filestore, test_dir):
+    os.utime(test_dir)
+    list_names(filestore)
+    assert get_listing_cache().stats()["listings"] == 0
+
+
+def test_directory_change_is_detected(filestore, test_dir):
+    list_names(filestore)
+    with open(os.path.join(test_dir, "c.txt"), "w") as f:
+        f.write("c")
+    make_old(test_dir, age=30)
+    assert list_names(filestore) == ["subdir", "a.txt", "b.txt", "c.txt"]
+
+
+def test_permissions_are_computed_per_user(filestore):
+    username = pwd.getpwuid(os.getuid()).pw_name
+    files = list(filestore.yield_file_infos("", session=Mock()))
+    assert all(f.hasRead is None for f in files)
+    hits = get_listing_cache().stats()["hits"]
+    files = list(filestore.yield_file_infos("", current_user=username, session=Mock()))
+    assert get_listing_cache().stats()["hits"] == hits + 1
+    assert all(f.hasRead is True for f in files)
+
+
+def test_chmod_invalidates_listing(filestore):
+    list_names(filestore)
+    filestore.change_file_permissions("a.txt", "-r--------")
+    files = {f.name: f for f in filestore.yield_file_infos("", session=Mock())}
+    assert files["a.txt"].permissions == "-r--------"
+
+
+def test_remove_invalidates_listing(filestore, test_dir):
+    list_names(filestore)
+    filestore.remove_file_or_dir("b.txt")
+    # Make the directory look unchanged, as a coarse mtime could
+    make_old(test_dir)
+    assert list_names(filestore) == ["subdir", "a.txt"]
+
+
+def test_symlinks_are_stat_on_each_listing(filestore, test_dir):
+    os.symlink("a.txt", os.path.join(test_dir, "link"))
+    make_old(test_dir)
+    list_names(filestore)
+    hits = get_listing_cache().stats()["hits"]
+    # Appending to a file does not change the directory
+    with open(os.path.join(test_dir, "a.txt"), "a") as f:
+        f.write("more")
+    files = {f.name: f for f in filestore.yield_file_infos("", session=Mock())}
+    assert get_listing_cache().stats()["hits"] == hits + 1
+    assert files["link"].is_symlink
+    assert files["link"].size == len("a.txtmore")
+
+
+def test_listing_cache_is_bounded():
+    cache = ListingCache(maxsize=5, ttl=60)
+    st = SimpleNamespace(st_dev=1, st_ino=1, st_mtime_ns=0)
+    cache.put("/a", "/", st, [(None, None)] * 3, [], time.time_ns())
+    cache.put("/b", "/", st, [(None, None)] * 3, [], time.time_ns())
+    assert cache.stats()["listings"] == 1
+    # Listings larger than the cache are not cached
+    cache.put("/c", "/", st, [(None, None)] * 10, [], time.time_ns())
+    assert cache.get("/c", "/", st) is None
@@ -0,0 +1,57 @@
+import pytest
+from fastapi import FastAPI, Request
+from fastapi.responses import StreamingResponse
+from fastapi.testclient import TestClient
+from loguru import logger
+
+from fileglancer.log import AccessLogMiddleware
+from fileglancer.settings import Settings
+
+
+@pytest.fixture
+def records():
+    records = []
+    handler_id = logger.add(lambda message: records.append(message.record), level="INFO")
+    yield records
+    logger.remove(handler_id)
+
+
+@pytest.fixture
+def client():
+    app = FastAPI()
+
+    @app.get("/stream")
+    async def stream(request: Request):
+        request.state.username = "testuser"
+
+        async def chunks():
+            yield b"abc"
+            yield b"def"
+
+        return StreamingResponse(chunks(), status_code=206)
+
+    @app.get("/anonymous")
+    async def anonymous():
+        return {"ok": True}
+
+    app.add_middleware(AccessLogMiddleware, settings=Settings())
+    return TestClient(app)
+
+
+def test_access_log_uses_resolved_username(client, records):
+    response = client.get("/stream?x=1")
+    assert response.status_code == 206
+    assert response.content == b"abcdef"
+    record = [r for r in records if r["name"] == "fileglancer.log"][-1]
+    assert '[testuser] "GET /stream?x=1 HTTP/1.1" 206' in record["message"]
+    assert record["extra"]["username"] == "testuser"
+    assert record["extra"]["status"] == 206
+    assert record["extra"]["path"] == "/stream"
+
+
+def test_access_log_without_user(client, records):
+    client.get("/anonymous")
+    client.get("/missing")
+    log_records = [r for r in records if r["name"] == "fileglancer.log"]
+    assert [r["extra"]["username"] for r in log_records] == ["-", "-"]
+    assert [r["level"].name for r in log_records] == ["INFO", "WARNING"]
@@ -0,0 +1,97 @@
+import os
+import time
+import shutil
+import tempfile
+from concurrent.futures import ThreadPoolExecutor
+
+import pytest
+
+from fileglancer.proxy_routes import MissingObjectCache
+from fileglancer.user_context import ThreadUserContext, thread_credentials_supported
+
+
+@pytest.fixture
+def root_path():
+    temp_dir = tempfile.mkdtemp()
+    os.makedirs(os.path.join(temp_dir, "data.zarr"))
+    make_old(os.path.join(temp_dir, "data.zarr"))
+    yield temp_dir
+    shutil.rmtree(temp_dir)
+
+
+def make_old(path, age=60):
+    """Set the modification time of a directory far enough in the past for misses in it to be cached"""
+    t = time.time() - age
+    os.utime(path, (t, t))
+
+
+def test_missing_object_is_cached_until_directory_changes(root_path):
+    cache = MissingObjectCache(maxsize=100, ttl=60)
+    assert not cache.is_missing(root_path, "data.zarr/.zattrs")
+    cache.put(root_path, "data.zarr/.zattrs")
+    assert cache.is_missing(root_path, "data.zarr/.zattrs")
+    assert not cache.is_missing(root_path, "data.zarr/.zarray")
+    assert cache.stats()["hits"] == 1
+
+    # Creating the object changes the directory
+    with open(os.path.join(root_path, "data.zarr", ".zattrs"), "w") as f:
+        f.write("{}")
+    assert not cache.is_missing(root_path, "data.zarr/.zattrs")
+    assert cache.stats()["size"] == 0
+
+
+def test_missing_object_in_missing_directory(root_path):
+    cache = MissingObjectCache(maxsize=100, ttl=60)
+    cache.put(root_path, "other.zarr/zarr.json")
+    assert cache.is_missing(root_path, "other.zarr/zarr.json")
+
+    os.makedirs(os.path.join(root_path, "other.zarr"))
+    assert not cache.is_missing(root_path, "other.zarr/zarr.json")
+
+
+def run_unprivileged(fn):
+    """Run fn as a user without special permissions, on a thread with its own credentials if running as root"""
+    if os.geteuid() != 0:
+        fn()
+        return
+    if not thread_credentials_supported():
+        pytest.skip("Per-thread credentials are not supported")
+
+    def run_as_nobody():
+        with ThreadUserContext("nobody"):
+            fn()
+
+    with ThreadPoolExecutor(max_workers=1) as executor:
+        executor.submit(run_as_nobody).result()
+
+
+def test_missing_object_in_unreadable_directory_is_not_cached(root_path):
+    private = os.path.join(root_path, "private")
+    os.makedirs(os.path.join(private, "data.zarr"))
+    make_old(os.path.join(private, "data.zarr"))
+    os.chmod(root_path, 0o755)
+    os.chmod(private, 0o000)
+    cache = MissingObjectCache(maxsize=100, ttl=60)
+
+    def check():
+        cache.put(root_path, "private/data.zarr/.zattrs")
+        assert not cache.is_missing(root_path, "private/data.zarr/.zattrs")
+        assert cache.stats()["size"] == 0
+
+    try:
+        run_unprivileged(check)
+    finally:
+        os.chmod(private, 0o755)
+
+
+def test_missing_object_in_recently_modified_directory_is_not_cached(root_path):
+    cache = MissingObjectCache(maxsize=100, ttl=60)
+    os.utime(os.path.join(root_path, "data.zarr"))
+    cache.put(root_path, "data.zarr/.zattrs")
+    assert not cache.is_missing(root_path, "data.zarr/.zattrs")
+
+
+def test_missing_object_cache_disabled(root_path):
+    cache = MissingObjectCache(maxsize=0, ttl=60)
+    cache.put(root_path, "data.zarr/.zattrs")
+    assert not cache.is_missing(root_path, "data.zarr/.zattrs")
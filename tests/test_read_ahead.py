@@ -0,0 +1,154 @@
+import asyncio
+import os
+import shutil
+import tempfile
+
+import pytest
+
+from fileglancer.read_ahead import ReadAhead, get_neighbouring_chunk_keys
+
+
+@pytest.fixture
+def root_path():
+    temp_dir = os.path.realpath(tempfile.mkdtemp())
+    yield temp_dir
+    shutil.rmtree(temp_dir)
+
+
+async def run_in_thread(fn):
+    return await asyncio.get_running_loop().run_in_executor(None, fn)
+
+
+def test_zarr_v2_chunk_keys():
+    assert get_neighbouring_chunk_keys("data.zarr/s0/1.2.3", 10) == [
+        "data.zarr/s0/1.2.4", "data.zarr/s0/1.3.3", "data.zarr/s0/2.2.3",
+        "data.zarr/s0/1.2.2", "data.zarr/s0/1.1.3", "data.zarr/s0/0.2.3",
+    ]
+    assert get_neighbouring_chunk_keys("0.0", 10) == ["0.1", "1.0"]
+
+
+def test_zarr_v3_chunk_keys():
+    assert get_neighbouring_chunk_keys("data.zarr/0/c/0/5", 3) == [
+        "data.zarr/0/c/0/6", "data.zarr/0/c/1/5", "data.zarr/0/c/0/4",
+    ]
+    assert get_neighbouring_chunk_keys("data.zarr/0/c.0.5", 2) == ["data.zarr/0/c.0.6", "data.zarr/0/c.1.5"]
+
+
+def test_n5_chunk_keys():
+    assert get_neighbouring_chunk_keys("data.n5/s0/0/0/0", 3) == [
+        "data.n5/s0/0/0/1", "data.n5/s0/0/1/0", "data.n5/s0/1/0/0",
+    ]
+    # The resolution level of nested OME-Zarr is not an axis
+    assert get_neighbouring_chunk_keys("data.zarr/0/0/0/0", 10, ndim=3) == [
+        "data.zarr/0/0/0/1", "data.zarr/0/0/1/0", "data.zarr/0/1/0/0",
+    ]
+
+
+@pytest.mark.parametrize("key", [
+    "data.zarr/.zarray", "data.zarr/zarr.json", "data.n5/attributes.json",
+    "data.zarr/0/c", "image.tif", "archive.tar.gz", "v1.2/readme", "../0.0", "data/./0",
+])
+def test_other_keys_are_not_chunks(key):
+    assert get_neighbouring_chunk_keys(key, 10) == []
+
+
+def test_read_ahead_is_enabled_per_share(root_path):
+    os.makedirs(os.path.join(root_path, "enabled", "data"))
+    read_ahead = ReadAhead([os.path.join(root_path, "enabled")], max_chunks=6, max_concurrency=2)
+    assert read_ahead.is_enabled(os.path.join(root_path, "enabled", "data"))
+    assert not read_ahead.is_enabled(root_path)
+    assert not read_ahead.is_enabled(root_path + "-other")
+    assert not ReadAhead([], max_chunks=6, max_concurrency=2).is_enabled(root_path)
+
+
+@pytest.mark.skipif(not hasattr(os, "posix_fadvise"), reason="posix_fadvise is not supported")
+def test_read_ahead_warms_neighbours(root_path):
+    for name in ("0.0", "0.1", "1.0"):
+        with open(os.path.join(root_path, name), "wb") as f:
+            f.write(b"chunk")
+    read_ahead = ReadAhead([root_path], max_chunks=6, max_concurrency=2)
+
+    async def main():
+        assert read_ahead.schedule(root_path, "0.0", 5, run_in_thread)
+        await read_ahead.wait()
+        # The neighbours were already warmed
+        assert not read_ahead.schedule(root_path, "0.0", 5, run_in_thread)
+        assert not read_ahead.schedule(root_path, ".zattrs", 5, run_in_thread)
+
+    asyncio.run(main())
+    read_ahead.record_request(root_path, "0.1")
+    read_ahead.record_request(root_path, "0.1")
+    stats = read_ahead.stats()
+    assert stats["scheduled"] == 1
+    assert stats["warmed"] == 2
+    assert stats["missing"] == 0
+    assert stats["useful"] == 1
+    assert stats["useful_ratio"] == 0.5
+    assert stats["in_progress"] == 0
+
+
+@pytest.mark.skipif(not hasattr(os, "posix_fadvise"), reason="posix_fadvise is not supported")
+def test_read_ahead_finds_axes_from_array_metadata(root_path):
+    # Nested OME-Zarr v2, with two resolution levels
+    for level in ("0", "1"):
+        os.makedirs(os.path.join(root_path, "img.zarr", level, "0", "0"))
+        with open(os.path.join(root_path, "img.zarr", level, ".zarray"), "w") as f:
+            f.write("{}")
+        for chunk in ("0", "1"):
+            with open(os.path.join(root_path, "img.zarr", level, "0", "0", chunk), "wb") as f:
+                f.write(b"chunk")
+    os.makedirs(os.path.join(root_path, "other", "0"))
+    read_ahead = ReadAhead([root_path], max_chunks=6, max_concurrency=2)
+
+    async def main():
+        assert read_ahead.schedule(root_path, "img.zarr/0/0/0/0", 5, run_in_thread)
+        await read_ahead.wait()
+        assert read_ahead.schedule(root_path, "other/0/0", 5, run_in_thread)
+        await read_ahead.wait()
+        # The directories that are not in an array are remembered
+        assert not read_ahead.schedule(root_path, "other/0/0", 5, run_in_thread)
+
+    asyncio.run(main())
+    stats = read_ahead.stats()
+    assert stats["warmed"] == 1
+    assert stats["missing"] == 2
+    read_ahead.record_request(root_path, "img.zarr/0/0/0/1")
+    assert read_ahead.stats()["useful"] == 1
+
+
+@pytest.mark.skipif(not hasattr(os, "posix_fadvise"), reason="posix_fadvise is not supported")
+def test_read_ahead_concurrency_is_bounded(root_path):
+    read_ahead = ReadAhead([root_path], max_chunks=6, max_concurrency=1)
+
+    async def main():
+        release = asyncio.Event()
+
+        async def blocked(fn):
+            await release.wait()
+
+        assert read_ahead.schedule(root_path, "0.0", 5, blocked)
+        assert not read_ahead.schedule(root_path, "5.5", 5, blocked)
+        release.set()
+        await read_ahead.wait()
+
+    asyncio.run(main())
+    stats = read_ahead.stats()
+    assert stats["scheduled"] == 1
+    assert stats["dropped"] == 1
+
+
+@pytest.mark.skipif(not hasattr(os, "posix_fadvise"), reason="posix_fadvise is not supported")
+def test_read_ahead_stays_in_root(root_path):
+    shared = os.path.join(root_path, "shared")
+    os.makedirs(shared)
+    with open(os.path.join(root_path, "0.1"), "wb") as f:
+        f.write(b"chunk")
+    os.symlink(os.path.join(root_path, "0.1"), os.path.join(shared, "0.1"))
+    read_ahead = ReadAhead([shared], max_chunks=6, max_concurrency=2)
+
+    async def main():
+        assert read_ahead.schedule(shared, "0.0", 5, run_in_thread)
+        await read_ahead.wait()
+
+    asyncio.run(main())
+    assert read_ahead.stats()["warmed"] == 0
@@ -0,0 +1,54 @@
+import asyncio
+
+import pytest
+
+from fileglancer.responses import FileHandleResponse, ZEROCOPY_SEND_EXTENSION
+
+
+@pytest.fixture
+def file_handle(tmp_path):
+    path = tmp_path / "data.bin"
+    path.write_bytes(b"0123456789")
+    with open(path, "rb") as f:
+        yield f
+
+
+def send_response(file_handle, scheme, extensions):
+    async def chunks():
+        try:
+            yield b"2345"
+        finally:
+            file_handle.close()
+
+    async def receive():
+        await asyncio.Event().wait()
+
+    messages = []
+
+    async def send(message):
+        messages.append(message)
+
+    response = FileHandleResponse(file_handle, chunks(), offset=2, count=4, status_code=206,
+                                  headers={"Content-Length": "4"})
+    scope = {"type": "http", "scheme": scheme, "extensions": extensions, "asgi": {"spec_version": "2.4"}}
+    asyncio.run(response(scope, receive, send))
+    return messages
+
+
+def test_file_handle_response_uses_zerocopy_send(file_handle):
+    messages = send_response(file_handle, "http", {ZEROCOPY_SEND_EXTENSION: {}})
+    assert [m["type"] for m in messages] == ["http.response.start", ZEROCOPY_SEND_EXTENSION]
+    assert messages[1]["offset"] == 2
+    assert messages[1]["count"] == 4
+    assert file_handle.closed
+
+
+@pytest.mark.parametrize("scheme, extensions", [
+    ("http", {}),
+    ("https", {ZEROCOPY_SEND_EXTENSION: {}}),
+])
+def test_file_handle_response_falls_back_to_streaming(file_handle, scheme, extensions):
+    messages = send_response(file_handle, scheme, extensions)
+    assert [m["type"] for m in messages] == ["http.response.start", "http.response.body", "http.response.body"]
+    assert b"".join(m.get("body", b"") for m in messages[1:]) == b"2345"
+    assert file_handle.closed
@@ -0,0 +1,74 @@
+import os
+import pwd
+import asyncio
+import threading
+
+from unittest.mock import patch
+
+import pytest
+
+from fileglancer import user_context
+from fileglancer.user_context import (EffectiveUserContext, ThreadUserContext, UserContextExecutor,
+                                      thread_credentials_supported)
+
+requires_thread_credentials = pytest.mark.skipif(
+    os.geteuid() != 0 or not thread_credentials_supported(),
+    reason="Changing thread credentials requires root on Linux"
+)
+
+
+@pytest.fixture
+def nobody():
+    return pwd.getpwnam("nobody")
+
+
+def test_server_credentials_are_looked_up_once():
+    user_context._server_credentials = None
+    with patch("fileglancer.user_context.pwd.getpwuid", wraps=pwd.getpwuid) as getpwuid:
+        contexts = [EffectiveUserContext("nobody") for _ in range(3)]
+    assert getpwuid.call_count == 1
+    assert contexts[0]._uid == os.getuid()
+    assert contexts[2]._gids == contexts[0]._gids
+
+
+@requires_thread_credentials
+def test_thread_user_context_only_changes_calling_thread(nobody):
+    entered = threading.Event()
+    checked = threading.Event()
+    seen = {}
+
+    def worker():
+        with ThreadUserContext("nobody"):
+            seen["inside"] = (os.geteuid(), os.getegid())
+            entered.set()
+            checked.wait(5)
+        seen["after"] = (os.geteuid(), os.getegid(), os.getgroups())
+
+    groups = os.getgroups()
+    thread = threading.Thread(target=worker)
+    thread.start()
+    assert entered.wait(5)
+    # The main thread keeps its credentials while the worker runs as nobody
+    assert os.geteuid() == 0
+    checked.set()
+    thread.join()
+
+    assert seen["inside"] == (nobody.pw_uid, nobody.pw_gid)
+    assert seen["after"] == (0, os.getegid(), groups)
+
+
+@requires_thread_credentials
+def test_thread_user_context_denies_access(nobody, tmp_path):
+    path = tmp_path / "private.txt"
+    path.write_text("secret")
+    os.chmod(path, 0o600)
+
+    executor = UserContextExecutor(max_workers=1)
+    try:
+        with pytest.raises(PermissionError):
+            asyncio.run(executor.run("nobody", lambda: open(path).read()))
+        assert asyncio.run(executor.run("nobody", os.geteuid)) == nobody.pw_uid
+    finally:
+        executor.shutdown()
+    # The server can still read the file
+    assert path.read_text() == "secret"
@@ -1,5 +1,8 @@
 import pytest
-from fileglancer.utils import slugify_path, is_likely_binary
+from types import SimpleNamespace
+
+from fileglancer.utils import (slugify_path, is_likely_binary, parse_range_header, parse_range_header_ranges,
+                              make_etag, parse_http_date, is_not_modified, if_range_matches)
 
 
 def test_slugify_path_simple():
@@ -208,3 +211,85 @@ def test_is_likely_binary_log_file():
     """Test that log file content is detected as text"""
     log_data = b"[2024-01-01 12:00:00] INFO: Server started\n[2024-01-01 12:00:01] DEBUG: Connection established\n"
     assert not is_likely_binary(log_data)
+
+
+def test_is_likely_binary_matches_per_byte_definition():
+    """Each byte value is counted as a control character exactly as the per-byte definition does"""
+    mismatches = []
+    for byte in range(256):
+        is_control = byte < 9 or 13 < byte < 32
+        # One byte in 100 is at the 1% threshold, one in 101 is just below it
+        if (is_likely_binary(bytes([byte]) + b"a" * 99) is not is_control
+                or is_likely_binary(bytes([byte]) + b"a" * 100) is not False):
+            mismatches.append(byte)
+    assert mismatches == []
+
+
+def test_parse_range_header_uses_first_range():
+    assert parse_range_header("bytes=2-5", 10) == (2, 5)
+    assert parse_range_header("bytes=-3", 10) == (7, 9)
+    assert parse_range_header("bytes=8-", 10) == (8, 9)
+    assert parse_range_header("bytes=2-5, 7-8", 10) == (2, 5)
+    assert parse_range_header("bytes=20-30", 10) is None
+    assert parse_range_header("items=2-5", 10) is None
+
+
+@pytest.mark.parametrize("header, expected", [
+    ("bytes=0-1, 5-6", [(0, 1), (5, 6)]),
+    # Sorted, overlapping and adjacent ranges merged
+    ("bytes=5-6, 0-1, 2-3, 6-8", [(0, 3), (5, 8)]),
+    ("bytes=-2, 0-0", [(0, 0), (8, 9)]),
+    # Unsatisfiable and invalid ranges are ignored if another one is satisfiable
+    ("bytes=0-1, 20-30, x-y", [(0, 1)]),
+    ("bytes=20-30, 40-50", None),
+    ("bytes=", None),
+])
+def test_parse_range_header_ranges(header, expected):
+    assert parse_range_header_ranges(header, 10, max_ranges=4) == expected
+
+
+def test_parse_range_header_ranges_limits_count():
+    header = "bytes=" + ", ".join(f"{i * 2}-{i * 2}" for i in range(5))
+    assert parse_range_header_ranges(header, 100, max_ranges=4) is None
+    assert len(parse_range_header_ranges(header, 100, max_ranges=5)) == 5
+    # Ranges that merge into one are allowed
+    header = "bytes=" + ", ".join(f"{i}-{i}" for i in range(50))
+    assert parse_range_header_ranges(header, 100, max_ranges=4) == [(0, 49)]
+
+
+def test_make_etag():
+    st = SimpleNamespace(st_ino=0x1234, st_size=10, st_mtime=1700000000.0, st_mtime_ns=1700000000 * 10**9)
+    assert make_etag(st, now=1700000010) == '"1234-a-%x"' % (1700000000 * 10**9)
+    # Recently modified files get a weak ETag
+    assert make_etag(st, now=1700000000.5) == 'W/"1234-a-%x"' % (1700000000 * 10**9)
+
+
+def test_parse_http_date():
+    assert parse_http_date("Tue, 14 Nov 2023 22:13:20 GMT") == 1700000000
+    assert parse_http_date("2023-11-14T22:13:20.000Z") == 1700000000
+    assert parse_http_date("2023-11-14T22:13:20+00:00") == 1700000000
+    assert parse_http_date("not a date") is None
+
+
+def test_is_not_modified():
+    etag = '"1-2-3"'
+    assert is_not_modified({"if-none-match": '"1-2-3"'}, etag, 1700000000.5)
+    assert is_not_modified({"if-none-match": '"x", W/"1-2-3"'}, etag, 1700000000.5)
+    assert is_not_modified({"if-none-match": "*"}, etag, 1700000000.5)
+    assert not is_not_modified({"if-none-match": '"x"'}, etag, 1700000000.5)
+    assert is_not_modified({"if-modified-since": "Tue, 14 Nov 2023 22:13:20 GMT"}, etag, 1700000000.5)
+    assert not is_not_modified({"if-modified-since": "Tue, 14 Nov 2023 22:13:19 GMT"}, etag, 1700000000.5)
+    assert not is_not_modified({"if-modified-since": "garbage"}, etag, 1700000000.5)
+    assert not is_not_modified({}, etag, 1700000000.5)
+
+
+def test_if_range_matches():
+    etag = '"1-2-3"'
+    assert if_range_matches(None, etag, 1700000000.5)
+    assert if_range_matches(etag, etag, 1700000000.5)
+    assert if_range_matches("Tue, 14 Nov 2023 22:13:20 GMT", etag, 1700000000.5)
+    assert not if_range_matches('"x"', etag, 1700000000.5)
+    assert not if_range_matches('W/"1-2-3"', etag, 1700000000.5)
+    assert not if_range_matches("Tue, 14 Nov 2023 22:13:21 GMT", etag, 1700000000.5)
+    # Weak validators never match
+    assert not if_range_matches('W/"1-2-3"', 'W/"1-2-3"', 1700000000.5)